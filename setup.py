@@ -75,6 +75,9 @@ setup(
     description='StorjTorrent is a wrapper library for libtorrent.',
     long_description=LONG_DESCRIPTION,
     packages=['storjtorrent'],
+    entry_points={
+        'console_scripts': ['storjtorrent = storjtorrent.cli:main']
+    },
     cmdclass={'test': PyTest},
     install_requires=install_requirements,
     tests_require=test_requirements,
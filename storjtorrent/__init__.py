@@ -27,3 +27,18 @@ from storjtorrent import *
 from session import *
 from exception import *
 from thread_management import *
+from layout import *
+from events import *
+from manifest import *
+from shard_index import *
+from announce import *
+from allocator import *
+from admission import *
+from history import *
+from stall import *
+from bandwidth import *
+from removal import *
+from tracing import *
+from fetch import *
+from stream import *
+from warming import *
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import division
+from .exception import AdmissionError
+from collections import deque
+from threading import Lock
+import time
+
+# Highest priority first.
+PRIORITY_CLASSES = ('repair', 'retrieval', 'replication')
+DEFAULT_CLASS_LIMITS = {'repair': 8, 'retrieval': 4, 'replication': 2}
+
+
+class AdmissionQueue(object):
+
+    """Limits how many downloads run at once, by priority class.
+
+    Each class has its own cap on concurrent downloads and the classes share
+    an overall cap. When a slot frees up the highest priority class with
+    work waiting goes first. Once ``max_queued`` downloads are waiting,
+    :meth:`submit` refuses more by raising :class:`AdmissionError`, so
+    callers can slow down instead of piling up work.
+    """
+
+    def __init__(self, class_limits=None, max_active=None, max_queued=1000):
+        """Initialize an empty admission queue.
+
+        :param class_limits: Mapping of priority class to the number of its
+                             downloads that may run at once. Classes not in
+                             PRIORITY_CLASSES rank below them, alphabetically.
+        :type class_limits: dict
+        :param max_active: Number of downloads that may run at once across
+                           all classes. Defaults to the sum of class_limits.
+        :type max_active: int
+        :param max_queued: Number of downloads that may wait for a slot.
+        :type max_queued: int
+        """
+        if class_limits is None:
+            class_limits = DEFAULT_CLASS_LIMITS
+        self.class_limits = dict(class_limits)
+        self.max_active = (max_active if max_active is not None
+                           else sum(self.class_limits.values()))
+        self.max_queued = max_queued
+        self.classes = ([name for name in PRIORITY_CLASSES
+                         if name in self.class_limits] +
+                        sorted(name for name in self.class_limits
+                               if name not in PRIORITY_CLASSES))
+        self._lock = Lock()
+        self._queues = dict((name, deque()) for name in self.classes)
+        self._active = dict((name, set()) for name in self.classes)
+        self._owners = {}
+        self._stats = dict((name, {'admitted': 0, 'rejected': 0,
+                                   'released': 0, 'total_wait': 0.0,
+                                   'max_wait': 0.0})
+                           for name in self.classes)
+
+    def can_submit(self, priority_class):
+        """Return whether :meth:`submit` would accept a download now, so a
+        caller can refuse work before doing any of it. A refusal counts as
+        rejected.
+
+        :param priority_class: One of the configured priority classes.
+        :type priority_class: str
+        :rtype: bool
+        :raises AdmissionError: If the class is unknown.
+        """
+        with self._lock:
+            if priority_class not in self._queues:
+                raise AdmissionError(
+                    'Unknown priority class: %s' % priority_class)
+            if self._queued() >= self.max_queued:
+                self._stats[priority_class]['rejected'] += 1
+                return False
+            return True
+
+    def submit(self, key, priority_class, start_func):
+        """Queue a download, starting it at once if a slot is free.
+
+        :param key: Unique identifier of the download, e.g. its info hash.
+        :type key: str
+        :param priority_class: One of the configured priority classes.
+        :type priority_class: str
+        :param start_func: Called with ``key`` when the download is admitted.
+        :type start_func: function
+        :returns: Whether the download was started immediately.
+        :rtype: bool
+        :raises AdmissionError: If the class is unknown or the queue is full.
+        """
+        with self._lock:
+            if priority_class not in self._queues:
+                raise AdmissionError(
+                    'Unknown priority class: %s' % priority_class)
+            if key in self._owners:
+                return False
+            if self._queued() >= self.max_queued:
+                self._stats[priority_class]['rejected'] += 1
+                raise AdmissionError(
+                    'The download queue is full (%d waiting).' %
+                    self.max_queued)
+            self._queues[priority_class].append((key, start_func,
+                                                 time.time()))
+            self._owners[key] = priority_class
+            ready = self._ready()
+        self._start(ready)
+        return any(started == key for started, _ in ready)
+
+    def release(self, key):
+        """Free a download's slot, or drop it from the queue if it is still
+        waiting, and admit whatever can run next.
+
+        :param key: Identifier the download was submitted with.
+        :type key: str
+        """
+        with self._lock:
+            priority_class = self._owners.pop(key, None)
+            if priority_class is None:
+                return
+            if key in self._active[priority_class]:
+                self._active[priority_class].discard(key)
+                self._stats[priority_class]['released'] += 1
+            else:
+                self._queues[priority_class] = deque(
+                    item for item in self._queues[priority_class]
+                    if item[0] != key)
+            ready = self._ready()
+        self._start(ready)
+
+    def stats(self):
+        """Return queue depth, active downloads and wait times per class.
+
+        :returns: Mapping of priority class to its 'queued' and 'active'
+                  counts, 'admitted', 'rejected' and 'released' totals, and
+                  'mean_wait' and 'max_wait' in seconds.
+        :rtype: dict
+        """
+        with self._lock:
+            stats = {}
+            for name in self.classes:
+                class_stats = dict(self._stats[name])
+                total_wait = class_stats.pop('total_wait')
+                class_stats['queued'] = len(self._queues[name])
+                class_stats['active'] = len(self._active[name])
+                class_stats['mean_wait'] = (
+                    total_wait / class_stats['admitted']
+                    if class_stats['admitted'] else 0.0)
+                stats[name] = class_stats
+            return stats
+
+    def _queued(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _ready(self):
+        """Move downloads from the queues to the active sets while slots
+        allow, highest priority first."""
+        ready = []
+        now = time.time()
+        active = sum(len(keys) for keys in self._active.values())
+        for name in self.classes:
+            queue = self._queues[name]
+            while (queue and active < self.max_active and
+                   len(self._active[name]) < self.class_limits[name]):
+                key, start_func, queued_at = queue.popleft()
+                self._active[name].add(key)
+                active += 1
+                wait = now - queued_at
+                self._stats[name]['admitted'] += 1
+                self._stats[name]['total_wait'] += wait
+                self._stats[name]['max_wait'] = max(
+                    self._stats[name]['max_wait'], wait)
+                ready.append((key, start_func))
+        return ready
+
+    def _start(self, ready):
+        for key, start_func in ready:
+            start_func(key)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import division
+from threading import Lock
+
+# Transfer rate, in bytes per second, that counts as much demand as one
+# connected peer.
+RATE_PER_PEER = 16 * 1024
+
+
+def apportion(total, weights, minimum=0, caps=None):
+    """Split an integer budget between keys in proportion to their weights.
+
+    Every key gets at least ``minimum``, even if that exceeds ``total``, and
+    never more than its cap. Budget a capped key cannot use is shared among
+    the others. Rounding uses the largest remainder method, so the shares add
+    up to ``total`` whenever the caps allow it.
+
+    >>> sorted(apportion(10, {'a': 1, 'b': 3}).items())
+    [('a', 3), ('b', 7)]
+
+    :param total: The budget to split.
+    :type total: int
+    :param weights: Mapping of key to a non-negative weight.
+    :type weights: dict
+    :param minimum: Share every key receives regardless of weight.
+    :type minimum: int
+    :param caps: Mapping of key to the most it may receive. Missing keys and
+                 negative caps are unlimited.
+    :type caps: dict
+    :returns: Mapping of key to its share.
+    :rtype: dict
+    """
+    caps = dict((key, cap) for key, cap in (caps or {}).items()
+                if cap is not None and cap >= 0)
+    shares = dict((key, min(minimum, caps.get(key, minimum)))
+                  for key in weights)
+    remaining = total - sum(shares.values())
+    active = [key for key in weights
+              if key not in caps or caps[key] > shares[key]]
+
+    while remaining > 0 and active:
+        weight_sum = sum(weights[key] for key in active)
+        if weight_sum <= 0:
+            exact = dict((key, remaining / len(active)) for key in active)
+        else:
+            exact = dict((key, remaining * weights[key] / weight_sum)
+                         for key in active)
+
+        capped = [key for key in active
+                  if key in caps and shares[key] + exact[key] >= caps[key]]
+        if capped:
+            for key in capped:
+                remaining -= caps[key] - shares[key]
+                shares[key] = caps[key]
+                active.remove(key)
+            continue
+
+        whole = dict((key, int(exact[key])) for key in active)
+        for key in active:
+            shares[key] += whole[key]
+        leftover = remaining - sum(whole.values())
+        by_remainder = sorted(active, key=lambda key: whole[key] - exact[key])
+        for key in by_remainder[:leftover]:
+            shares[key] += 1
+        remaining = 0
+
+    return shares
+
+
+def torrent_demand(status):
+    """Estimate how many connections and upload slots a torrent could use.
+
+    :param status: Current status of the torrent.
+    :type status: libtorrent.torrent_status
+    :returns: Connection weight and upload slot weight.
+    :rtype: tuple of float
+    """
+    if status.paused:
+        return 0.0, 0.0
+    connections = (1 + status.num_peers +
+                   (status.download_rate + status.upload_rate) /
+                   RATE_PER_PEER)
+    if not status.is_seeding:
+        # Downloads need extra peers to find the pieces they are missing.
+        connections += 4
+    uploads = 1 + status.upload_rate / RATE_PER_PEER
+    if status.num_peers > status.num_seeds:
+        uploads += status.num_peers - status.num_seeds
+    return connections, uploads
+
+
+class BudgetAllocator(object):
+
+    """Divides global connection and unchoke budgets between torrents.
+
+    Torrents report their demand with :meth:`update` and :meth:`rebalance`
+    shares the session-wide limits out in proportion to it, so busy torrents
+    get more peers and upload slots than idle ones.
+    """
+
+    def __init__(self, connections_limit=200, unchoke_slots_limit=8,
+                 min_connections=2, min_uploads=1):
+        """Initialize the allocator.
+
+        :param connections_limit: Total connections for all torrents.
+        :type connections_limit: int
+        :param unchoke_slots_limit: Total upload slots for all torrents.
+        :type unchoke_slots_limit: int
+        :param min_connections: Connections every torrent keeps. libtorrent
+                                requires at least 2.
+        :type min_connections: int
+        :param min_uploads: Upload slots every torrent keeps.
+        :type min_uploads: int
+        """
+        self.connections_limit = connections_limit
+        self.unchoke_slots_limit = unchoke_slots_limit
+        self.min_connections = min_connections
+        self.min_uploads = min_uploads
+        self._lock = Lock()
+        self._demand = {}
+        self._caps = {}
+        self._allocations = {}
+
+    def set_caps(self, torrent_hash, max_connections=-1, max_uploads=-1):
+        """Limit what a torrent may be given, whatever its demand.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param max_connections: Most connections allowed, -1 for no cap.
+        :type max_connections: int
+        :param max_uploads: Most upload slots allowed, -1 for no cap.
+        :type max_uploads: int
+        """
+        key = str(torrent_hash)
+        with self._lock:
+            self._caps[key] = (max_connections, max_uploads)
+            self._demand.setdefault(key, (1.0, 1.0))
+
+    def update(self, torrent_hash, status):
+        """Record a torrent's current demand from its status.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param status: Current status of the torrent.
+        :type status: libtorrent.torrent_status
+        """
+        demand = torrent_demand(status)
+        with self._lock:
+            self._demand[str(torrent_hash)] = demand
+
+    def discard(self, torrent_hash):
+        """Forget a removed torrent.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        """
+        key = str(torrent_hash)
+        with self._lock:
+            self._demand.pop(key, None)
+            self._caps.pop(key, None)
+            self._allocations.pop(key, None)
+
+    def rebalance(self):
+        """Recompute every torrent's share of the budgets.
+
+        :returns: Mapping of info hash to ``(max_connections, max_uploads)``
+                  for the torrents whose allocation changed.
+        :rtype: dict
+        """
+        with self._lock:
+            connection_caps = dict((key, caps[0])
+                                   for key, caps in self._caps.items())
+            upload_caps = dict((key, caps[1])
+                               for key, caps in self._caps.items())
+            connections = apportion(
+                self.connections_limit,
+                dict((key, demand[0])
+                     for key, demand in self._demand.items()),
+                self.min_connections, connection_caps)
+            uploads = apportion(
+                self.unchoke_slots_limit,
+                dict((key, demand[1])
+                     for key, demand in self._demand.items()),
+                self.min_uploads, upload_caps)
+
+            changed = {}
+            for key in self._demand:
+                allocation = (connections[key], uploads[key])
+                if self._allocations.get(key) != allocation:
+                    changed[key] = allocation
+                    self._allocations[key] = allocation
+            return changed
+
+    def allocations(self):
+        """Return the current allocation of every torrent.
+
+        :returns: Mapping of info hash to ``(max_connections, max_uploads)``.
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self._allocations)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import division
+from collections import OrderedDict
+from threading import Lock
+import math
+import time
+
+
+class AnnounceScheduler(object):
+
+    """Spreads DHT announces out over time instead of sending them at once.
+
+    Requested announces are queued and released a few at a time by
+    :meth:`tick`, fast enough to finish within ``window`` seconds of the
+    oldest request but never faster than ``rate`` announces per second.
+    Torrents whose peer count changed since their last announce are sent
+    first, since they are the ones whose swarm is moving.
+    """
+
+    def __init__(self, window=60, rate=20):
+        """Initialize the announce scheduler.
+
+        :param window: Seconds over which a batch of announces is spread.
+        :type window: int or float
+        :param rate: Maximum number of announces sent per second.
+        :type rate: int or float
+        """
+        self.window = window
+        self.rate = rate
+        self._lock = Lock()
+        self._urgent = OrderedDict()
+        self._normal = OrderedDict()
+        self._peers = {}
+        self._changed = set()
+        self._last_tick = None
+        self._allowance = 0.0
+        self._stats = {'requested': 0, 'announced': 0, 'total_latency': 0.0,
+                       'max_latency': 0.0}
+
+    def request(self, handles):
+        """Queue torrents to be announced.
+
+        A torrent that is already queued keeps its place.
+
+        :param handles: Handles of the torrents to announce.
+        :type handles: list of libtorrent.torrent_handle
+        """
+        now = time.time()
+        with self._lock:
+            for handle in handles:
+                key = str(handle.info_hash())
+                if key in self._urgent or key in self._normal:
+                    continue
+                queue = self._urgent if key in self._changed else self._normal
+                queue[key] = (handle, now)
+                self._stats['requested'] += 1
+
+    def note_peers(self, torrent_hash, num_peers):
+        """Record a torrent's current peer count.
+
+        A change since the previous count moves the torrent to the front of
+        the queue.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param num_peers: Number of peers the torrent is connected to.
+        :type num_peers: int
+        """
+        key = str(torrent_hash)
+        with self._lock:
+            previous = self._peers.get(key)
+            self._peers[key] = num_peers
+            if previous is None or previous == num_peers:
+                return
+            self._changed.add(key)
+            if key in self._normal:
+                self._urgent[key] = self._normal.pop(key)
+
+    def discard(self, torrent_hash):
+        """Forget a removed torrent.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        """
+        key = str(torrent_hash)
+        with self._lock:
+            self._urgent.pop(key, None)
+            self._normal.pop(key, None)
+            self._peers.pop(key, None)
+            self._changed.discard(key)
+
+    def pending(self):
+        """Return the number of queued announces."""
+        with self._lock:
+            return len(self._urgent) + len(self._normal)
+
+    def tick(self):
+        """Send the announces that are due.
+
+        Meant to be run about once a second by the session's scheduler.
+
+        :returns: False if nothing was queued, so the caller can back off.
+        :rtype: bool
+        """
+        now = time.time()
+        with self._lock:
+            elapsed = 1.0 if self._last_tick is None else now - self._last_tick
+            self._last_tick = now
+            pending = len(self._urgent) + len(self._normal)
+            if not pending:
+                self._allowance = 0.0
+                return False
+
+            oldest = min(requested for queue in (self._urgent, self._normal)
+                         for _, requested in queue.values())
+            remaining = max(1.0, oldest + self.window - now)
+            self._allowance += min(self.rate * elapsed,
+                                   pending * elapsed / remaining)
+            self._allowance = min(self._allowance, max(self.rate, 1))
+            count = min(pending, int(math.floor(self._allowance)))
+            if count == 0 and pending * elapsed >= remaining:
+                count = 1
+            self._allowance = max(0.0, self._allowance - count)
+
+            due = []
+            for queue in (self._urgent, self._normal):
+                while queue and len(due) < count:
+                    key, (handle, requested) = queue.popitem(last=False)
+                    self._changed.discard(key)
+                    due.append((handle, requested))
+
+        for handle, requested in due:
+            if handle.is_valid():
+                handle.force_dht_announce()
+                self._record(time.time() - requested)
+        return True
+
+    def stats(self):
+        """Return announce counts and queueing latency.
+
+        :returns: Number of announces requested, sent and still queued, and
+                  the mean and maximum seconds between request and send.
+        :rtype: dict
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._urgent) + len(self._normal)
+        total_latency = stats.pop('total_latency')
+        stats['mean_latency'] = (total_latency / stats['announced']
+                                 if stats['announced'] else 0.0)
+        return stats
+
+    def _record(self, latency):
+        with self._lock:
+            self._stats['announced'] += 1
+            self._stats['total_latency'] += latency
+            self._stats['max_latency'] = max(self._stats['max_latency'],
+                                             latency)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import division
+from .allocator import apportion
+from .exception import StorjTorrentError
+from threading import Lock
+
+LIMIT_KEYS = ('min_download', 'max_download', 'min_upload', 'max_upload')
+
+# Rate, in bytes per second, every torrent is weighted with on top of its
+# measured rate, so idle torrents can still start transferring.
+RATE_FLOOR = 4 * 1024
+
+# Smallest per-torrent limit handed out when the class's share allows it.
+# libtorrent treats 0 as unlimited, so no torrent gets less than 1.
+MIN_TORRENT_RATE = 1024
+
+
+class BandwidthShaper(object):
+
+    """Divides download and upload rate between bandwidth classes.
+
+    Every class may have a guaranteed minimum and a ceiling in each
+    direction. Minimums are reserved out of the session's rate limit for the
+    classes that have torrents, the rest is shared by demand up to the
+    ceilings, and each class's share is split between its torrents by demand
+    as per-torrent limits. Torrents using nearly all of their limit count
+    double, so a busy torrent can grow into bandwidth others leave idle.
+    """
+
+    def __init__(self, classes, download_limit=-1, upload_limit=-1):
+        """Initialize the shaper.
+
+        :param classes: Mapping of class name to a dictionary of
+                        'min_download', 'max_download', 'min_upload' and
+                        'max_upload' in bytes per second. Missing or 0 means
+                        no minimum or no ceiling.
+        :type classes: dict
+        :param download_limit: Session download limit in bytes per second,
+                               -1 for unlimited.
+        :type download_limit: int
+        :param upload_limit: Session upload limit in bytes per second, -1 for
+                             unlimited.
+        :type upload_limit: int
+        """
+        self.download_limit = download_limit
+        self.upload_limit = upload_limit
+        self._lock = Lock()
+        self.classes = {}
+        for name, limits in classes.items():
+            self.set_class(name, **limits)
+        self._members = {}
+        self._rates = {}
+        self._limits = {}
+
+    def set_class(self, name, min_download=0, max_download=0, min_upload=0,
+                  max_upload=0):
+        """Add a bandwidth class or change its limits.
+
+        :param name: Name of the class.
+        :type name: str
+        :param min_download: Guaranteed download rate in bytes per second.
+        :type min_download: int
+        :param max_download: Download ceiling in bytes per second, 0 for
+                             none.
+        :type max_download: int
+        :param min_upload: Guaranteed upload rate in bytes per second.
+        :type min_upload: int
+        :param max_upload: Upload ceiling in bytes per second, 0 for none.
+        :type max_upload: int
+        """
+        with self._lock:
+            self.classes[name] = {'min_download': int(min_download),
+                                  'max_download': int(max_download),
+                                  'min_upload': int(min_upload),
+                                  'max_upload': int(max_upload)}
+
+    def assign(self, torrent_hash, name):
+        """Put a torrent in a bandwidth class.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param name: Name of the class.
+        :type name: str
+        :raises StorjTorrentError: If the class is unknown.
+        """
+        with self._lock:
+            if name not in self.classes:
+                raise StorjTorrentError('Unknown bandwidth class: %s' % name)
+            self._members[str(torrent_hash)] = name
+
+    def update(self, torrent_hash, status):
+        """Record a torrent's current transfer rates from its status.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param status: Current status of the torrent.
+        :type status: libtorrent.torrent_status
+        """
+        rates = (0, 0) if status.paused else (status.download_rate,
+                                              status.upload_rate)
+        with self._lock:
+            self._rates[str(torrent_hash)] = rates
+
+    def discard(self, torrent_hash):
+        """Forget a removed torrent.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        """
+        key = str(torrent_hash)
+        with self._lock:
+            self._members.pop(key, None)
+            self._rates.pop(key, None)
+            self._limits.pop(key, None)
+
+    def rebalance(self):
+        """Recompute every torrent's rate limits.
+
+        :returns: Mapping of info hash to ``(download_limit, upload_limit)``
+                  in bytes per second, -1 meaning unlimited, for the torrents
+                  whose limits changed.
+        :rtype: dict
+        """
+        with self._lock:
+            downloads = self._shape(self.download_limit, 0, 'download')
+            uploads = self._shape(self.upload_limit, 1, 'upload')
+            changed = {}
+            for key in self._members:
+                limits = (downloads[key], uploads[key])
+                if self._limits.get(key) != limits:
+                    changed[key] = limits
+                    self._limits[key] = limits
+            return changed
+
+    def limits(self):
+        """Return the current limits of every torrent.
+
+        :returns: Mapping of info hash to ``(download_limit, upload_limit)``.
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self._limits)
+
+    def stats(self):
+        """Return the torrents, rates and limits of every class.
+
+        :returns: Mapping of class name to its number of 'torrents', their
+                  total 'download_rate' and 'upload_rate', and the class's
+                  configured limits, all in bytes per second.
+        :rtype: dict
+        """
+        with self._lock:
+            stats = dict((name, dict(limits, torrents=0, download_rate=0,
+                                     upload_rate=0))
+                         for name, limits in self.classes.items())
+            for key, name in self._members.items():
+                download_rate, upload_rate = self._rates.get(key, (0, 0))
+                stats[name]['torrents'] += 1
+                stats[name]['download_rate'] += download_rate
+                stats[name]['upload_rate'] += upload_rate
+            return stats
+
+    def _shape(self, total, column, direction):
+        """Split one direction's rate into per-torrent limits."""
+        members = {}
+        for key, name in self._members.items():
+            members.setdefault(name, []).append(key)
+        weights = {}
+        for key in self._members:
+            rate = self._rates.get(key, (0, 0))[column]
+            weight = rate + RATE_FLOOR
+            limit = self._limits.get(key, (-1, -1))[column]
+            if limit > 0 and rate >= 0.9 * limit:
+                weight *= 2
+            weights[key] = weight
+
+        ceilings = dict((name, self.classes[name]['max_' + direction])
+                        for name in members)
+        if total > 0:
+            minimums = dict((name, min(self.classes[name]['min_' + direction],
+                                       ceilings[name] or total))
+                            for name in members)
+            if sum(minimums.values()) > total:
+                minimums = apportion(total, minimums)
+            budgets = apportion(
+                total - sum(minimums.values()),
+                dict((name, sum(weights[key] for key in keys))
+                     for name, keys in members.items()),
+                caps=dict((name, ceilings[name] - minimums[name])
+                          for name in members if ceilings[name]))
+            for name in members:
+                budgets[name] += minimums[name]
+        else:
+            budgets = ceilings
+
+        limits = {}
+        for name, keys in members.items():
+            if total <= 0 and not ceilings[name]:
+                limits.update((key, -1) for key in keys)
+                continue
+            minimum = max(1, min(MIN_TORRENT_RATE,
+                                 budgets[name] // len(keys)))
+            limits.update(apportion(budgets[name],
+                                    dict((key, weights[key]) for key in keys),
+                                    minimum))
+        return limits
@@ -0,0 +1,532 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Local benchmarks for StorjTorrent.
+
+Each ``bench_*`` function returns a list of result dictionaries so the
+numbers can be printed with :func:`format_rows` or stored for comparison
+between hosts and releases.
+"""
+
+from __future__ import division, print_function
+from . import layout
+from .events import COMPLETE_STATES
+from .session import Session, TRANSPORTS
+from .storjtorrent import StorjTorrent
+from collections import OrderedDict
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+MiB = 1024 * 1024
+
+# (added delay in milliseconds, packet loss in percent) for each network
+# condition of the transport benchmark when impairment is asked for. On
+# loopback the delay applies to both directions, so the round trip grows by
+# twice as much.
+NETWORK_CONDITIONS = ((0, 0), (10, 0), (10, 1), (50, 0.1))
+
+
+def representative_shard_sets(seed=0):
+    """Return shard size distributions seen on Storj nodes.
+
+    :param seed: Seed for the randomly sized sets, so runs are repeatable.
+    :type seed: int
+    :returns: Mapping of set name to a list of shard sizes in bytes.
+    :rtype: dict
+    """
+    rng = random.Random(seed)
+    return {
+        'uniform-8MiB': [8 * MiB] * 128,
+        'uniform-32MiB': [32 * MiB] * 32,
+        'small-256kiB': [256 * 1024] * 2000,
+        'mixed': [256 * 1024] * 400 + [32 * MiB] * 16,
+        'lognormal': [max(1, int(rng.lognormvariate(15, 1.5)))
+                      for _ in range(500)],
+    }
+
+
+def bench_layout(shard_sets=None):
+    """Compare optimized torrent layouts with libtorrent's defaults.
+
+    The default layout is what ``generate_torrent`` produces with
+    ``piece_size=0``: libtorrent's 40 kB heuristic, capped at 2 MiB
+    pieces, with files over 4 MiB padded.
+
+    :param shard_sets: Mapping of set name to shard sizes. Defaults to
+                       :func:`representative_shard_sets`.
+    :type shard_sets: dict
+    :returns: One row per shard set and layout.
+    :rtype: list of dict
+    """
+    if shard_sets is None:
+        shard_sets = representative_shard_sets()
+
+    rows = []
+    for name in sorted(shard_sets):
+        sizes = shard_sets[name]
+        default = layout.layout_cost(
+            sizes, layout.default_piece_size(sum(sizes)), 4 * MiB)
+        start = time.time()
+        chosen = layout.optimize_layout(sizes).cost
+        elapsed = time.time() - start
+        for label, cost, seconds in (('default', default, 0.0),
+                                     ('optimized', chosen, elapsed)):
+            rows.append(OrderedDict([
+                ('set', name),
+                ('layout', label),
+                ('piece_kib', cost['piece_size'] // 1024),
+                ('pad_limit', cost['pad_size_limit']),
+                ('metadata_kib', cost['metadata_bytes'] / 1024),
+                ('read_amp', cost['read_amplification']),
+                ('cost_mib', cost['total'] / MiB),
+                ('seconds', seconds)
+            ]))
+    return rows
+
+
+def bench_memory(counts=(100, 1000)):
+    """Measure resident memory per torrent in normal and lean sessions.
+
+    Each configuration runs in a fresh process which creates ``count`` tiny
+    single-shard torrents, adds them all to one session as seeds and reports
+    how much its resident set grew.
+
+    :param counts: Numbers of torrents to measure with.
+    :type counts: tuple of int
+    :returns: One row per torrent count and mode.
+    :rtype: list of dict
+    """
+    rows = []
+    for count in counts:
+        for mode in ('normal', 'lean'):
+            queue = multiprocessing.Queue()
+            worker = multiprocessing.Process(
+                target=_memory_worker, args=(queue, count, mode))
+            worker.start()
+            rss = queue.get()
+            worker.join()
+            rows.append(OrderedDict([
+                ('torrents', count),
+                ('mode', mode),
+                ('rss_kib', rss // 1024),
+                ('kib_per_torrent', rss / 1024 / count)
+            ]))
+    return rows
+
+
+def _memory_worker(queue, count, mode):
+    workspace = tempfile.mkdtemp()
+    try:
+        paths = []
+        for number in range(count):
+            shard_directory = os.path.join(workspace, 'shard%d' % number)
+            os.mkdir(shard_directory)
+            with open(os.path.join(shard_directory, 'shard'), 'wb') as shard:
+                shard.write(os.urandom(16384))
+            name = 'shard%d.torrent' % number
+            StorjTorrent.generate_torrent([], shard_directory,
+                                          torrent_name=name,
+                                          save_path=workspace)
+            paths.append(os.path.join(workspace, name))
+
+        baseline = _rss()
+        session = Session(port_min=0, port_max=0, save_path=workspace,
+                          lean=mode == 'lean', checkpoint_interval=0)
+        for path in paths:
+            session.add_torrent(path, seeding=True)
+        time.sleep(2)
+        rss = _rss() - baseline
+        session.set_alive(False)
+        queue.put(rss)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def bench_hashing(total_mib=256, shard_mib=8, directories=8,
+                  workers=(1, None)):
+    """Measure how fast torrents are created from shards on disk.
+
+    :param total_mib: Amount of shard data hashed per run.
+    :type total_mib: int
+    :param shard_mib: Size of each shard.
+    :type shard_mib: int
+    :param directories: Number of torrents the data is split into.
+    :type directories: int
+    :param workers: Worker process counts to compare. None uses one process
+                    per CPU.
+    :type workers: tuple
+    :returns: One row per worker count.
+    :rtype: list of dict
+    """
+    workspace = tempfile.mkdtemp()
+    try:
+        shard_directories = []
+        per_directory = max(1, total_mib // shard_mib // directories)
+        for number in range(directories):
+            shard_directory = os.path.join(workspace, 'bundle%d' % number)
+            _write_shards(shard_directory, per_directory, shard_mib * MiB)
+            shard_directories.append(shard_directory)
+        total = directories * per_directory * shard_mib
+
+        rows = []
+        for count in workers:
+            count = count or multiprocessing.cpu_count()
+            start = time.time()
+            for _ in StorjTorrent.generate_torrents(
+                    [], shard_directories, workers=count,
+                    save_path=workspace):
+                pass
+            elapsed = time.time() - start
+            rows.append(OrderedDict([
+                ('workers', count),
+                ('mib', total),
+                ('seconds', elapsed),
+                ('mib_per_s', total / elapsed)
+            ]))
+        return rows
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def bench_throughput(size_mib=64, shard_mib=8, timeout=300,
+                     **session_options):
+    """Measure transfer speed between two sessions over loopback.
+
+    One session seeds a torrent of random shards and a second one downloads
+    it, connecting straight to the seed. CPU time covers both sessions.
+
+    :param size_mib: Size of the torrent.
+    :type size_mib: int
+    :param shard_mib: Size of each shard in it.
+    :type shard_mib: int
+    :param timeout: Seconds to wait for the download before giving up.
+    :type timeout: int or float
+    :param session_options: Keyword arguments passed to both sessions.
+    :type session_options: dict
+    :returns: A single row, with 'seconds' and 'mib_per_s' of None if the
+              download timed out.
+    :rtype: list of dict
+    """
+    workspace = tempfile.mkdtemp()
+    sessions = []
+    try:
+        torrent, seed_path = _write_torrent(workspace, size_mib, shard_mib)
+        options = dict(checkpoint_interval=0, stall_after=0)
+        options.update(session_options)
+        info_hash, port = _seed(sessions, torrent, seed_path, timeout,
+                                options)
+        cpu = _cpu_time()
+        elapsed = _download(sessions, torrent, info_hash,
+                            os.path.join(workspace, 'leech'), port, timeout,
+                            options)
+        return [OrderedDict([
+            ('mib', size_mib),
+            ('seconds', elapsed),
+            ('mib_per_s', size_mib / elapsed if elapsed else None),
+            ('cpu_seconds', _cpu_time() - cpu)
+        ])]
+    finally:
+        for session in sessions:
+            session.set_alive(False)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def bench_allocation(size_mib=64, shard_mib=8, modes=('sparse', 'full'),
+                     timeout=300, **session_options):
+    """Compare storage allocation modes on a seed's read path.
+
+    For each mode a replica downloads a torrent over loopback into files
+    allocated that way, then becomes the only seed for a second download,
+    so its pieces are read back from the files the mode laid out.
+
+    :param size_mib: Size of the torrent.
+    :type size_mib: int
+    :param shard_mib: Size of each shard in it.
+    :type shard_mib: int
+    :param modes: Allocation modes to compare.
+    :type modes: tuple of str
+    :param timeout: Seconds to wait for each download before giving up.
+    :type timeout: int or float
+    :param session_options: Keyword arguments passed to every session.
+    :type session_options: dict
+    :returns: One row per mode with the seconds taken to write and to seed
+              the torrent, seeding throughput, the replica's read cache hit
+              rate and CPU time. Times are None if a download timed out.
+    :rtype: list of dict
+    """
+    rows = []
+    for mode in modes:
+        workspace = tempfile.mkdtemp()
+        sessions = []
+        try:
+            torrent, seed_path = _write_torrent(workspace, size_mib,
+                                                shard_mib)
+            options = dict(checkpoint_interval=0, stall_after=0)
+            options.update(session_options)
+            info_hash, port = _seed(sessions, torrent, seed_path, timeout,
+                                    options)
+            cpu = _cpu_time()
+            written = _download(sessions, torrent, info_hash,
+                                os.path.join(workspace, 'replica'), port,
+                                timeout, dict(options, allocation_mode=mode))
+            replica = sessions[-1]
+            sessions[0].set_alive(False)
+            seeded = None
+            if written is not None:
+                seeded = _download(sessions, torrent, info_hash,
+                                   os.path.join(workspace, 'leech'),
+                                   replica.session.listen_port(), timeout,
+                                   options)
+            rows.append(OrderedDict([
+                ('allocation_mode', mode),
+                ('mib', size_mib),
+                ('write_seconds', written),
+                ('seed_seconds', seeded),
+                ('seed_mib_per_s', size_mib / seeded if seeded else None),
+                ('read_hit_rate', replica.get_disk_stats()['hit_rate']),
+                ('cpu_seconds', _cpu_time() - cpu)
+            ]))
+        finally:
+            for session in sessions:
+                session.set_alive(False)
+            shutil.rmtree(workspace, ignore_errors=True)
+    return rows
+
+
+def bench_transport(size_mib=32, shard_mib=8,
+                    transports=tuple(sorted(TRANSPORTS)),
+                    conditions=((0, 0),), timeout=300, **session_options):
+    """Measure loopback transfers for each transport and network condition.
+
+    Latency and loss are simulated with ``tc qdisc ... netem`` on the
+    loopback interface of a private network namespace, created with
+    ``unshare --net --map-root-user`` for a child process that runs the
+    transfers. The host's own loopback traffic is never impaired, and the
+    namespace disappears with the child, even if it is killed. Conditions
+    that cannot be simulated, e.g. where unprivileged user namespaces are
+    disabled, are left out of the results.
+
+    :param size_mib: Size of the torrent.
+    :type size_mib: int
+    :param shard_mib: Size of each shard in it.
+    :type shard_mib: int
+    :param transports: Transport policies to compare.
+    :type transports: tuple of str
+    :param conditions: Pairs of added delay in milliseconds and packet loss
+                       in percent, such as NETWORK_CONDITIONS. By default
+                       only the unimpaired loopback is measured.
+    :type conditions: tuple
+    :param timeout: Seconds to wait for each download before giving up.
+    :type timeout: int or float
+    :param session_options: Keyword arguments passed to every session, such
+                            as utp_options. They must be JSON serializable
+                            for simulated conditions.
+    :type session_options: dict
+    :returns: One row per transport and condition, with 'seconds' and
+              'mib_per_s' of None if the download timed out.
+    :rtype: list of dict
+    """
+    rows = []
+    for delay, loss in conditions:
+        if not delay and not loss:
+            rows.extend(_transport_rows(0, 0, transports, size_mib,
+                                        shard_mib, timeout, session_options))
+        else:
+            rows.extend(_transport_rows_in_namespace(
+                delay, loss, transports, size_mib, shard_mib, timeout,
+                session_options))
+    return rows
+
+
+def _transport_rows(delay, loss, transports, size_mib, shard_mib, timeout,
+                    session_options):
+    """Measure every transport under the current network conditions."""
+    rows = []
+    for transport in transports:
+        row = bench_throughput(size_mib, shard_mib, timeout,
+                               transport=transport, **session_options)[0]
+        rows.append(OrderedDict(
+            [('transport', transport), ('delay_ms', delay),
+             ('loss_pct', loss)] + list(row.items())))
+    return rows
+
+
+def _transport_rows_in_namespace(delay, loss, *arguments):
+    """Run _transport_rows() in a child process with its own network
+    namespace whose loopback has the given delay and loss.
+
+    :returns: The rows, or an empty list if the namespace or the condition
+              could not be set up.
+    :rtype: list of dict
+    """
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(
+        __file__)))
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(
+        [package_root] + [path for path in
+                          [environment.get('PYTHONPATH')] if path])
+    command = ['unshare', '--net', '--map-root-user', sys.executable, '-c',
+               'from storjtorrent.benchmark import _namespace_worker; '
+               '_namespace_worker()']
+    try:
+        child = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                 stdout=subprocess.PIPE, env=environment)
+    except OSError:
+        return []
+    output = child.communicate(
+        json.dumps([delay, loss] + list(arguments)).encode('utf-8'))[0]
+    if child.returncode != 0:
+        return []
+    lines = output.decode('utf-8').strip().splitlines()
+    return [OrderedDict(row) for row in json.loads(lines[-1])]
+
+
+def _namespace_worker():
+    """Entry point of the child started by _transport_rows_in_namespace().
+
+    Reads its arguments as JSON from stdin, impairs the namespace's
+    loopback and prints the rows as JSON on the last line of stdout.
+    """
+    (delay, loss, transports, size_mib, shard_mib, timeout,
+     session_options) = json.loads(sys.stdin.read())
+    with open(os.devnull, 'w') as devnull:
+        for command in (['ip', 'link', 'set', 'lo', 'up'],
+                        ['tc', 'qdisc', 'add', 'dev', 'lo', 'root', 'netem',
+                         'delay', '%gms' % delay, 'loss', '%g%%' % loss]):
+            if subprocess.call(command, stdout=devnull, stderr=devnull):
+                sys.exit(1)
+    rows = _transport_rows(delay, loss, transports, size_mib, shard_mib,
+                           timeout, session_options)
+    print(json.dumps([list(row.items()) for row in rows]))
+
+
+def _write_torrent(workspace, size_mib, shard_mib):
+    """Write random shards and a torrent of them into a workspace.
+
+    :returns: The torrent's path and the save path to seed it from.
+    :rtype: tuple of str
+    """
+    seed_path = os.path.join(workspace, 'seed')
+    _write_shards(os.path.join(seed_path, 'shards'),
+                  max(1, size_mib // shard_mib), shard_mib * MiB)
+    StorjTorrent.generate_torrent([], os.path.join(seed_path, 'shards'),
+                                  torrent_name='shards.torrent',
+                                  save_path=workspace)
+    return os.path.join(workspace, 'shards.torrent'), seed_path
+
+
+def _seed(sessions, torrent, save_path, timeout, options):
+    """Start a session seeding a torrent on an ephemeral port.
+
+    :returns: The torrent's info hash and the port the seed listens on.
+    :rtype: tuple
+    """
+    seeder = Session(port_min=0, port_max=0, save_path=save_path, **options)
+    sessions.append(seeder)
+    info_hash = seeder.add_torrent(torrent)
+    if seeder.wait_for(info_hash, COMPLETE_STATES, timeout) is None:
+        raise RuntimeError('The seed did not finish checking its data.')
+    return info_hash, seeder.session.listen_port()
+
+
+def _download(sessions, torrent, info_hash, save_path, port, timeout,
+              options):
+    """Download a torrent in a new session from a seed on loopback.
+
+    :returns: Seconds the download took, or None if it timed out.
+    :rtype: float
+    """
+    if not os.path.isdir(save_path):
+        os.mkdir(save_path)
+    leecher = Session(port_min=0, port_max=0, save_path=save_path,
+                      **options)
+    sessions.append(leecher)
+    start = time.time()
+    leecher.add_torrent(torrent, peers=[('127.0.0.1', port)])
+    if leecher.wait_for(info_hash, COMPLETE_STATES, timeout) is None:
+        return None
+    return time.time() - start
+
+
+def _write_shards(directory, count, size):
+    """Fill a new directory with shards of random data."""
+    os.makedirs(directory)
+    for number in range(count):
+        with open(os.path.join(directory, 'shard%d' % number), 'wb') as shard:
+            shard.write(os.urandom(size))
+
+
+def _cpu_time():
+    """Return the user and system CPU seconds used by this process."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _rss():
+    """Return the current resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except IOError:
+        # Peak rather than current usage, but the best available off Linux.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def format_rows(rows):
+    """Format benchmark rows as a plain text table.
+
+    :param rows: Rows returned by one of the ``bench_*`` functions.
+    :type rows: list of dict
+    :returns: The table, one line per row, with a header line.
+    :rtype: str
+    """
+    if not rows:
+        return ''
+    columns = list(rows[0])
+    cells = [[_format_cell(row[column]) for column in columns]
+             for row in rows]
+    widths = [max([len(column)] + [len(line[i]) for line in cells])
+              for i, column in enumerate(columns)]
+    lines = ['  '.join(column.rjust(widths[i])
+                       for i, column in enumerate(columns))]
+    for line in cells:
+        lines.append('  '.join(cell.rjust(widths[i])
+                               for i, cell in enumerate(line)))
+    return '\n'.join(lines)
+
+
+def _format_cell(value):
+    if isinstance(value, float):
+        return '%.3f' % value
+    return str(value)
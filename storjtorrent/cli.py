@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Command line interface for StorjTorrent.
+
+Run ``storjtorrent --help`` for the list of commands. Commands that report
+results print one JSON object per line, so their output can be piped into
+other tools.
+"""
+
+from __future__ import division, print_function
+from . import benchmark
+from .events import COMPLETE_STATES
+from .exception import StorjTorrentError
+from .session import Session, ALLOCATION_MODES, TRANSPORTS
+from .shard_index import ShardIndex
+from .storjtorrent import StorjTorrent
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+BENCHMARKS = ('layout', 'memory', 'hashing', 'throughput', 'allocation',
+              'transport')
+
+# Benchmarks run when none are named. The transport matrix is left out, as
+# it is slow and meant to be run on purpose.
+DEFAULT_BENCHMARKS = ('layout', 'memory', 'hashing', 'throughput',
+                      'allocation')
+
+# States a torrent reaches once its local data has been checked.
+CHECKED_STATES = ('downloading', 'finished', 'seeding')
+
+
+def main(argv=None):
+    """Run the command given on the command line.
+
+    :param argv: Arguments, without the program name. Defaults to
+                 ``sys.argv[1:]``.
+    :type argv: list of str
+    :returns: Exit status.
+    :rtype: int
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args) or 0
+    except StorjTorrentError as error:
+        print('storjtorrent: %s' % error, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+
+
+def build_parser():
+    """Return the argument parser for every command."""
+    parser = argparse.ArgumentParser(
+        prog='storjtorrent',
+        description='Create, seed and fetch Storj shard torrents.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    create = commands.add_parser(
+        'create', help='create one torrent per shard directory')
+    create.add_argument('directories', nargs='+', metavar='DIRECTORY')
+    create.add_argument('-o', '--save-path', default='.',
+                        help='directory to write the torrents to')
+    create.add_argument('-w', '--workers', type=int, default=None,
+                        help='processes hashing in parallel (default: one '
+                        'per CPU)')
+    create.add_argument('--piece-size', type=int, default=0,
+                        help='piece size in bytes, a multiple of 16 kiB')
+    create.add_argument('--auto-layout', action='store_true',
+                        help='choose piece size and padding from the shard '
+                        'sizes')
+    create.add_argument('--shard-index',
+                        help='SQLite shard index to record the shards in')
+    create.set_defaults(func=create_command)
+
+    seed = commands.add_parser(
+        'seed', help='seed every torrent in a directory until interrupted')
+    seed.add_argument('torrent_directory')
+    _add_session_arguments(seed)
+    seed.add_argument('--interval', type=float, default=10,
+                      help='seconds between status reports')
+    seed.add_argument('--status-file',
+                      help='write each status report to this file instead '
+                      'of standard output')
+    seed.set_defaults(func=seed_command)
+
+    fetch = commands.add_parser(
+        'fetch', help='download a torrent and wait for it to complete')
+    fetch.add_argument('location', help='torrent file, magnet link or URL')
+    _add_session_arguments(fetch)
+    fetch.add_argument('-p', '--peer', action='append', default=[],
+                       metavar='HOST:PORT',
+                       help='peer known to have the torrent, may be repeated')
+    fetch.add_argument('--timeout', type=float, default=None,
+                       help='seconds to wait before giving up')
+    fetch.set_defaults(func=fetch_command)
+
+    status = commands.add_parser(
+        'status', help='check local data against torrents and report it')
+    status.add_argument('torrents', nargs='+', metavar='TORRENT')
+    _add_session_arguments(status)
+    status.add_argument('--timeout', type=float, default=60,
+                        help='seconds to wait for the data to be checked')
+    status.set_defaults(func=status_command)
+
+    bench = commands.add_parser('bench', help='run local benchmarks')
+    bench.add_argument('benchmarks', nargs='*', metavar='BENCHMARK',
+                       help='any of %s (default: all but transport)' %
+                       ', '.join(BENCHMARKS))
+    bench.add_argument('--impair-network', action='store_true',
+                       help='with transport, also measure added '
+                       'latency and loss, in a private network namespace')
+    bench.add_argument('--json', action='store_true',
+                       help='print rows as JSON instead of tables')
+    bench.set_defaults(func=bench_command)
+    return parser
+
+
+def _add_session_arguments(parser):
+    parser.add_argument('-d', '--save-path', default='.',
+                        help="directory holding the torrents' data")
+    parser.add_argument('--port-min', type=int, default=6881)
+    parser.add_argument('--port-max', type=int, default=6891)
+    parser.add_argument('--manifest',
+                        help='manifest of completed torrents, to skip '
+                        'rechecking them')
+    parser.add_argument('--allocation-mode', default='sparse',
+                        choices=sorted(ALLOCATION_MODES),
+                        help='how downloaded files are allocated on disk')
+    parser.add_argument('--transport', default='mixed',
+                        choices=sorted(TRANSPORTS),
+                        help='protocols peers are connected over')
+
+
+def _session(args, **options):
+    return Session(port_min=args.port_min, port_max=args.port_max,
+                   save_path=args.save_path, manifest_path=args.manifest,
+                   allocation_mode=args.allocation_mode,
+                   transport=args.transport, **options)
+
+
+def _emit(record, stream=None):
+    stream = stream or sys.stdout
+    stream.write(json.dumps(record, sort_keys=True) + '\n')
+    stream.flush()
+
+
+def _torrent_report(session, info_hash):
+    status = session.session.find_torrent(info_hash).status()
+    return {'info_hash': str(info_hash),
+            'name': status.name,
+            'state': session.events.state(info_hash),
+            'progress': status.progress,
+            'total_wanted': status.total_wanted,
+            'total_wanted_done': status.total_wanted_done,
+            'num_peers': status.num_peers}
+
+
+def create_command(args):
+    """Create torrents and print one result per torrent."""
+    shard_index = ShardIndex(args.shard_index) if args.shard_index else None
+    try:
+        for result in StorjTorrent.generate_torrents(
+                [], args.directories, workers=args.workers,
+                save_path=args.save_path, shard_index=shard_index,
+                piece_size=args.piece_size, auto_layout=args.auto_layout):
+            _emit(result)
+    finally:
+        if shard_index is not None:
+            shard_index.close()
+
+
+def seed_command(args):
+    """Seed every torrent in a directory, reporting status periodically."""
+    paths = sorted(glob.glob(os.path.join(args.torrent_directory,
+                                          '*.torrent')))
+    if not paths:
+        raise StorjTorrentError(
+            'No torrents found in %s.' % args.torrent_directory)
+    session = _session(args)
+    try:
+        for path in paths:
+            session.add_torrent(path, seeding=True)
+        while True:
+            time.sleep(args.interval)
+            report = {'time': time.time(), 'status': session.get_status(),
+                      'announce': session.get_announce_stats()}
+            if args.status_file:
+                with open(args.status_file + '.tmp', 'w') as status_file:
+                    _emit(report, status_file)
+                os.rename(args.status_file + '.tmp', args.status_file)
+            else:
+                _emit(report)
+    finally:
+        session.set_alive(False)
+
+
+def fetch_command(args):
+    """Download a torrent, connecting to any peer hints given."""
+    peers = []
+    for peer in args.peer:
+        host, _, port = peer.rpartition(':')
+        if not host or not port.isdigit():
+            raise StorjTorrentError('Peers must be given as HOST:PORT.')
+        peers.append((host, int(port)))
+    session = _session(args)
+    try:
+        start = time.time()
+        info_hash = session.add_torrent(args.location, peers=peers)
+        state = session.wait_for(info_hash, COMPLETE_STATES, args.timeout)
+        report = _torrent_report(session, info_hash)
+        report['seconds'] = time.time() - start
+        _emit(report)
+        return 0 if state is not None else 2
+    finally:
+        session.set_alive(False)
+
+
+def status_command(args):
+    """Check local data against torrents and print their status."""
+    session = _session(args, checkpoint_interval=0)
+    try:
+        # Only check local data: no DHT and nothing is downloaded.
+        session.session.stop_dht()
+        hashes = [session.add_torrent(path, upload_only=True)
+                  for path in args.torrents]
+        deadline = time.time() + args.timeout
+        for info_hash in hashes:
+            session.wait_for(info_hash, CHECKED_STATES,
+                             max(0, deadline - time.time()))
+            _emit(_torrent_report(session, info_hash))
+    finally:
+        session.set_alive(False)
+
+
+def bench_command(args):
+    """Run benchmarks and print their results."""
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        raise StorjTorrentError(
+            'Unknown benchmarks: %s' % ', '.join(sorted(unknown)))
+    for name in args.benchmarks or DEFAULT_BENCHMARKS:
+        options = {}
+        if name == 'transport' and args.impair_network:
+            options['conditions'] = benchmark.NETWORK_CONDITIONS
+        rows = getattr(benchmark, 'bench_' + name)(**options)
+        if args.json:
+            for row in rows:
+                _emit(dict(row, benchmark=name))
+        else:
+            print(name)
+            print(benchmark.format_rows(rows))
+            print()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from threading import Condition, Lock
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+COMPLETE_STATES = ('finished', 'seeding')
+
+
+class TorrentEvents(object):
+
+    """Tracks torrent states and wakes whoever is waiting on them.
+
+    Every torrent gets its own condition variable sharing one lock, so a state
+    change only wakes the threads waiting on that torrent and idle waiters
+    cost nothing.
+    """
+
+    def __init__(self):
+        """Initialize an empty state table."""
+        self._lock = Lock()
+        self._states = {}
+        self._conditions = {}
+        self._callbacks = {}
+
+    def update(self, torrent_hash, state):
+        """Record a new state for a torrent and notify its waiters.
+
+        Completion callbacks registered with :meth:`on_complete` are run in
+        the calling thread, outside of the lock, once the torrent reaches one
+        of the completed states. A callback that raises is logged and does
+        not stop the others.
+
+        :param torrent_hash: Info hash of the torrent that changed state.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param state: The new state, as reported in the status dictionary.
+        :type state: str
+        """
+        self._set(str(torrent_hash), state, True)
+
+    def setdefault(self, torrent_hash, state):
+        """Record a torrent's initial state unless one is already known.
+
+        A state read when the torrent was added may be older than one an
+        alert has recorded since, so it must not replace it.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param state: The state to record if none is known yet.
+        :type state: str
+        :returns: The torrent's recorded state.
+        :rtype: str
+        """
+        return self._set(str(torrent_hash), state, False)
+
+    def _set(self, key, state, replace):
+        callbacks = []
+        with self._lock:
+            if not replace and key in self._states:
+                return self._states[key]
+            self._states[key] = state
+            self._condition(key).notify_all()
+            if state in COMPLETE_STATES:
+                callbacks = self._callbacks.pop(key, [])
+        for callback in callbacks:
+            try:
+                callback(key, state)
+            except Exception:
+                logger.exception('Completion callback for %s failed', key)
+        return state
+
+    def forget(self, torrent_hash):
+        """Drop a removed torrent and wake anything still waiting on it.
+
+        :param torrent_hash: Info hash of the torrent that was removed.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        """
+        key = str(torrent_hash)
+        with self._lock:
+            self._states.pop(key, None)
+            self._callbacks.pop(key, None)
+            condition = self._conditions.pop(key, None)
+            if condition is not None:
+                condition.notify_all()
+
+    def state(self, torrent_hash):
+        """Return the last known state of a torrent.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :returns: The state, or None if the torrent is unknown.
+        :rtype: str
+        """
+        with self._lock:
+            return self._states.get(str(torrent_hash))
+
+    def wait_for(self, torrent_hash, states=COMPLETE_STATES, timeout=None):
+        """Block until a torrent reaches one of the given states.
+
+        :param torrent_hash: Info hash of the torrent to wait on.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param states: A state or list of states to wait for. Defaults to
+                       'finished' and 'seeding'.
+        :type states: str or list
+        :param timeout: Maximum number of seconds to wait. None waits
+                        forever.
+        :type timeout: int or float
+        :returns: The state that was reached, or None if the timeout expired
+                  or the torrent was removed first.
+        :rtype: str
+        """
+        key = str(torrent_hash)
+        if isinstance(states, str):
+            states = (states,)
+        deadline = None if timeout is None else time.time() + timeout
+
+        with self._lock:
+            seen = key in self._states
+            while self._states.get(key) not in states:
+                if seen and key not in self._states:
+                    return None
+                seen = seen or key in self._states
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                self._condition(key).wait(remaining)
+            return self._states[key]
+
+    def on_complete(self, torrent_hash, callback):
+        """Call ``callback(torrent_hash, state)`` once a torrent completes.
+
+        If the torrent has already finished, the callback runs immediately in
+        the calling thread.
+
+        :param torrent_hash: Info hash of the torrent to watch.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param callback: Function to call with the hex info hash and the
+                         completed state.
+        :type callback: function
+        """
+        key = str(torrent_hash)
+        with self._lock:
+            state = self._states.get(key)
+            if state not in COMPLETE_STATES:
+                self._callbacks.setdefault(key, []).append(callback)
+                return
+        callback(key, state)
+
+    def _condition(self, key):
+        condition = self._conditions.get(key)
+        if condition is None:
+            condition = self._conditions[key] = Condition(self._lock)
+        return condition
@@ -43,3 +43,14 @@ class StorjTorrentError(Exception):
         :rtype: str
         """
         return self.message
+
+
+class AdmissionError(StorjTorrentError):
+
+    """Raised when a download cannot be queued, e.g. because the admission
+    queue is full."""
+
+
+class RemovalError(StorjTorrentError):
+
+    """Raised when a removed torrent's files could not be deleted."""
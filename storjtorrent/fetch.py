@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import division
+from .exception import StorjTorrentError
+from threading import BoundedSemaphore, Lock
+import hashlib
+import json
+import os
+import socket
+import tempfile
+
+try:
+    import httplib
+    from urlparse import urljoin, urlsplit
+except ImportError:
+    import http.client as httplib
+    from urllib.parse import urljoin, urlsplit
+
+_MAX_REDIRECTS = 5
+
+
+class TorrentFetcher(object):
+
+    """Downloads .torrent files over http and https.
+
+    Connections are kept alive and reused per host, at most
+    ``max_concurrent`` requests run at once, and responses can be cached on
+    disk by URL. A cached torrent is revalidated with its ETag and
+    Last-Modified headers, so an unchanged file is not downloaded again.
+    """
+
+    def __init__(self, cache_dir=None, max_concurrent=4, timeout=30):
+        """Initialize the fetcher.
+
+        :param cache_dir: Directory in which fetched torrents are cached.
+                          None disables the cache.
+        :type cache_dir: str
+        :param max_concurrent: Number of requests that may run at once.
+        :type max_concurrent: int
+        :param timeout: Socket timeout in seconds.
+        :type timeout: int or float
+        """
+        self.cache_dir = cache_dir
+        if cache_dir is not None and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self.timeout = timeout
+        self._semaphore = BoundedSemaphore(max_concurrent)
+        self._lock = Lock()
+        self._idle = {}
+        self._stats = {'requests': 0, 'downloaded': 0, 'not_modified': 0,
+                       'connections': 0, 'reused': 0, 'bytes': 0}
+
+    def fetch(self, url):
+        """Return the contents of a .torrent file.
+
+        :param url: http or https location of the file.
+        :type url: str
+        :returns: The bencoded torrent.
+        :rtype: bytes
+        :raises StorjTorrentError: If the file cannot be fetched.
+        """
+        cached = self._load_cache(url)
+        headers = {}
+        if cached is not None:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        with self._semaphore:
+            location = url
+            for _ in range(_MAX_REDIRECTS + 1):
+                status, response_headers, body = self._request(location,
+                                                               headers)
+                if status in (301, 302, 303, 307, 308):
+                    location = urljoin(location,
+                                       response_headers.get('location', ''))
+                    continue
+                break
+            else:
+                raise StorjTorrentError('Too many redirects for %s.' % url)
+
+        if status == 304 and cached is not None:
+            self._count('not_modified')
+            return cached['data']
+        if status != 200:
+            raise StorjTorrentError(
+                'Unable to fetch %s: HTTP %d.' % (url, status))
+        self._count('downloaded')
+        self._save_cache(url, response_headers, body)
+        return body
+
+    def stats(self):
+        """Return request and connection counts.
+
+        :returns: Number of 'requests' sent, torrents 'downloaded', cached
+                  torrents found 'not_modified', 'connections' opened and
+                  'reused', and 'bytes' received.
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _request(self, url, headers):
+        """Send one GET request, retrying once if a reused connection turns
+        out to have been closed by the server."""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise StorjTorrentError('Unsupported URL: %s' % url)
+        path = parts.path or '/'
+        if parts.query:
+            path = '%s?%s' % (path, parts.query)
+        host = (parts.scheme, parts.hostname, parts.port)
+
+        for attempt in range(2):
+            connection, reused = self._acquire(host)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (httplib.HTTPException, socket.error) as error:
+                connection.close()
+                if reused and not attempt:
+                    continue
+                raise StorjTorrentError(
+                    'Unable to fetch %s: %s' % (url, error))
+            response_headers = dict((name.lower(), value)
+                                    for name, value in response.getheaders())
+            self._count('requests')
+            self._count('bytes', len(body))
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(host, connection)
+            return response.status, response_headers, body
+
+    def _acquire(self, host):
+        with self._lock:
+            idle = self._idle.get(host)
+            if idle:
+                self._stats['reused'] += 1
+                return idle.pop(), True
+            self._stats['connections'] += 1
+        scheme, hostname, port = host
+        if scheme == 'https':
+            connection = httplib.HTTPSConnection(hostname, port,
+                                                 timeout=self.timeout)
+        else:
+            connection = httplib.HTTPConnection(hostname, port,
+                                                timeout=self.timeout)
+        return connection, False
+
+    def _release(self, host, connection):
+        with self._lock:
+            self._idle.setdefault(host, []).append(connection)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _cache_path(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key)
+
+    def _load_cache(self, url):
+        if self.cache_dir is None:
+            return None
+        path = self._cache_path(url)
+        try:
+            with open(path + '.json') as meta_file:
+                meta = json.load(meta_file)
+            with open(path + '.torrent', 'rb') as data_file:
+                data = data_file.read()
+        except (IOError, OSError, ValueError):
+            return None
+        if meta.get('url') != url:
+            return None
+        return {'etag': meta.get('etag'),
+                'last_modified': meta.get('last_modified'), 'data': data}
+
+    def _save_cache(self, url, headers, body):
+        etag = headers.get('etag')
+        last_modified = headers.get('last-modified')
+        if self.cache_dir is None or not (etag or last_modified):
+            return
+        path = self._cache_path(url)
+        # Data goes first: a stale entry then fails revalidation instead of
+        # returning old data for a new ETag.
+        handle, temporary = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(handle, 'wb') as data_file:
+            data_file.write(body)
+        os.rename(temporary, path + '.torrent')
+        with open(path + '.json', 'w') as meta_file:
+            json.dump({'url': url, 'etag': etag,
+                       'last_modified': last_modified}, meta_file)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import division
+from .exception import StorjTorrentError
+from array import array
+from threading import Lock
+import math
+
+METRICS = ('download_rate', 'upload_rate', 'num_peers', 'progress')
+
+# (resolution in seconds, number of samples kept). Recent history is kept at
+# one second, the last half hour at ten seconds and the last day at five
+# minutes, about 9 kB per torrent.
+DEFAULT_TIERS = ((1, 120), (10, 180), (300, 288))
+
+_NAN = float('nan')
+
+
+class _Tier(object):
+
+    """Ring buffer of averaged samples at one resolution."""
+
+    def __init__(self, resolution, capacity, width):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.width = width
+        self.data = array('f', [_NAN]) * (capacity * width)
+        self.newest = None
+        self.bucket = None
+        self.sums = [0.0] * width
+        self.count = 0
+
+    def add(self, timestamp, values):
+        bucket = int(timestamp // self.resolution)
+        if self.bucket is not None and bucket != self.bucket:
+            self._flush()
+        self.bucket = bucket
+        for column, value in enumerate(values):
+            self.sums[column] += value
+        self.count += 1
+
+    def samples(self, start, end):
+        """Return ``(timestamp, values)`` pairs for the buckets starting
+        after ``start`` and no later than ``end``, including the bucket still
+        being filled."""
+        first = int(start // self.resolution) + 1
+        last = int(end // self.resolution)
+        samples = []
+        if self.newest is not None:
+            oldest = max(self.newest - self.capacity + 1, first)
+            for bucket in range(oldest, min(self.newest, last) + 1):
+                offset = (bucket % self.capacity) * self.width
+                row = self.data[offset:offset + self.width]
+                if not math.isnan(row[0]):
+                    samples.append((bucket * self.resolution, list(row)))
+        if self.count and first <= self.bucket <= last and (
+                self.newest is None or self.bucket > self.newest):
+            samples.append((self.bucket * self.resolution,
+                            [total / self.count for total in self.sums]))
+        return samples
+
+    def _flush(self):
+        if self.newest is not None and self.bucket <= self.newest:
+            # The clock went backwards; drop the bucket rather than
+            # overwrite newer history.
+            self._reset_accumulator()
+            return
+        if self.newest is not None:
+            for gap in range(self.newest + 1,
+                             min(self.bucket, self.newest + 1 +
+                                 self.capacity)):
+                offset = (gap % self.capacity) * self.width
+                self.data[offset] = _NAN
+        offset = (self.bucket % self.capacity) * self.width
+        for column in range(self.width):
+            self.data[offset + column] = self.sums[column] / self.count
+        self.newest = self.bucket
+        self._reset_accumulator()
+
+    def _reset_accumulator(self):
+        self.sums = [0.0] * self.width
+        self.count = 0
+
+
+class TimeSeries(object):
+
+    """Fixed-size history of a few metrics at several resolutions.
+
+    Every sample is averaged into each tier's current bucket, so recent
+    history is available at full resolution and older history downsampled,
+    and memory use never grows after construction. Values are stored as
+    32-bit floats in ``array`` buffers.
+    """
+
+    def __init__(self, metrics=METRICS, tiers=DEFAULT_TIERS):
+        """Allocate the ring buffers.
+
+        :param metrics: Names of the values recorded with each sample.
+        :type metrics: tuple of str
+        :param tiers: Pairs of resolution in seconds and number of samples
+                      kept, finest first.
+        :type tiers: tuple
+        :raises StorjTorrentError: If no tiers are given.
+        """
+        if not tiers:
+            raise StorjTorrentError('A time series needs at least one tier.')
+        self.metrics = tuple(metrics)
+        self.tiers = [_Tier(resolution, capacity, len(self.metrics))
+                      for resolution, capacity in tiers]
+
+    def record(self, timestamp, values):
+        """Add a sample.
+
+        :param timestamp: Time of the sample in seconds since the epoch.
+        :type timestamp: float
+        :param values: Mapping of metric name to value. Missing metrics are
+                       recorded as 0.
+        :type values: dict
+        """
+        row = [float(values.get(metric, 0)) for metric in self.metrics]
+        for tier in self.tiers:
+            tier.add(timestamp, row)
+
+    def window(self, seconds, end):
+        """Return the samples of the last ``seconds`` before ``end``.
+
+        The finest tier that reaches back far enough is used, so short
+        windows come back at high resolution and long ones downsampled.
+
+        :param seconds: Length of the window.
+        :type seconds: int or float
+        :param end: End of the window in seconds since the epoch.
+        :type end: float
+        :returns: ``(timestamp, {metric: value})`` pairs, oldest first.
+        :rtype: list
+        """
+        tier = self.tiers[-1]
+        for candidate in self.tiers:
+            if candidate.resolution * candidate.capacity >= seconds:
+                tier = candidate
+                break
+        return [(timestamp, dict(zip(self.metrics, row)))
+                for timestamp, row in tier.samples(end - seconds, end)]
+
+
+class TransferHistory(object):
+
+    """Transfer history of every torrent in a session and of the session as
+    a whole."""
+
+    def __init__(self, tiers=DEFAULT_TIERS):
+        """Initialize an empty history.
+
+        :param tiers: Pairs of resolution in seconds and number of samples
+                      kept, finest first, used for every series.
+        :type tiers: tuple
+        :raises StorjTorrentError: If no tiers are given.
+        """
+        self.tier_spec = tiers
+        self._lock = Lock()
+        self._series = {}
+        self.session = TimeSeries(tiers=tiers)
+
+    def record(self, torrent_hash, timestamp, values):
+        """Add a sample for one torrent.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param timestamp: Time of the sample in seconds since the epoch.
+        :type timestamp: float
+        :param values: Mapping of metric name to value.
+        :type values: dict
+        """
+        key = str(torrent_hash)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = TimeSeries(tiers=self.tier_spec)
+            series.record(timestamp, values)
+
+    def record_session(self, timestamp, values):
+        """Add a sample for the session as a whole.
+
+        :param timestamp: Time of the sample in seconds since the epoch.
+        :type timestamp: float
+        :param values: Mapping of metric name to value.
+        :type values: dict
+        """
+        with self._lock:
+            self.session.record(timestamp, values)
+
+    def window(self, torrent_hash, seconds, end):
+        """Return a torrent's samples over the last ``seconds``.
+
+        :param torrent_hash: Info hash of the torrent, or None for the
+                             session as a whole.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param seconds: Length of the window.
+        :type seconds: int or float
+        :param end: End of the window in seconds since the epoch.
+        :type end: float
+        :returns: ``(timestamp, {metric: value})`` pairs, oldest first, or
+                  an empty list for an unknown torrent.
+        :rtype: list
+        """
+        with self._lock:
+            if torrent_hash is None:
+                return self.session.window(seconds, end)
+            series = self._series.get(str(torrent_hash))
+            return series.window(seconds, end) if series else []
+
+    def discard(self, torrent_hash):
+        """Drop a removed torrent's history.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        """
+        with self._lock:
+            self._series.pop(str(torrent_hash), None)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Piece size and pad alignment selection for shard torrents.
+
+libtorrent picks a piece size, up to 2 MiB, that keeps the .torrent file
+near 40 kB and knows nothing about how the shards inside it will be fetched.
+Storj nodes usually fetch and serve single shards, so a piece that straddles
+two shards makes every fetch read and transfer bytes that belong to a
+neighbour. The functions here score candidate layouts against the actual
+shard sizes and pick the cheapest one.
+"""
+
+from __future__ import division
+from collections import namedtuple
+
+BLOCK_SIZE = 16 * 1024
+MAX_PIECE_SIZE = 16 * 1024 * 1024
+DEFAULT_MAX_PIECE_SIZE = 2 * 1024 * 1024
+DEFAULT_TORRENT_SIZE = 40 * 1024
+HASH_SIZE = 20
+FILE_ENTRY_SIZE = 64
+FLAG_OPTIMIZE = 1
+
+Layout = namedtuple('Layout', ['piece_size', 'pad_size_limit', 'flags',
+                               'cost'])
+
+
+def default_piece_size(total_size):
+    """Return the piece size libtorrent would pick for ``piece_size=0``.
+
+    This mirrors ``create_torrent``: the smallest power of two from 16 kiB
+    that keeps piece hashes near 40 kB, but never more than 2 MiB, so large
+    torrents end up with more hashes instead.
+
+    :param total_size: Sum of the sizes of all files in the torrent.
+    :type total_size: int
+    :returns: Piece size in bytes.
+    :rtype: int
+    """
+    target = total_size // (DEFAULT_TORRENT_SIZE // HASH_SIZE)
+    piece_size = BLOCK_SIZE
+    while piece_size < target and piece_size < DEFAULT_MAX_PIECE_SIZE:
+        piece_size *= 2
+    return piece_size
+
+
+def layout_cost(sizes, piece_size, pad_size_limit=-1, metadata_weight=8,
+                fetch_weight=1, piece_overhead=512):
+    """Estimate the cost of laying out ``sizes`` with the given parameters.
+
+    Costs are expressed in bytes so they can be summed:
+
+    * ``metadata_bytes`` is the size of the info dictionary (piece hashes and
+      file entries, including pad files). Every peer that joins the swarm
+      downloads it, so it is multiplied by ``metadata_weight``.
+    * ``fetch_overhead`` is the number of bytes outside a shard that must be
+      downloaded, hash checked and read from the seed's disk when that shard
+      alone is fetched, summed over all shards.
+    * ``piece_overhead`` is charged once per piece a shard spans, covering
+      request round trips, have messages and hash checks. Smaller pieces
+      give finer hashing granularity but pay this more often.
+
+    :param sizes: Shard sizes in the order they are added to the torrent.
+    :type sizes: list of int
+    :param piece_size: Candidate piece size, a multiple of 16 kiB.
+    :type piece_size: int
+    :param pad_size_limit: Files larger than this are aligned to a piece
+                           boundary with a pad file. -1 disables padding.
+    :type pad_size_limit: int
+    :returns: Breakdown of the estimated costs, with the weighted sum under
+              ``total``.
+    :rtype: dict
+    """
+    offset = 0
+    padding = 0
+    pad_files = 0
+    fetch_overhead = 0
+    pieces_touched = 0
+
+    for size in sizes:
+        misalignment = offset % piece_size
+        if (pad_size_limit != -1 and size > pad_size_limit and
+                misalignment):
+            pad = piece_size - misalignment
+            padding += pad
+            pad_files += 1
+            offset += pad
+        if size:
+            first = offset // piece_size
+            last = (offset + size - 1) // piece_size
+            spanned = last - first + 1
+            pieces_touched += spanned
+            fetch_overhead += spanned * piece_size - size
+        offset += size
+
+    num_pieces = -(-offset // piece_size) if offset else 0
+    metadata_bytes = (num_pieces * HASH_SIZE +
+                      (len(sizes) + pad_files) * FILE_ENTRY_SIZE)
+    total = (metadata_bytes * metadata_weight +
+             fetch_overhead * fetch_weight +
+             pieces_touched * piece_overhead)
+
+    return {
+        'piece_size': piece_size,
+        'pad_size_limit': pad_size_limit,
+        'num_pieces': num_pieces,
+        'padding_bytes': padding,
+        'metadata_bytes': metadata_bytes,
+        'fetch_overhead': fetch_overhead,
+        'read_amplification': ((sum(sizes) + fetch_overhead) / sum(sizes)
+                               if sum(sizes) else 1.0),
+        'pieces_touched': pieces_touched,
+        'total': total
+    }
+
+
+def optimize_layout(sizes, min_piece_size=BLOCK_SIZE,
+                    max_piece_size=MAX_PIECE_SIZE, **weights):
+    """Choose the piece size and pad alignment with the lowest cost.
+
+    Every power of two between ``min_piece_size`` and ``max_piece_size`` is
+    tried, both without padding and with shards aligned once they are at
+    least half a piece, one piece or four pieces long. Extra keyword
+    arguments are passed to :func:`layout_cost` to change the weights.
+
+    >>> optimize_layout([4 * 1024 * 1024] * 8).piece_size
+    4194304
+
+    :param sizes: Shard sizes in the order they are added to the torrent.
+    :type sizes: list of int
+    :param min_piece_size: Smallest piece size to consider.
+    :type min_piece_size: int
+    :param max_piece_size: Largest piece size to consider.
+    :type max_piece_size: int
+    :returns: The chosen ``piece_size``, ``pad_size_limit`` and ``flags`` for
+              ``libtorrent.create_torrent``, with the cost breakdown.
+    :rtype: Layout
+    """
+    best = None
+    piece_size = min_piece_size
+    while piece_size <= max_piece_size:
+        for pad_size_limit in (-1, piece_size // 2, piece_size,
+                               4 * piece_size):
+            cost = layout_cost(sizes, piece_size, pad_size_limit, **weights)
+            if best is None or cost['total'] < best['total']:
+                best = cost
+        piece_size *= 2
+
+    flags = FLAG_OPTIMIZE if best['pad_size_limit'] != -1 else 0
+    return Layout(best['piece_size'], best['pad_size_limit'], flags, best)
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Trusted manifest of seeded files for fast startup verification.
+
+Without valid resume data libtorrent hashes every piece on disk before it
+will seed a torrent. The manifest remembers, for each completed torrent, the
+size and modification time of every file plus its piece hashes. Torrents
+whose files still match can be added in seed mode straight away while a
+:class:`BackgroundVerifier` rehashes them slowly in the background.
+"""
+
+from __future__ import division
+from .thread_management import StoppableThread
+from binascii import hexlify
+from threading import Lock
+import hashlib
+import hmac
+import json
+import os
+import time
+
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+
+
+class Manifest(object):
+
+    """File sizes, mtimes and piece hashes of torrents known to be complete.
+
+    The manifest is stored as JSON together with a SHA-256 checksum of its
+    contents, or an HMAC-SHA256 signature when a key is given. A manifest that
+    fails the check is ignored as a whole so torrents fall back to a normal
+    recheck.
+    """
+
+    def __init__(self, path, key=None):
+        """Load the manifest at ``path`` if it exists.
+
+        :param path: Location of the manifest file.
+        :type path: str
+        :param key: Optional secret used to sign the manifest.
+        :type key: str
+        """
+        self.path = path
+        self.key = key
+        self.torrents = {}
+        self.dirty = False
+        self._lock = Lock()
+        self.load()
+
+    def load(self):
+        """Read the manifest from disk, discarding it if it fails to verify.
+
+        :returns: Whether a valid manifest was loaded.
+        :rtype: bool
+        """
+        try:
+            with open(self.path, 'r') as manifest_file:
+                data = json.load(manifest_file)
+            torrents = data['torrents']
+            if not hmac.compare_digest(str(data['checksum']),
+                                       self._checksum(torrents)):
+                return False
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return False
+        with self._lock:
+            self.torrents = torrents
+        return True
+
+    def save(self):
+        """Write the manifest to disk atomically if it has changed.
+
+        :returns: Whether the manifest was written.
+        :rtype: bool
+        """
+        with self._lock:
+            if not self.dirty:
+                return False
+            data = {'torrents': self.torrents,
+                    'checksum': self._checksum(self.torrents)}
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as manifest_file:
+                json.dump(data, manifest_file, sort_keys=True)
+            os.rename(temp_path, self.path)
+            self.dirty = False
+        return True
+
+    def record(self, torrent_info, save_path):
+        """Remember the current on-disk state of a complete torrent.
+
+        :param torrent_info: Metadata of the torrent.
+        :type torrent_info: libtorrent.torrent_info
+        :param save_path: Directory the torrent's files are stored under.
+        :type save_path: str
+        """
+        files = []
+        for entry in _data_files(torrent_info):
+            stat = os.stat(os.path.join(save_path, entry.path))
+            files.append([entry.path, stat.st_size, int(stat.st_mtime)])
+        entry = {'name': torrent_info.name(),
+                 'files': files,
+                 'pieces': _piece_hashes(torrent_info)}
+        with self._lock:
+            self.torrents[str(torrent_info.info_hash())] = entry
+            self.dirty = True
+
+    def discard(self, torrent_hash):
+        """Forget a torrent, for example after it failed verification.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        """
+        with self._lock:
+            if self.torrents.pop(str(torrent_hash), None) is not None:
+                self.dirty = True
+
+    def matches(self, torrent_info, save_path):
+        """Check whether a torrent's files are unchanged since recorded.
+
+        :param torrent_info: Metadata of the torrent being added.
+        :type torrent_info: libtorrent.torrent_info
+        :param save_path: Directory the torrent's files are stored under.
+        :type save_path: str
+        :returns: True if every file has the recorded size and mtime.
+        :rtype: bool
+        """
+        with self._lock:
+            entry = self.torrents.get(str(torrent_info.info_hash()))
+        if entry is None or entry['pieces'] != _piece_hashes(torrent_info):
+            return False
+        for path, size, mtime in entry['files']:
+            try:
+                stat = os.stat(os.path.join(save_path, path))
+            except OSError:
+                return False
+            if stat.st_size != size or int(stat.st_mtime) != mtime:
+                return False
+        return True
+
+    def _checksum(self, torrents):
+        body = json.dumps(torrents, sort_keys=True).encode('utf-8')
+        if self.key:
+            return hmac.new(self.key.encode('utf-8'), body,
+                            hashlib.sha256).hexdigest()
+        return hashlib.sha256(body).hexdigest()
+
+
+class BackgroundVerifier(object):
+
+    """Rehashes torrents admitted from the manifest without blocking seeding.
+
+    A small pool of threads hashes several torrents in parallel. Reads are
+    capped at ``max_rate`` bytes per second per thread so the verifier stays
+    out of the way of peers being served from the same disks.
+    """
+
+    def __init__(self, workers=2, max_rate=0, chunk_size=1024 * 1024):
+        """Start the verification threads.
+
+        :param workers: Number of torrents hashed in parallel.
+        :type workers: int
+        :param max_rate: Read rate cap per worker in bytes per second. A
+                         value of 0 means unbounded.
+        :type max_rate: int
+        :param chunk_size: Number of bytes read from disk at a time.
+        :type chunk_size: int
+        """
+        self.max_rate = max_rate
+        self.chunk_size = chunk_size
+        self.queue = Queue()
+        self._lock = Lock()
+        self.stats = {'queued': 0, 'verified': 0, 'failed': 0, 'bytes': 0}
+        self.threads = [_VerifyWorker(self) for _ in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def schedule(self, torrent_info, save_path, on_failure, on_success=None):
+        """Queue a torrent for background verification.
+
+        :param torrent_info: Metadata of the torrent to verify.
+        :type torrent_info: libtorrent.torrent_info
+        :param save_path: Directory the torrent's files are stored under.
+        :type save_path: str
+        :param on_failure: Called with the info hash if any piece does not
+                           match.
+        :type on_failure: function
+        :param on_success: Called with the info hash if every piece matches.
+        :type on_success: function
+        """
+        self._count('queued')
+        self.queue.put((torrent_info, save_path, on_failure, on_success))
+
+    def stop(self):
+        """Stop all verification threads, abandoning queued work."""
+        for thread in self.threads:
+            thread.stop()
+
+    def verify(self, torrent_info, save_path, stop_event=None):
+        """Hash every piece of a torrent and compare it with its metadata.
+
+        :param torrent_info: Metadata of the torrent to verify.
+        :type torrent_info: libtorrent.torrent_info
+        :param save_path: Directory the torrent's files are stored under.
+        :type save_path: str
+        :param stop_event: Event that aborts verification when set.
+        :type stop_event: threading.Event
+        :returns: True if all pieces match, False if one does not and None if
+                  verification was aborted.
+        :rtype: bool
+        """
+        piece = 0
+        remaining = torrent_info.piece_size(0)
+        digest = hashlib.sha1()
+        started = time.time()
+        read = 0
+
+        try:
+            for chunk in _torrent_chunks(torrent_info, save_path,
+                                         self.chunk_size):
+                if stop_event is not None and stop_event.is_set():
+                    return None
+                view = memoryview(chunk)
+                while len(view):
+                    take = min(remaining, len(view))
+                    digest.update(view[:take])
+                    view = view[take:]
+                    remaining -= take
+                    if remaining == 0:
+                        if (digest.digest() !=
+                                torrent_info.hash_for_piece(piece)):
+                            return False
+                        piece += 1
+                        digest = hashlib.sha1()
+                        if piece < torrent_info.num_pieces():
+                            remaining = torrent_info.piece_size(piece)
+                read += len(chunk)
+                self._count('bytes', len(chunk))
+                if self.max_rate:
+                    ahead = read / self.max_rate - (time.time() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (IOError, OSError):
+            return False
+        return piece == torrent_info.num_pieces()
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+
+class _VerifyWorker(StoppableThread):
+
+    def __init__(self, verifier):
+        super(_VerifyWorker, self).__init__()
+        self.verifier = verifier
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                job = self.verifier.queue.get(timeout=0.25)
+            except Empty:
+                continue
+            torrent_info, save_path, on_failure, on_success = job
+            result = self.verifier.verify(torrent_info, save_path,
+                                          self.stop_event)
+            info_hash = torrent_info.info_hash()
+            if result is False:
+                self.verifier._count('failed')
+                on_failure(info_hash)
+            elif result is True:
+                self.verifier._count('verified')
+                if on_success is not None:
+                    on_success(info_hash)
+
+
+def _data_files(torrent_info):
+    return [entry for entry in torrent_info.files()
+            if not getattr(entry, 'pad_file', False)]
+
+
+def _piece_hashes(torrent_info):
+    return hexlify(b''.join(torrent_info.hash_for_piece(piece)
+                            for piece in range(torrent_info.num_pieces()))
+                   ).decode('ascii')
+
+
+def _torrent_chunks(torrent_info, save_path, chunk_size):
+    for entry in torrent_info.files():
+        if getattr(entry, 'pad_file', False):
+            size = entry.size
+            while size > 0:
+                take = min(size, chunk_size)
+                yield b'\0' * take
+                size -= take
+            continue
+        path = os.path.join(save_path, entry.path)
+        with open(path, 'rb') as data_file:
+            if os.fstat(data_file.fileno()).st_size != entry.size:
+                raise IOError('File size does not match torrent: %s' % path)
+            while True:
+                chunk = data_file.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import division
+from .exception import RemovalError
+from threading import Event, Lock
+import time
+
+
+class RemovalFuture(object):
+
+    """Outcome of removing a torrent, available once libtorrent is done.
+
+    When files are deleted the future is resolved by libtorrent's
+    ``torrent_deleted_alert`` or ``torrent_delete_failed_alert``, otherwise
+    as soon as the torrent is removed.
+    """
+
+    def __init__(self, info_hash):
+        """Initialize an unresolved future.
+
+        :param info_hash: Hex info hash of the torrent being removed.
+        :type info_hash: str
+        """
+        self.info_hash = info_hash
+        self._event = Event()
+        self._lock = Lock()
+        self._callbacks = []
+        self._reclaimed = None
+        self._error = None
+
+    def done(self):
+        """Return whether the removal has finished."""
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the removal to finish.
+
+        :param timeout: Maximum number of seconds to wait. None waits
+                        forever.
+        :type timeout: int or float
+        :returns: Bytes of torrent data deleted from disk, or None on
+                  timeout.
+        :rtype: int
+        :raises RemovalError: If the files could not be deleted.
+        """
+        if not self._event.wait(timeout):
+            return None
+        if self._error is not None:
+            raise self._error
+        return self._reclaimed
+
+    def add_done_callback(self, callback):
+        """Call ``callback`` with this future once the removal finishes, at
+        once if it already has.
+
+        :param callback: Function taking the future.
+        :type callback: function
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _resolve(self, reclaimed=0, error=None):
+        with self._lock:
+            self._reclaimed = reclaimed
+            self._error = error
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+class RemovalTracker(object):
+
+    """Matches removed torrents with libtorrent's deletion alerts."""
+
+    def __init__(self):
+        """Initialize an empty tracker."""
+        self._lock = Lock()
+        self._pending = {}
+        self._stats = {'requested': 0, 'deleted': 0, 'failed': 0,
+                       'reclaimed': 0, 'total_latency': 0.0,
+                       'max_latency': 0.0}
+
+    def track(self, torrent_hash, size):
+        """Start waiting for a torrent's files to be deleted.
+
+        Call this before asking libtorrent to remove the torrent, so the
+        alert cannot arrive first.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param size: Bytes of torrent data on disk.
+        :type size: int
+        :returns: Future resolved by :meth:`deleted` or :meth:`failed`.
+        :rtype: RemovalFuture
+        """
+        key = str(torrent_hash)
+        future = RemovalFuture(key)
+        with self._lock:
+            self._pending.setdefault(key, []).append(
+                (future, size, time.time()))
+            self._stats['requested'] += 1
+        return future
+
+    def resolved(self, torrent_hash, reclaimed=0, error=None):
+        """Return a future that is already finished.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param reclaimed: Bytes deleted from disk.
+        :type reclaimed: int
+        :param error: Why the removal failed, if it did.
+        :type error: RemovalError
+        :rtype: RemovalFuture
+        """
+        future = RemovalFuture(str(torrent_hash))
+        future._resolve(reclaimed, error)
+        return future
+
+    def deleted(self, torrent_hash):
+        """Resolve the oldest pending removal of a torrent as deleted.
+
+        :param torrent_hash: Info hash from the deletion alert.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        """
+        pending = self._pop(torrent_hash)
+        if pending is None:
+            return
+        future, size, requested = pending
+        self._record('deleted', size, time.time() - requested)
+        future._resolve(size)
+
+    def failed(self, torrent_hash, message):
+        """Resolve the oldest pending removal of a torrent as failed.
+
+        :param torrent_hash: Info hash from the deletion alert.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param message: Description of the failure.
+        :type message: str
+        """
+        pending = self._pop(torrent_hash)
+        if pending is None:
+            return
+        future, _, requested = pending
+        self._record('failed', 0, time.time() - requested)
+        future._resolve(error=RemovalError(message))
+
+    def cancel(self, message):
+        """Fail every pending removal, for when no more alerts will come.
+
+        :param message: Description of why the removals were abandoned.
+        :type message: str
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        now = time.time()
+        for removals in pending.values():
+            for future, _, requested in removals:
+                self._record('failed', 0, now - requested)
+                future._resolve(error=RemovalError(message))
+
+    def stats(self):
+        """Return removal counts, bytes reclaimed and deletion latency.
+
+        :returns: Numbers of deletions 'requested', 'deleted', 'failed' and
+                  'pending', bytes 'reclaimed', and the 'mean_latency' and
+                  'max_latency' in seconds from request to alert.
+        :rtype: dict
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = sum(len(futures)
+                                   for futures in self._pending.values())
+        finished = stats['deleted'] + stats['failed']
+        total_latency = stats.pop('total_latency')
+        stats['mean_latency'] = (total_latency / finished
+                                 if finished else 0.0)
+        return stats
+
+    def _pop(self, torrent_hash):
+        key = str(torrent_hash)
+        with self._lock:
+            pending = self._pending.get(key)
+            if not pending:
+                return None
+            first = pending.pop(0)
+            if not pending:
+                del self._pending[key]
+            return first
+
+    def _record(self, outcome, reclaimed, latency):
+        with self._lock:
+            self._stats[outcome] += 1
+            self._stats['reclaimed'] += reclaimed
+            self._stats['total_latency'] += latency
+            self._stats['max_latency'] = max(self._stats['max_latency'],
+                                             latency)
@@ -24,13 +24,57 @@
 # SOFTWARE.
 
 from __future__ import print_function
-from .thread_management import IntervalTimer
-from .exception import StorjTorrentError
+from .thread_management import Scheduler, EventLoop
+from .events import TorrentEvents, COMPLETE_STATES
+from .manifest import Manifest, BackgroundVerifier
+from .shard_index import ShardIndex
+from .announce import AnnounceScheduler
+from .allocator import BudgetAllocator
+from .admission import AdmissionQueue
+from .history import TransferHistory, DEFAULT_TIERS
+from .stall import StallDetector
+from .bandwidth import BandwidthShaper, LIMIT_KEYS
+from .removal import RemovalTracker
+from .tracing import tracer, traced
+from .fetch import TorrentFetcher
+from .warming import CacheWarmer, BLOCK_SIZE
+from .exception import StorjTorrentError, AdmissionError, RemovalError
 from .version import __version__
 import libtorrent as lt
+import binascii
 import os
 import sys
-import uuid
+import time
+
+STATE_STR = ['queued', 'checking', 'downloading metadata', 'downloading',
+             'finished', 'seeding', 'allocating', 'checking fastresume']
+
+# Only ask libtorrent for the status fields we report, skipping the piece
+# bitfield and other per-torrent copies made on every status refresh.
+STATUS_FLAGS = getattr(getattr(lt, 'status_flags_t', None),
+                       'query_distributed_copies', 0xffffffff)
+
+# libtorrent storage mode for each allocation mode. Compact allocation was
+# removed from libtorrent, so it is served by sparse files, which likewise
+# only take up the space of the data written so far.
+ALLOCATION_MODES = {'sparse': 'storage_mode_sparse',
+                    'compact': 'storage_mode_sparse',
+                    'full': 'storage_mode_allocate',
+                    'allocate': 'storage_mode_allocate'}
+
+# Seconds between writes of a changed manifest. Completed torrents are only
+# recorded as they finish, so a burst of them costs one write.
+MANIFEST_SAVE_INTERVAL = 5
+
+# Whether each transport policy allows TCP and uTP connections.
+TRANSPORTS = {'tcp': (True, False), 'utp': (False, True),
+              'mixed': (True, True)}
+
+# uTP tuning knobs, each set as the session setting of the same name with a
+# 'utp_' prefix, e.g. target_delay sets utp_target_delay in milliseconds.
+UTP_OPTIONS = ('target_delay', 'gain_factor', 'min_timeout', 'syn_resends',
+               'fin_resends', 'num_resends', 'connect_timeout',
+               'delayed_ack', 'dynamic_sock_buf', 'loss_multiplier')
 
 
 class Session(object):
@@ -40,9 +84,21 @@ class Session(object):
     def __init__(self, port_min=6881, port_max=6891, max_download_rate=0,
                  max_upload_rate=0, save_path='.', allocation_mode='compact',
                  proxy_host='', alert_mask=0xfffffff, verbose=False,
-                 status_update_interval=0.25,
+                 status_update_interval=0.25, checkpoint_interval=300,
                  bootstrap_node='router.bittorrent.com',
-                 bootstrap_port=6881):
+                 bootstrap_port=6881, manifest_path=None, manifest_key=None,
+                 verify_workers=2, verify_rate=10000, shard_index=None,
+                 announce_window=60, announce_rate=20, lean=False,
+                 evict_idle_after=600, connections_limit=200,
+                 unchoke_slots_limit=8, rebalance_interval=10,
+                 admission_limits=None, max_active_downloads=None,
+                 max_queued_downloads=1000, history_tiers=DEFAULT_TIERS,
+                 stall_after=300, stall_escalate_after=120,
+                 stall_action='deprioritize', bandwidth_classes=None,
+                 ignore_limits_on_local_network=True, fetch_cache=None,
+                 fetch_concurrency=4, transport='mixed', utp_options=None,
+                 rate_limit_utp=None, warm_cache=False, warm_interval=10,
+                 warm_top=8, warm_read_ahead=4):
         """Initialize libtorrent session with supplied parameters.
 
         :param port: Listening port.
@@ -58,8 +114,11 @@ class Session(object):
                           placed.
         :type save_path: str
         :param allocation_mode: Set the mode used for allocating the downloaded
-                                files on disk. Possible options include 'full'
-                                and 'compact'.
+                                files on disk. Possible options include
+                                'sparse', 'compact' (the same as sparse) and
+                                'full', which preallocates whole files so
+                                that seeds read from unfragmented files.
+                                Torrents may override it in add_torrent().
         :type allocation_mode: str
         :param proxy_host: Sets a HTTP proxy host and port, separate by a
                            colon.
@@ -75,10 +134,146 @@ class Session(object):
                                        current information about the torrents
                                        it is managing.
         :type status_update_interval: int or float
+        :param checkpoint_interval: The interval, in seconds, at which resume
+                                    data and the manifest are written for
+                                    torrents that changed since the last
+                                    checkpoint. A value of 0 disables
+                                    checkpoints.
+        :type checkpoint_interval: int or float
         :param bootstrap_node: Boostrap DHT router to connect to.
         :type boostrap_node: str
         :param bootstrap_port: Port of boostrap DHT router to connect to.
         :type bootstrap_port: int
+        :param manifest_path: Location of a manifest recording the files of
+                              completed torrents. Torrents whose files still
+                              match it are seeded without a recheck and
+                              verified in the background instead. Changes
+                              are written every few seconds and when the
+                              session stops. None disables the manifest.
+        :type manifest_path: str
+        :param manifest_key: Secret used to sign the manifest. Without it the
+                             manifest is only protected by a checksum.
+        :type manifest_key: str
+        :param verify_workers: Number of torrents verified in parallel in the
+                               background.
+        :type verify_workers: int
+        :param verify_rate: Maximum disk read rate of each background
+                            verification worker in kB/s. A value of 0 means
+                            the rate is unbounded.
+        :type verify_rate: int or float
+        :param shard_index: Catalog, or path to one, in which the shards of
+                            every added torrent are recorded.
+        :type shard_index: storjtorrent.ShardIndex or str
+        :param announce_window: Seconds over which a reannounce of every
+                                torrent is spread.
+        :type announce_window: int or float
+        :param announce_rate: Maximum number of DHT announces sent per
+                              second.
+        :type announce_rate: int or float
+        :param lean: Reduce per-torrent work for nodes seeding very many
+                     torrents by evicting idle seeds from the session's
+                     bookkeeping. Evicted torrents stay in libtorrent, with
+                     their metadata, so they are still announced, served
+                     and saved, but are no longer polled or tracked. They
+                     are reloaded as soon as a peer connects to them, or by
+                     reload_torrent().
+        :type lean: bool
+        :param evict_idle_after: In lean mode, seconds a seeding torrent must
+                                 go without peers or uploads before it is
+                                 evicted.
+        :type evict_idle_after: int or float
+        :param connections_limit: Total number of peer connections for all
+                                  torrents. It is divided between torrents by
+                                  demand.
+        :type connections_limit: int
+        :param unchoke_slots_limit: Total number of peers unchoked at once
+                                    across all torrents. It is divided
+                                    between torrents by demand.
+        :type unchoke_slots_limit: int
+        :param rebalance_interval: The interval, in seconds, at which the
+                                   connection and upload slot budgets are
+                                   divided again.
+        :type rebalance_interval: int or float
+        :param admission_limits: Mapping of priority class (e.g. 'repair',
+                                 'retrieval', 'replication') to the number
+                                 of its downloads that may run at once. When
+                                 given, downloads wait in an admission queue
+                                 for a free slot. None starts every download
+                                 immediately.
+        :type admission_limits: dict
+        :param max_active_downloads: Number of downloads that may run at once
+                                     across all classes. Defaults to the sum
+                                     of admission_limits.
+        :type max_active_downloads: int
+        :param max_queued_downloads: Number of downloads that may wait for a
+                                     slot before add_torrent raises
+                                     AdmissionError.
+        :type max_queued_downloads: int
+        :param history_tiers: Pairs of resolution in seconds and number of
+                              samples kept, finest first, for the transfer
+                              history of each torrent and of the session.
+        :type history_tiers: tuple
+        :param stall_after: Seconds a download may go without progress
+                            before it counts as stalled and is reannounced.
+                            A value of 0 disables stall detection.
+        :type stall_after: int or float
+        :param stall_escalate_after: Seconds between the further steps taken
+                                     for a stalled download: connecting to
+                                     its peer hints, then stall_action.
+        :type stall_escalate_after: int or float
+        :param stall_action: What finally happens to a stalled download,
+                             either 'deprioritize' to move it to the bottom
+                             of the queue or 'pause' to stop it until
+                             retry_stalled() is called. Either way its
+                             admission slot is freed.
+        :type stall_action: str
+        :param bandwidth_classes: Mapping of bandwidth class name to a
+                                  dictionary of 'min_download',
+                                  'max_download', 'min_upload' and
+                                  'max_upload' in kB/s. Minimums are
+                                  reserved out of max_download_rate and
+                                  max_upload_rate for classes with torrents,
+                                  ceilings cap the class. Missing or 0 means
+                                  no minimum or no ceiling. None disables
+                                  per-torrent rate limits, and an empty
+                                  mapping raises StorjTorrentError.
+        :type bandwidth_classes: dict
+        :param ignore_limits_on_local_network: Whether peers on the local
+                                               network are exempt from all
+                                               rate limits.
+        :type ignore_limits_on_local_network: bool
+        :param fetch_cache: Directory in which torrent files fetched over
+                            http and https are cached and revalidated with
+                            their ETag or Last-Modified headers. None
+                            disables the cache.
+        :type fetch_cache: str
+        :param fetch_concurrency: Number of torrent files that may be fetched
+                                  at once.
+        :type fetch_concurrency: int
+        :param transport: Which protocols peers are connected over: 'tcp',
+                          'utp' or 'mixed' for both. uTP yields to other
+                          traffic by backing off as queueing delay grows,
+                          which can throttle transfers on fast links.
+        :type transport: str
+        :param utp_options: Mapping of uTP tuning knobs from UTP_OPTIONS to
+                            values, e.g. ``{'target_delay': 50}``. Missing
+                            knobs keep libtorrent's defaults.
+        :type utp_options: dict
+        :param rate_limit_utp: Whether uTP connections count towards the
+                               rate limits. None keeps libtorrent's default.
+        :type rate_limit_utp: bool
+        :param warm_cache: Whether to read the pieces peers are likely to ask
+                           for next from the most requested torrents into
+                           the read cache ahead of time, and suggest cached
+                           pieces to peers.
+        :type warm_cache: bool
+        :param warm_interval: Seconds between cache warming runs.
+        :type warm_interval: int or float
+        :param warm_top: Number of most requested torrents kept warm.
+        :type warm_top: int
+        :param warm_read_ahead: Pieces read ahead per warm torrent on each
+                                run.
+        :type warm_read_ahead: int
         """
 
         if port_min < 0 or port_min > 65525 or not isinstance(port_min, int):
@@ -99,18 +294,53 @@ class Session(object):
             self.max_upload_rate = 1000 * max_upload_rate
 
         self.status_update_interval = status_update_interval
+        self.checkpoint_interval = checkpoint_interval
         self.save_path = os.path.abspath(save_path)
         self.verbose = verbose
+        self.allocation_mode = self._storage_mode(allocation_mode)
         self.compact_allocation = allocation_mode == 'compact'
 
         self.settings = lt.session_settings()
         self.settings.user_agent = 'Storj/' + __version__
+        self.settings.connections_limit = connections_limit
+        self.settings.unchoke_slots_limit = unchoke_slots_limit
+        self.settings.ignore_limits_on_local_network = \
+            ignore_limits_on_local_network
+        self._apply_transport(transport, utp_options or {}, rate_limit_utp)
+        self.warm_interval = warm_interval
+        self.warmer = None
+        if warm_cache:
+            self.warmer = CacheWarmer(warm_top, warm_read_ahead)
+            self.settings.use_read_cache = True
+            suggest_modes = getattr(lt, 'suggest_mode_t', None)
+            if suggest_modes is not None:
+                self.settings.suggest_mode = \
+                    suggest_modes.suggest_read_cache
+        self.rebalance_interval = rebalance_interval
+        self.allocator = BudgetAllocator(connections_limit,
+                                         unchoke_slots_limit)
+        self.shaper = None
+        if bandwidth_classes is not None:
+            if not bandwidth_classes:
+                raise StorjTorrentError(
+                    'bandwidth_classes must define at least one class.')
+            self.shaper = BandwidthShaper(
+                dict((name, self._bandwidth_limits(limits))
+                     for name, limits in bandwidth_classes.items()),
+                self.max_download_rate, self.max_upload_rate)
+        self.admission = None
+        if admission_limits is not None:
+            self.admission = AdmissionQueue(admission_limits,
+                                            max_active_downloads,
+                                            max_queued_downloads)
+            # Admitted downloads must not be queued again by libtorrent.
+            self.settings.active_downloads = self.admission.max_active
 
         self.session = lt.session()
         self.session.set_download_rate_limit(self.max_download_rate)
         self.session.set_upload_rate_limit(self.max_upload_rate)
         self.session.listen_on(port_min, port_max)
-        self.session.set_settings = self.settings
+        self.session.set_settings(self.settings)
         self.session.set_alert_mask(alert_mask)
         self.session.add_dht_router(bootstrap_node, bootstrap_port)
 
@@ -121,12 +351,35 @@ class Session(object):
             proxy_settings.port = int(proxy_host.split(':')[1])
             self.session.set_proxy(proxy_settings)
 
+        self.manifest = None
+        if manifest_path is not None:
+            self.manifest = Manifest(manifest_path, manifest_key)
+        self.verify_workers = verify_workers
+        self.verify_rate = 1000 * verify_rate
+        self.verifier = None
+        if isinstance(shard_index, str):
+            shard_index = ShardIndex(shard_index)
+        self.shard_index = shard_index
+        self.announcer = AnnounceScheduler(announce_window, announce_rate)
+        self.lean = lean
+        self.evict_idle_after = evict_idle_after
+        self._names = {}
+        self._evictable = {}
+        self._evicted = {}
+        self._peer_hints = {}
+        self._priority_classes = {}
+        self.stalls = StallDetector(stall_after, stall_escalate_after,
+                                    stall_action)
+
         self.handles = []
+        self.events = TorrentEvents()
+        self.history = TransferHistory(history_tiers)
+        self.removals = RemovalTracker()
+        self.fetcher = TorrentFetcher(fetch_cache, fetch_concurrency)
         self._status = {'torrents': {}, 'alerts': {}}
         self.alive = True
-        self.subthread = IntervalTimer(status_update_interval,
-                                       self._watch_torrents)
-        self.subthread.start()
+        self.scheduler = self._start_scheduler()
+        self.alert_thread = self._start_alert_thread()
 
     def remove_torrent(self, torrent_hash, delete_files=False):
         """Remove a torrent from being managed by the Session.
@@ -136,83 +389,535 @@ class Session(object):
         :param delete_files: Indicate whether you also want to delete files
                              associated with this torrent.
         :type delete_files: bool
+        :returns: Resolved once the files are deleted, see remove_torrents().
+        :rtype: storjtorrent.RemovalFuture
         """
-        torrent_handle = self.session.find_torrent(torrent_hash)
-        if torrent_handle.is_valid():
-            self.session.remove_torrent(torrent_handle, delete_files)
-            self.handles[:] = [handle for handle in self.handles
-                               if handle != torrent_handle]
+        return self.remove_torrents([torrent_hash], delete_files)[0]
+
+    def remove_torrents(self, torrent_hashes, delete_files=False):
+        """Remove many torrents from the Session at once.
+
+        The session's bookkeeping, shard index and manifest are updated once
+        for the whole batch. libtorrent deletes files in the background, so
+        a future is returned for each torrent which is resolved by the
+        deletion alerts. They need the session to be alive and the alert
+        mask to include storage notifications; those still pending when the
+        session is stopped fail with RemovalError.
+
+        :param torrent_hashes: SHA-1 hashes of the torrents to remove.
+        :type torrent_hashes: list of libtorrent.sha1_hash or str
+        :param delete_files: Indicate whether you also want to delete files
+                             associated with these torrents.
+        :type delete_files: bool
+        :returns: One future per torrent, in order. Its result is the number
+                  of bytes of torrent data deleted, 0 when files are kept,
+                  and it raises RemovalError when deletion failed or the
+                  torrent was not in the session.
+        :rtype: list of storjtorrent.RemovalFuture
+        """
+        keys = [str(torrent_hash) for torrent_hash in torrent_hashes]
+        wanted = set(keys)
+        targets = {}
+        kept = []
+        for handle in self.handles:
+            key = str(handle.info_hash())
+            if key in wanted:
+                targets[key] = handle
+            else:
+                kept.append(handle)
+        self.handles[:] = kept
+
+        futures = []
+        removed = []
+        for key in keys:
+            self._forget(key)
+            handle = targets.pop(key, None) or self._find_handle(key)
+            if not handle.is_valid():
+                futures.append(self.removals.resolved(
+                    key, error=RemovalError(
+                        'Torrent %s is not in the session.' % key)))
+                continue
+            if delete_files and handle.has_metadata():
+                future = self.removals.track(
+                    key, handle.status(0).total_done)
+                self.session.remove_torrent(handle, delete_files)
+            else:
+                self.session.remove_torrent(handle, delete_files)
+                future = self.removals.resolved(key)
+            futures.append(future)
+            removed.append(key)
+            self.events.forget(key)
+            self.announcer.discard(key)
+            self.allocator.discard(key)
+            if delete_files and self.manifest is not None:
+                self.manifest.discard(key)
+
+        if removed:
+            if self.shard_index is not None:
+                self.shard_index.remove_torrents(removed)
+            if delete_files and self.manifest is not None:
+                self.manifest.save()
+        return futures
 
+    def _forget(self, key):
+        """Drop the session's per-torrent state for a removed torrent."""
+        self._evictable.pop(key, None)
+        self._evicted.pop(key, None)
+        self._peer_hints.pop(key, None)
+        self._priority_classes.pop(key, None)
+        self._names.pop(key, None)
+        self.stalls.discard(key)
+        self.history.discard(key)
+        if self.warmer is not None:
+            self.warmer.discard(key)
+        if self.shaper is not None:
+            self.shaper.discard(key)
+        if self.admission is not None:
+            self.admission.release(key)
+
+    def get_fetch_stats(self):
+        """Return counts of torrent file requests and reused connections.
+
+        :returns: Requests sent, torrents downloaded, cached torrents found
+                  unchanged, connections opened and reused, and bytes
+                  received.
+        :rtype: dict
+        """
+        return self.fetcher.stats()
+
+    def _apply_transport(self, transport, utp_options, rate_limit_utp):
+        """Set the transport policy and uTP tuning in the session settings.
+
+        :raises StorjTorrentError: If the transport or a uTP option is
+                                   unknown.
+        """
+        if transport not in TRANSPORTS:
+            raise StorjTorrentError('Unknown transport: %s' % transport)
+        unknown = set(utp_options) - set(UTP_OPTIONS)
+        if unknown:
+            raise StorjTorrentError(
+                'Unknown uTP options: %s' % ', '.join(sorted(unknown)))
+        self.transport = transport
+        tcp, utp = TRANSPORTS[transport]
+        self.settings.enable_outgoing_tcp = tcp
+        self.settings.enable_incoming_tcp = tcp
+        self.settings.enable_outgoing_utp = utp
+        self.settings.enable_incoming_utp = utp
+        for name, value in utp_options.items():
+            setattr(self.settings, 'utp_' + name, value)
+        if rate_limit_utp is not None:
+            self.settings.rate_limit_utp = rate_limit_utp
+
+    @staticmethod
+    def _storage_mode(allocation_mode):
+        """Return the libtorrent storage mode for an allocation mode."""
+        if allocation_mode not in ALLOCATION_MODES:
+            raise StorjTorrentError(
+                'Unknown allocation mode: %s' % allocation_mode)
+        return getattr(lt.storage_mode_t, ALLOCATION_MODES[allocation_mode])
+
+    def get_disk_stats(self):
+        """Return libtorrent's disk cache and disk queue statistics.
+
+        Fields a libtorrent version does not report are 0.
+
+        :returns: Blocks read ('blocks_read'), of which served from the
+                  cache ('blocks_read_hit') or disk ('blocks_read_miss'),
+                  the read cache 'hit_rate', blocks and operations issued
+                  ('blocks_written', 'writes', 'reads'), cache sizes in
+                  blocks ('cache_size', 'read_cache_size'), 'queued_bytes'
+                  waiting to be written, disk job queues ('read_queue',
+                  'write_queue', 'queued_jobs', 'blocked_jobs') and average
+                  job times in microseconds ('average_queue_time',
+                  'average_read_time', 'average_write_time').
+        :rtype: dict
+        """
+        cache = self.session.get_cache_status()
+        status = self.session.status()
+        stats = dict((field, getattr(cache, field, 0)) for field in (
+            'blocks_read', 'blocks_read_hit', 'blocks_written', 'writes',
+            'reads', 'cache_size', 'read_cache_size', 'queued_bytes',
+            'average_queue_time', 'average_read_time',
+            'average_write_time'))
+        stats['blocks_read_miss'] = max(
+            0, stats['blocks_read'] - stats['blocks_read_hit'])
+        stats['hit_rate'] = (
+            float(stats['blocks_read_hit']) / stats['blocks_read']
+            if stats['blocks_read'] else 0.0)
+        stats['read_queue'] = getattr(status, 'disk_read_queue', 0)
+        stats['write_queue'] = getattr(status, 'disk_write_queue', 0)
+        stats['queued_jobs'] = getattr(
+            cache, 'queued_jobs', getattr(cache, 'job_queue_length', 0))
+        stats['blocked_jobs'] = getattr(cache, 'blocked_jobs', 0)
+        return stats
+
+    def get_removal_stats(self):
+        """Return counts, bytes reclaimed and latency of file deletions.
+
+        :returns: Deletions requested, deleted, failed and pending, bytes
+                  reclaimed, and the mean and maximum seconds from request
+                  to completion.
+        :rtype: dict
+        """
+        return self.removals.stats()
+
+    @traced('session.add_torrent')
     def add_torrent(self, torrent_location, max_connections=60,
-                    max_uploads=-1, seeding=False):
+                    max_uploads=-1, seeding=False, priority_class=None,
+                    peers=None, bandwidth_class=None, allocation_mode=None,
+                    upload_only=False):
         """ Add a new torrent to be managed by the libtorrent session.
 
         :param torrent_location: The location of the torrent file. Torrent file
                                  may be located on the local file system or
                                  remotely accessible via the magnet or
-                                 http/https protocols.
+                                 http/https protocols. Torrent files are
+                                 fetched over pooled connections and, with
+                                 fetch_cache, cached.
         :type torrent_location: str
         :param max_connections: Sets the maximum number of connections this
                                 torrent will open. If all connections are used
                                 up, incoming connections may be refused or poor
                                 connetions may be closed. This value must be at
                                 least 2. If -1 is given to the function, it
-                                means unlimited. There may also be a global
-                                limit on the number of connections which may be
-                                set using `connections_limit` in self.settings.
+                                means unlimited. The session's
+                                `connections_limit` is shared between torrents
+                                by demand, and this value caps this torrent's
+                                share.
         :type max_connections: int
         :param max_uploads: Sets the maximum number of peers that are unchoked
                             at the same time on this torrent. If you set this
-                            to -1, there will be no limit. The global maximum
-                            upload limit may be set using `unchoke_slots_limit`
-                            in self.settings.
+                            to -1, there will be no limit. The session's
+                            `unchoke_slots_limit` is shared between torrents
+                            by demand, and this value caps this torrent's
+                            share.
         :type max_uploads: int
+        :param seeding: Whether you are seeding a torrent you already have
+                        all the data for.
+        :type seeding: bool
+        :param priority_class: The download's priority class when the session
+                               has admission limits. Defaults to
+                               'retrieval'. Seeds are never queued.
+        :type priority_class: str
+        :param peers: Addresses of peers known to have the torrent, as
+                      ``(host, port)`` pairs. They are connected to right
+                      away and again if the download stalls.
+        :type peers: list of tuple
+        :param bandwidth_class: The torrent's bandwidth class when the
+                                session has bandwidth classes. Defaults to
+                                priority_class if it is a bandwidth class,
+                                else 'retrieval', or the first class by
+                                name when there is no 'retrieval' class.
+        :type bandwidth_class: str
+        :param allocation_mode: How the torrent's files are allocated on
+                                disk, 'sparse' or 'full'. Defaults to the
+                                session's allocation_mode.
+        :type allocation_mode: str
+        :param upload_only: Never download or allocate: local data is
+                            checked and can be seeded, but nothing is
+                            written to the save path. Such torrents are
+                            never queued.
+        :type upload_only: bool
+        :returns: The info hash of the added torrent.
+        :rtype: libtorrent.sha1_hash
+        :raises AdmissionError: If the admission queue is full, before the
+                                torrent is fetched or added.
+        :raises StorjTorrentError: If the bandwidth class or allocation mode
+                                   is unknown or a torrent file cannot be
+                                   fetched.
         """
 
         if (max_connections < 2 and max_connections is not -1 or
                 not isinstance(max_connections, int)):
             raise StorjTorrentError(
                 'You must have at least two connections per torrent.')
+        if self.shaper is not None:
+            if bandwidth_class is None:
+                bandwidth_class = self._default_bandwidth_class(
+                    priority_class)
+            elif bandwidth_class not in self.shaper.classes:
+                raise StorjTorrentError(
+                    'Unknown bandwidth class: %s' % bandwidth_class)
+        storage_mode = (self.allocation_mode if allocation_mode is None
+                        else self._storage_mode(allocation_mode))
+        if upload_only:
+            # Full allocation would create and grow the payload files.
+            storage_mode = self._storage_mode('sparse')
+        queued = (self.admission is not None and not seeding and
+                  not upload_only)
+        # Refuse before fetching or adding anything.
+        if queued and not self.admission.can_submit(
+                priority_class or 'retrieval'):
+            raise AdmissionError('The download queue is full (%d waiting).' %
+                                 self.admission.max_queued)
 
         atp = {}
         atp['save_path'] = self.save_path
-        atp['storage_mode'] = lt.storage_mode_t.storage_mode_sparse
+        atp['storage_mode'] = storage_mode
         atp['paused'] = False
         atp['auto_managed'] = True
         atp['duplicate_is_error'] = True
         if seeding:
             atp['super_seeding'] = True
+        if upload_only:
+            atp['upload_mode'] = True
+        verify = False
+        if queued:
+            # Held back until the admission queue has a slot for it.
+            atp['paused'] = True
+            atp['auto_managed'] = False
 
-        if (torrent_location.startswith('magnet:') or
-            torrent_location.startswith('http://') or
-                torrent_location.startswith('https://')):
+        if torrent_location.startswith('magnet:'):
             atp['url'] = torrent_location
         else:
-            torrent_info = lt.torrent_info(torrent_location)
+            if (torrent_location.startswith('http://') or
+                    torrent_location.startswith('https://')):
+                with tracer.span('session.fetch'):
+                    torrent_data = self.fetcher.fetch(torrent_location)
+                torrent_entry = lt.bdecode(torrent_data)
+                if torrent_entry is None:
+                    raise StorjTorrentError(
+                        '%s is not a torrent file.' % torrent_location)
+                with tracer.span('lt.torrent_info'):
+                    torrent_info = lt.torrent_info(torrent_entry)
+            else:
+                with tracer.span('lt.torrent_info'):
+                    torrent_info = lt.torrent_info(torrent_location)
             if self.verbose:
                 print('Adding \'%s\'...' % torrent_info.name())
             try:
-                resume_path = ''.join(
-                    [self.save_path, torrent_info.name(), '.fastresume'])
                 atp['resume_data'] = open(
-                    os.path.join(resume_path), 'rb').read()
+                    self._resume_path(torrent_info.name()), 'rb').read()
             except:
                 pass
             atp['ti'] = torrent_info
+            if (self.manifest is not None and
+                    self.manifest.matches(torrent_info, self.save_path)):
+                atp['seed_mode'] = True
+                atp.pop('resume_data', None)
+                verify = True
+            if self.shard_index is not None:
+                self.shard_index.add_torrent(torrent_info)
 
-        handle = self.session.add_torrent(atp)
+        with tracer.span('lt.add_torrent'):
+            handle = self.session.add_torrent(atp)
         self.handles.append(handle)
+        key = str(handle.info_hash())
+        if 'ti' in atp:
+            self._names[key] = torrent_info.name()[:40]
+            if self.lean:
+                self._evictable[key] = (max_connections, max_uploads,
+                                        bandwidth_class)
+        if verify:
+            if self.verifier is None:
+                self.verifier = BackgroundVerifier(self.verify_workers,
+                                                   self.verify_rate)
+            self.verifier.schedule(torrent_info, self.save_path,
+                                   self._verification_failed)
         handle.set_max_connections(max_connections)
         handle.set_max_uploads(max_uploads)
+        if peers:
+            self._peer_hints[key] = list(peers)
+            self._connect_peers(handle, key)
+        self.allocator.set_caps(key, max_connections, max_uploads)
+        if self.shaper is not None:
+            self.shaper.assign(key, bandwidth_class)
+            self.scheduler.reset('rebalance')
+        self.scheduler.reset('status')
+        # The alert thread may already have recorded a newer state.
+        self.events.setdefault(handle.info_hash(),
+                               STATE_STR[handle.status().state])
+        if queued:
+            self._priority_classes[key] = priority_class or 'retrieval'
+            try:
+                self.admission.submit(key, self._priority_classes[key],
+                                      self._admit)
+            except AdmissionError:
+                # Another thread filled the queue since it was checked.
+                self.remove_torrent(handle.info_hash())
+                raise
+            self.events.on_complete(key, self._download_complete)
+        return handle.info_hash()
+
+    def get_admission_stats(self):
+        """Return download queue depth, active downloads and wait times.
+
+        :returns: Mapping of priority class to its statistics, or an empty
+                  dictionary when the session has no admission limits.
+        :rtype: dict
+        """
+        if self.admission is None:
+            return {}
+        return self.admission.stats()
+
+    def _admit(self, key):
+        """Start a download the admission queue has found a slot for."""
+        handle = self._find_handle(key)
+        if handle.is_valid():
+            handle.auto_managed(True)
+            handle.resume()
+
+    def _download_complete(self, key, state):
+        """Free a finished download's admission slot."""
+        self.admission.release(key)
+
+    def _connect_peers(self, handle, key):
+        """Connect a torrent to the peers it was added with."""
+        for host, port in self._peer_hints.get(key, []):
+            handle.connect_peer((host, port), 0)
+
+    def _handle_stall(self, handle, key, step):
+        """Take the next escalation step for a stalled download."""
+        if self.verbose:
+            print('\nDownload %s stalled: %s' % (key, step))
+        if step == 'reannounce':
+            self.announcer.request([handle])
+            self.scheduler.reset('announce')
+        elif step == 'connect_peers':
+            self._connect_peers(handle, key)
+        else:
+            if step == 'pause':
+                handle.auto_managed(False)
+                handle.pause()
+            else:
+                handle.queue_position_bottom()
+            if self.admission is not None:
+                self.admission.release(key)
+
+    def retry_stalled(self, torrent_hash=None):
+        """Restart downloads that were given up on as stalled.
+
+        Paused downloads are resumed, or queued for admission again when the
+        session has admission limits.
+
+        :param torrent_hash: The SHA-1 hash of the torrent to retry, or None
+                             for every stalled download.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :returns: Number of downloads retried.
+        :rtype: int
+        :raises AdmissionError: If the admission queue is full.
+        """
+        keys = ([str(torrent_hash)] if torrent_hash is not None
+                else list(self.stalls.stalled()))
+        retried = 0
+        for key in keys:
+            if not self.stalls.retry(key):
+                continue
+            retried += 1
+            handle = self._find_handle(key)
+            if not handle.is_valid():
+                continue
+            if self.admission is not None and key in self._priority_classes:
+                handle.auto_managed(False)
+                handle.pause()
+                self.admission.submit(key, self._priority_classes[key],
+                                      self._admit)
+            else:
+                handle.auto_managed(True)
+                handle.resume()
+        return retried
+
+    def get_stall_stats(self):
+        """Return how often downloads stalled and for how long.
+
+        :returns: Total stalls, recoveries, currently stalled downloads,
+                  escalation steps taken, stall durations and per-torrent
+                  progress velocity.
+        :rtype: dict
+        """
+        return self.stalls.stats()
+
+    def _find_handle(self, key):
+        """Return the handle of a torrent given its hex info hash."""
+        return self.session.find_torrent(lt.sha1_hash(binascii.unhexlify(key)))
+
+    def reload_torrent(self, torrent_hash):
+        """Resume tracking a torrent that lean mode evicted while it was idle.
+
+        This happens on its own when a peer connects to an evicted torrent.
+
+        :param torrent_hash: The SHA-1 hash of the evicted torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :returns: Whether the torrent had been evicted and was reloaded.
+        :rtype: bool
+        """
+        key = str(torrent_hash)
+        handle = self._evicted.pop(key, None)
+        if handle is None or not handle.is_valid():
+            return False
+        max_connections, max_uploads, bandwidth_class = self._evictable[key]
+        self._names[key] = handle.get_torrent_info().name()[:40]
+        self.handles.append(handle)
+        self.allocator.set_caps(key, max_connections, max_uploads)
+        if self.shaper is not None:
+            self.shaper.assign(key, bandwidth_class)
+            self.scheduler.reset('rebalance')
+        self.scheduler.reset('status')
+        return True
+
+    def evicted_torrents(self):
+        """Return the info hashes of torrents evicted in lean mode."""
+        return list(self._evicted)
+
+    def _all_handles(self):
+        """Return the handles of every torrent in libtorrent, including those
+        evicted in lean mode."""
+        return self.handles + list(self._evicted.values())
+
+    def wait_for(self, torrent_hash, states=COMPLETE_STATES, timeout=None):
+        """Block until a torrent reaches one of the given states.
+
+        Waiting threads are woken by libtorrent's state change alerts, so
+        there is no need to poll get_status().
+
+        :param torrent_hash: The SHA-1 hash of the torrent to wait on.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param states: A state or list of states from the status dictionary's
+                       'state_str' values. Defaults to 'finished' and
+                       'seeding'.
+        :type states: str or list
+        :param timeout: Maximum number of seconds to wait. None waits
+                        forever.
+        :type timeout: int or float
+        :returns: The state reached, or None on timeout or removal.
+        :rtype: str
+        """
+        return self.events.wait_for(torrent_hash, states, timeout)
+
+    def on_complete(self, torrent_hash, callback):
+        """Call ``callback(torrent_hash, state)`` once a torrent completes.
+
+        The callback runs on the session's alert thread, or immediately if
+        the torrent has already finished, so it should return quickly.
+
+        :param torrent_hash: The SHA-1 hash of the torrent to watch.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param callback: Function called with the hex info hash and state.
+        :type callback: function
+        """
+        self.events.on_complete(torrent_hash, callback)
 
     def reannounce(self):
-        """ Reannounce this torrent to DHT immediately.
+        """ Reannounce all torrents to DHT.
+
+        Announces are queued and spread over announce_window seconds at no
+        more than announce_rate per second, with torrents whose peer count
+        recently changed going first.
 
         We aren't using trackers for StorjTorrent, otherwise we would use
         force_reannounce() instead.
         """
-        for handle in self.handles:
-            handle.force_dht_announce()
+        self.announcer.request(self._all_handles())
+        self.scheduler.reset('announce')
+
+    def get_announce_stats(self):
+        """Return DHT announce counts and queueing latency.
+
+        :returns: Announces requested, sent and pending, and the mean and
+                  maximum seconds between request and send.
+        :rtype: dict
+        """
+        return self.announcer.stats()
 
     def set_alive(self, alive):
         """Indicate whether the session should actively handle torrents or not.
@@ -230,9 +935,8 @@ class Session(object):
             self._sleep()
         elif self.alive is False and alive is True:
             self.alive = True
-            self.subthread = IntervalTimer(self.status_update_interval,
-                                           self._watch_torrents)
-            self.subthread.start()
+            self.scheduler = self._start_scheduler()
+            self.alert_thread = self._start_alert_thread()
 
     def pause(self):
         """Pauses all torrents handled by this session."""
@@ -242,22 +946,379 @@ class Session(object):
         """Resumes all torrents handled by this session."""
         self.session.resume()
 
+    @traced('session.sleep')
     def _sleep(self):
         """Halt session management of torrents and write resume data."""
         self.pause()
-        self.subthread.stop()
-        for handle in self.handles:
+        with tracer.span('session.stop_threads'):
+            self.scheduler.stop()
+            self.alert_thread.stop()
+            if self.verifier is not None:
+                self.verifier.stop()
+                self.verifier = None
+            self.fetcher.close()
+        # Deletion alerts are no longer handled, so nothing would resolve
+        # the removals still waiting on one.
+        self.removals.cancel('Session stopped before the files were deleted.')
+        with tracer.span('session.save_resume_data'):
+            self._save_resume_data()
+
+    def _checkpoint(self):
+        """Write resume data for torrents that changed since the last
+        checkpoint."""
+        return self._save_resume_data(changed_only=True) > 0
+
+    def _save_resume_data(self, changed_only=False):
+        """Write resume data and update the manifest.
+
+        :param changed_only: Skip torrents libtorrent reports as unchanged.
+        :type changed_only: bool
+        :returns: Number of torrents written.
+        :rtype: int
+        """
+        written = 0
+        for handle in self._all_handles():
             if not handle.is_valid() or not handle.has_metadata():
                 continue
-            data = lt.bencode(handle.write_resume_data())
-            resume_path = os.path.join(self.save_path, ''.join(
-                [handle.get_torrent_info().name(), '.fastresume']))
-            open(resume_path, 'wb').write(data)
+            if changed_only and not handle.need_save_resume_data():
+                continue
+            self._write_resume_data(handle)
+            written += 1
+        if self.manifest is not None:
+            self.manifest.save()
+        return written
+
+    def _write_resume_data(self, handle):
+        """Write one torrent's resume data and record it in the manifest."""
+        data = lt.bencode(handle.write_resume_data())
+        with open(self._resume_path(handle.get_torrent_info().name()),
+                  'wb') as resume_file:
+            resume_file.write(data)
+        if handle.status().is_seeding:
+            self._record_manifest(handle)
+
+    def _resume_path(self, name):
+        return os.path.join(self.save_path, ''.join([name, '.fastresume']))
+
+    def _evict_idle(self):
+        """Stop tracking idle seeds, keeping them in libtorrent so that they
+        are still announced and served.
+
+        :returns: False when nothing was evicted, so the scheduler can back
+                  off.
+        :rtype: bool
+        """
+        evicted = 0
+        for handle in list(self.handles):
+            key = str(handle.info_hash())
+            if key not in self._evictable or not handle.is_valid():
+                continue
+            status = handle.status(STATUS_FLAGS)
+            idle_for = (status.active_time if status.time_since_upload < 0
+                        else status.time_since_upload)
+            if (not status.is_seeding or status.num_peers or
+                    idle_for < self.evict_idle_after):
+                continue
+            if handle.has_metadata():
+                self._write_resume_data(handle)
+            self.handles[:] = [other for other in self.handles
+                               if other != handle]
+            self._evicted[key] = handle
+            self.allocator.discard(key)
+            self.announcer.discard(key)
+            self.stalls.discard(key)
+            self.history.discard(key)
+            if self.shaper is not None:
+                self.shaper.discard(key)
+            if self.warmer is not None:
+                self.warmer.discard(key)
+            name = self._names.pop(key, None)
+            if name in self._status['torrents']:
+                self._status['torrents'][name]['state_str'] = 'evicted'
+            evicted += 1
+        return evicted > 0
+
+    @traced('session.warm_cache')
+    def _warm_cache(self):
+        """Read ahead the rarest pieces of the most requested seeds, so
+        peers asking for them are served from the cache.
+
+        :returns: False when no torrent is in demand, so the scheduler can
+                  back off.
+        :rtype: bool
+        """
+        now = time.time()
+        hot = self.warmer.hot()
+        warmed_blocks = 0
+        for key in hot:
+            handle = self._find_handle(key)
+            if not handle.is_valid() or not handle.has_metadata():
+                continue
+            torrent_info = handle.get_torrent_info()
+            for piece in self.warmer.plan(key, handle.piece_availability(),
+                                          now):
+                if not handle.have_piece(piece):
+                    continue
+                # The data comes back in a read_piece_alert, which is
+                # dropped; the read is only made to fill the cache.
+                handle.read_piece(piece)
+                warmed_blocks += -(-torrent_info.piece_size(piece) //
+                                   BLOCK_SIZE)
+        disk = self.get_disk_stats()
+        self.warmer.record_cache(disk['blocks_read'], disk['blocks_read_hit'],
+                                 warmed_blocks)
+        return bool(hot)
+
+    def get_cache_warming_stats(self):
+        """Return which torrents are kept warm and the cache hit rate.
+
+        :returns: The warmer's statistics, see CacheWarmer.stats(), or an
+                  empty dictionary when cache warming is off.
+        :rtype: dict
+        """
+        if self.warmer is None:
+            return {}
+        return self.warmer.stats()
+
+    def _rebalance(self):
+        """Apply the allocator's latest division of the connection and
+        upload slot budgets, and the shaper's rate limits."""
+        changed = self.allocator.rebalance()
+        limits = self.shaper.rebalance() if self.shaper is not None else {}
+        if not changed and not limits:
+            return False
+        handles = dict((str(handle.info_hash()), handle)
+                       for handle in self.handles)
+        for key, (max_connections, max_uploads) in changed.items():
+            handle = handles.get(key)
+            if handle is not None and handle.is_valid():
+                handle.set_max_connections(max_connections)
+                handle.set_max_uploads(max_uploads)
+        for key, (download_limit, upload_limit) in limits.items():
+            handle = handles.get(key)
+            if handle is not None and handle.is_valid():
+                handle.set_download_limit(download_limit)
+                handle.set_upload_limit(upload_limit)
+        return True
+
+    def set_bandwidth_class(self, torrent_hash, bandwidth_class):
+        """Move a torrent to another bandwidth class.
+
+        :param torrent_hash: The SHA-1 hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param bandwidth_class: Name of the new class.
+        :type bandwidth_class: str
+        :raises StorjTorrentError: If the session has no bandwidth classes,
+                                   the class is unknown or the torrent is
+                                   not in the session.
+        """
+        if self.shaper is None:
+            raise StorjTorrentError('The session has no bandwidth classes.')
+        key = str(torrent_hash)
+        if not self._find_handle(key).is_valid():
+            raise StorjTorrentError('Torrent %s is not in the session.' % key)
+        if bandwidth_class not in self.shaper.classes:
+            raise StorjTorrentError(
+                'Unknown bandwidth class: %s' % bandwidth_class)
+        if key in self._evictable:
+            self._evictable[key] = (self._evictable[key][:2] +
+                                    (bandwidth_class,))
+        if key in self._evicted:
+            # Applied when the torrent is reloaded.
+            return
+        self.shaper.assign(key, bandwidth_class)
+        self.scheduler.reset('rebalance')
+
+    def _default_bandwidth_class(self, priority_class):
+        """Return the bandwidth class of a torrent added without one."""
+        if priority_class in self.shaper.classes:
+            return priority_class
+        if 'retrieval' in self.shaper.classes:
+            return 'retrieval'
+        return min(self.shaper.classes)
+
+    def set_bandwidth_limits(self, bandwidth_class, **limits):
+        """Add a bandwidth class or change its limits.
+
+        :param bandwidth_class: Name of the class.
+        :type bandwidth_class: str
+        :param limits: Any of 'min_download', 'max_download', 'min_upload'
+                       and 'max_upload' in kB/s. Limits not given are reset
+                       to 0.
+        :raises StorjTorrentError: If the session has no bandwidth classes
+                                   or a limit is unknown.
+        """
+        if self.shaper is None:
+            raise StorjTorrentError('The session has no bandwidth classes.')
+        self.shaper.set_class(bandwidth_class,
+                              **self._bandwidth_limits(limits))
+        self.scheduler.reset('rebalance')
+
+    def get_bandwidth_stats(self):
+        """Return the torrents, rates and limits of each bandwidth class.
+
+        :returns: Mapping of class name to its number of torrents, their
+                  total rates and the class's limits, in bytes per second,
+                  or an empty dictionary without bandwidth classes.
+        :rtype: dict
+        """
+        if self.shaper is None:
+            return {}
+        return self.shaper.stats()
+
+    @staticmethod
+    def _bandwidth_limits(limits):
+        """Convert bandwidth class limits from kB/s to bytes per second."""
+        unknown = set(limits) - set(LIMIT_KEYS)
+        if unknown:
+            raise StorjTorrentError(
+                'Unknown bandwidth limits: %s' % ', '.join(sorted(unknown)))
+        return dict((name, int(1000 * value))
+                    for name, value in limits.items())
+
+    def get_allocations(self):
+        """Return each torrent's share of the connection and upload budgets.
+
+        :returns: Mapping of hex info hash to ``(max_connections,
+                  max_uploads)``.
+        :rtype: dict
+        """
+        return self.allocator.allocations()
+
+    def get_history(self, torrent_hash=None, seconds=300):
+        """Return transfer history over a recent window.
+
+        Short windows come back at one sample per second and longer ones
+        downsampled, see history_tiers.
+
+        :param torrent_hash: Info hash of the torrent, or None for the totals
+                             of the whole session.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param seconds: Length of the window, ending now.
+        :type seconds: int or float
+        :returns: ``(timestamp, sample)`` pairs, oldest first, where each
+                  sample holds 'download_rate' and 'upload_rate' in kB/s,
+                  'num_peers' and 'progress'.
+        :rtype: list
+        """
+        return self.history.window(torrent_hash, seconds, time.time())
+
+    def get_scheduler_stats(self):
+        """Return timing statistics of the session's periodic tasks.
+
+        :returns: Mapping of task name to its interval, runs, overruns and
+                  run times.
+        :rtype: dict
+        """
+        return self.scheduler.stats()
 
     def get_status(self):
         """Return current status of all torrents managed by this session."""
         return self._status
 
+    def _start_scheduler(self):
+        """Start the thread that runs the session's periodic tasks."""
+        scheduler = Scheduler()
+        scheduler.add_periodic('status', self.status_update_interval,
+                               self._watch_torrents,
+                               max_interval=8 * self.status_update_interval)
+        if self.checkpoint_interval:
+            scheduler.add_periodic('checkpoint', self.checkpoint_interval,
+                                   self._checkpoint,
+                                   delay=self.checkpoint_interval)
+        scheduler.add_periodic('announce', 1, self.announcer.tick,
+                               max_interval=8)
+        scheduler.add_periodic('rebalance', self.rebalance_interval,
+                               self._rebalance)
+        if self.manifest is not None:
+            scheduler.add_periodic('manifest', MANIFEST_SAVE_INTERVAL,
+                                   self.manifest.save,
+                                   delay=MANIFEST_SAVE_INTERVAL)
+        if self.warmer is not None:
+            scheduler.add_periodic('warm', self.warm_interval,
+                                   self._warm_cache,
+                                   max_interval=4 * self.warm_interval)
+        if self.lean and self.evict_idle_after:
+            interval = min(60, self.evict_idle_after)
+            scheduler.add_periodic('evict', interval, self._evict_idle,
+                                   max_interval=8 * interval)
+        scheduler.start()
+        return scheduler
+
+    def _start_alert_thread(self):
+        """Start a thread that handles alerts as soon as they are posted."""
+        timeout = max(1, int(self.status_update_interval * 1000))
+        thread = EventLoop(lambda: self.session.wait_for_alert(timeout),
+                           self._process_alerts)
+        thread.start()
+        return thread
+
+    def _process_alerts(self):
+        """Pop pending alerts, record errors and dispatch state changes."""
+        alerts = self.session.pop_alerts()
+        for alert in alerts:
+            if isinstance(alert, lt.state_changed_alert):
+                self.events.update(alert.handle.info_hash(),
+                                   STATE_STR[alert.state])
+            elif isinstance(alert, lt.metadata_received_alert):
+                torrent_info = alert.handle.get_torrent_info()
+                self._names[str(alert.handle.info_hash())] = \
+                    torrent_info.name()[:40]
+                if self.shard_index is not None:
+                    self.shard_index.add_torrent(torrent_info)
+            elif isinstance(alert, lt.torrent_deleted_alert):
+                self.removals.deleted(self._alert_hash(alert))
+            elif isinstance(alert, lt.torrent_delete_failed_alert):
+                self.removals.failed(self._alert_hash(alert),
+                                     alert.message())
+            elif (isinstance(alert, lt.peer_alert) and self._evicted and
+                    str(alert.handle.info_hash()) in self._evicted):
+                # A peer wants an evicted torrent again.
+                self.reload_torrent(alert.handle.info_hash())
+            elif isinstance(alert, lt.torrent_finished_alert):
+                self.events.update(alert.handle.info_hash(),
+                                   STATE_STR[alert.handle.status().state])
+                # Saved by the scheduler's manifest task.
+                self._record_manifest(alert.handle)
+
+        # Only capture errors.
+        errors = [alert for alert in alerts if
+                  alert.category() and
+                  lt.alert.category_t.error_notification]
+        if errors:
+            self._status['alerts'] = [alert.message() for alert in errors]
+            if self.verbose:
+                for alert in errors:
+                    print(alert)
+
+    @staticmethod
+    def _alert_hash(alert):
+        """Return the info hash a deletion alert is about. The alert's
+        handle is no longer valid once the torrent is removed."""
+        info_hash = getattr(alert, 'info_hash', None)
+        if info_hash is None:
+            info_hash = alert.handle.info_hash()
+        return str(info_hash)
+
+    def _record_manifest(self, handle):
+        """Add a complete torrent's files to the manifest."""
+        if self.manifest is None or not handle.has_metadata():
+            return
+        try:
+            self.manifest.record(handle.get_torrent_info(), self.save_path)
+        except OSError:
+            self.manifest.discard(handle.info_hash())
+
+    def _verification_failed(self, torrent_hash):
+        """Fall back to a full recheck for a torrent that failed background
+        verification."""
+        self.manifest.discard(torrent_hash)
+        self.manifest.save()
+        handle = self.session.find_torrent(torrent_hash)
+        if handle.is_valid():
+            handle.force_recheck()
+
+    @traced('session.watch_torrents')
     def _watch_torrents(self):
         """Watches all torrents assigned to the session and updates status
         dictionary with relevant information.
@@ -265,23 +1326,26 @@ class Session(object):
         If verbose is set to True on the session object, this method will also
         print and refresh the associated status information at the given
         interval.
-        """
-        state_str = ['queued', 'checking', 'downloading metadata',
-                     'downloading', 'finished', 'seeding', 'allocating',
-                     'checking fastresume']
 
+        :returns: False when there were no torrents to watch, so the
+                  scheduler can back off.
+        :rtype: bool
+        """
         if self.alive:
+            now = time.time()
+            totals = {'download_rate': 0, 'upload_rate': 0, 'num_peers': 0,
+                      'progress': 0}
             for handle in self.handles:
-                if handle.has_metadata():
-                    name = handle.get_torrent_info().name()[:40]
-                else:
-                    name = ''.join(
-                        ['torrent-', str(uuid.uuid4().fields[-1])[:5]])
+                key = str(handle.info_hash())
+                name = self._names.get(key)
+                if name is None:
+                    name = ''.join(['torrent-', key[:5]])
 
-                status = handle.status()
+                with tracer.span('lt.status'):
+                    status = handle.status(STATUS_FLAGS)
 
                 self._status['torrents'][name] = {
-                    'state_str': state_str[status.state],
+                    'state_str': STATE_STR[status.state],
                     'progress': status.progress,
                     'download_rate': status.download_rate / 1000,
                     'upload_rate': status.upload_rate / 1000,
@@ -289,13 +1353,28 @@ class Session(object):
                     'num_seeds': status.num_seeds,
                     'distributed_copies': status.distributed_copies
                 }
+                self.announcer.note_peers(key, status.num_peers)
+                self.allocator.update(key, status)
+                if self.shaper is not None:
+                    self.shaper.update(key, status)
+                if self.warmer is not None:
+                    self.warmer.update(key, status, now)
+
+                state = STATE_STR[status.state]
+                active = not status.paused and state in (
+                    'downloading metadata', 'downloading')
+                done = status.total_wanted_done if status.has_metadata else -1
+                step = self.stalls.update(key, active, done, now)
+                if step is not None:
+                    self._handle_stall(handle, key, step)
 
-                # Only capture errors.
-                self._status['alerts'] = [alert.message() for alert in
-                                          self.session.pop_alerts() if
-                                          alert.category() and
-                                          lt.alert.category_t
-                                          .error_notification]
+                sample = {'download_rate': status.download_rate / 1000,
+                          'upload_rate': status.upload_rate / 1000,
+                          'num_peers': status.num_peers,
+                          'progress': status.progress}
+                self.history.record(key, now, sample)
+                for metric, value in sample.items():
+                    totals[metric] += value
 
                 if self.verbose:
                     sys.stdout.flush()
@@ -304,10 +1383,10 @@ class Session(object):
                           % (status.progress * 100,
                              status.download_rate / 1000,
                              status.upload_rate / 1000, status.num_peers,
-                             state_str[status.state]),
+                             STATE_STR[status.state]),
                           end=' ')
-                    alerts = self.session.pop_alerts()
-                    for alert in alerts:
-                        if (alert.category() and
-                                lt.alert.category_t.error_notification):
-                            print(alert)
+            if self.handles:
+                # Session progress is the mean over its torrents.
+                totals['progress'] /= len(self.handles)
+            self.history.record_session(now, totals)
+        return bool(self.handles)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from collections import namedtuple
+from threading import Lock
+import os
+import sqlite3
+
+ShardLocation = namedtuple('ShardLocation', ['info_hash', 'file_index',
+                                             'offset', 'length'])
+
+# SQLite limits the number of bound parameters in one statement.
+_QUERY_BATCH = 500
+
+
+class ShardIndex(object):
+
+    """On-disk catalog of which torrent, and where in it, holds each shard.
+
+    Shards are identified by their file name. The catalog is a SQLite
+    database keyed on shard id with a second index on info hash, so single
+    lookups stay fast with tens of millions of rows and whole torrents can be
+    added or dropped in one transaction.
+    """
+
+    def __init__(self, path):
+        """Open or create the catalog at ``path``.
+
+        :param path: Location of the SQLite database file.
+        :type path: str
+        """
+        self.path = path
+        self._lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS shards ('
+            'shard_id TEXT NOT NULL, info_hash TEXT NOT NULL, '
+            'file_index INTEGER NOT NULL, offset INTEGER NOT NULL, '
+            'length INTEGER NOT NULL, PRIMARY KEY (shard_id, info_hash))')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS shards_by_torrent '
+            'ON shards (info_hash)')
+        self.connection.commit()
+
+    def add_torrent(self, torrent_info):
+        """Record every file of a torrent as a shard.
+
+        Pad files are skipped, but file indices still count them so they
+        match libtorrent's.
+
+        :param torrent_info: Metadata of the torrent.
+        :type torrent_info: libtorrent.torrent_info
+        :returns: Number of shards recorded.
+        :rtype: int
+        """
+        shards = [(os.path.basename(entry.path), index, entry.offset,
+                   entry.size)
+                  for index, entry in enumerate(torrent_info.files())
+                  if not getattr(entry, 'pad_file', False)]
+        return self.add_shards(torrent_info.info_hash(), shards)
+
+    def add_shards(self, torrent_hash, shards):
+        """Record shards belonging to one torrent.
+
+        :param torrent_hash: Info hash of the torrent holding the shards.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param shards: Tuples of shard id, file index, byte offset within
+                       the torrent and length.
+        :type shards: iterable
+        :returns: Number of shards recorded.
+        :rtype: int
+        """
+        info_hash = str(torrent_hash)
+        rows = [(shard_id, info_hash, file_index, offset, length)
+                for shard_id, file_index, offset, length in shards]
+        with self._lock:
+            with self.connection:
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO shards VALUES (?, ?, ?, ?, ?)',
+                    rows)
+        return len(rows)
+
+    def lookup(self, shard_id):
+        """Find every torrent holding a shard.
+
+        :param shard_id: The shard's file name.
+        :type shard_id: str
+        :returns: Locations of the shard, empty if it is unknown.
+        :rtype: list of ShardLocation
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT info_hash, file_index, offset, length FROM shards '
+                'WHERE shard_id = ?', (shard_id,)).fetchall()
+        return [ShardLocation(*row) for row in rows]
+
+    def lookup_many(self, shard_ids):
+        """Find the torrents holding each of many shards.
+
+        :param shard_ids: Shard file names.
+        :type shard_ids: iterable
+        :returns: Mapping of shard id to its locations. Unknown shards are
+                  left out.
+        :rtype: dict
+        """
+        shard_ids = list(shard_ids)
+        found = {}
+        with self._lock:
+            for start in range(0, len(shard_ids), _QUERY_BATCH):
+                batch = shard_ids[start:start + _QUERY_BATCH]
+                rows = self.connection.execute(
+                    'SELECT shard_id, info_hash, file_index, offset, length '
+                    'FROM shards WHERE shard_id IN (%s)' %
+                    ', '.join('?' * len(batch)), batch)
+                for row in rows:
+                    found.setdefault(row[0], []).append(
+                        ShardLocation(*row[1:]))
+        return found
+
+    def shards(self, torrent_hash):
+        """List the shards recorded for a torrent.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :returns: Tuples of shard id and location, in file order.
+        :rtype: list
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT shard_id, info_hash, file_index, offset, length '
+                'FROM shards WHERE info_hash = ? ORDER BY file_index',
+                (str(torrent_hash),)).fetchall()
+        return [(row[0], ShardLocation(*row[1:])) for row in rows]
+
+    def remove_torrent(self, torrent_hash):
+        """Forget every shard recorded for a torrent.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :returns: Number of shards removed.
+        :rtype: int
+        """
+        with self._lock:
+            with self.connection:
+                cursor = self.connection.execute(
+                    'DELETE FROM shards WHERE info_hash = ?',
+                    (str(torrent_hash),))
+        return cursor.rowcount
+
+    def remove_torrents(self, torrent_hashes):
+        """Forget every shard recorded for many torrents in one transaction.
+
+        :param torrent_hashes: Info hashes of the torrents.
+        :type torrent_hashes: iterable
+        :returns: Number of shards removed.
+        :rtype: int
+        """
+        rows = [(str(torrent_hash),) for torrent_hash in torrent_hashes]
+        with self._lock:
+            with self.connection:
+                before = self.connection.total_changes
+                self.connection.executemany(
+                    'DELETE FROM shards WHERE info_hash = ?', rows)
+                return self.connection.total_changes - before
+
+    def count(self):
+        """Return the number of shard locations in the catalog."""
+        with self._lock:
+            return self.connection.execute(
+                'SELECT COUNT(*) FROM shards').fetchone()[0]
+
+    def close(self):
+        """Close the underlying database."""
+        with self._lock:
+            self.connection.close()
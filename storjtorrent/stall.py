@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import division
+from .exception import StorjTorrentError
+from threading import Lock
+import time
+
+# Steps taken, in order, while a torrent stays stalled. The last one is
+# either 'deprioritize' or 'pause'.
+STALL_STEPS = ('reannounce', 'connect_peers')
+STALL_ACTIONS = ('deprioritize', 'pause')
+
+# Weight of the newest sample in the progress velocity average.
+_VELOCITY_WEIGHT = 0.2
+
+
+class _Progress(object):
+
+    __slots__ = ('done', 'marked_at', 'updated_at', 'velocity', 'level')
+
+    def __init__(self, done, now):
+        self.done = done
+        self.marked_at = now
+        self.updated_at = now
+        self.velocity = 0.0
+        self.level = 0
+
+
+class StallDetector(object):
+
+    """Notices downloads that stopped making progress and escalates.
+
+    A download is stalled once its downloaded byte count has not grown for
+    ``stall_after`` seconds. It is then reannounced, connected to its peer
+    hints ``escalate_after`` seconds later and finally deprioritized or
+    paused, so its active slot goes to a torrent that can use it. Any
+    progress ends the stall.
+    """
+
+    def __init__(self, stall_after=300, escalate_after=120,
+                 action='deprioritize'):
+        """Initialize the stall detector.
+
+        :param stall_after: Seconds without progress before a download
+                            counts as stalled. A value of 0 disables the
+                            detector.
+        :type stall_after: int or float
+        :param escalate_after: Seconds between escalation steps.
+        :type escalate_after: int or float
+        :param action: Last step, either 'deprioritize' or 'pause'.
+        :type action: str
+        :raises StorjTorrentError: If action is unknown.
+        """
+        if action not in STALL_ACTIONS:
+            raise StorjTorrentError('Unknown stall action: %s' % action)
+        self.stall_after = stall_after
+        self.escalate_after = escalate_after
+        self.steps = STALL_STEPS + (action,)
+        self._lock = Lock()
+        self._progress = {}
+        self._stats = {'stalls': 0, 'recovered': 0, 'ended': 0,
+                       'total_duration': 0.0, 'max_duration': 0.0}
+        self._actions = dict((step, 0) for step in self.steps)
+
+    def update(self, torrent_hash, active, done, now=None):
+        """Record a download's progress and return the step now due.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param active: Whether the torrent is running and wants data. Paused,
+                       queued, checking and complete torrents are not
+                       tracked.
+        :type active: bool
+        :param done: Number of wanted bytes downloaded so far. Use -1 while
+                     metadata is missing, so that receiving it counts as
+                     progress.
+        :type done: int
+        :param now: Time of the sample, defaults to the current time.
+        :type now: float
+        :returns: The step to take, one of STALL_STEPS or the final action,
+                  or None.
+        :rtype: str
+        """
+        if not self.stall_after:
+            return None
+        key = str(torrent_hash)
+        now = time.time() if now is None else now
+        with self._lock:
+            progress = self._progress.get(key)
+            if not active:
+                # A parked torrent stays stalled until it is retried.
+                if progress is not None and (
+                        progress.level < len(self.steps)):
+                    self._end(key, now, False)
+                return None
+            if progress is None:
+                self._progress[key] = _Progress(done, now)
+                return None
+
+            elapsed = now - progress.updated_at
+            if elapsed > 0:
+                rate = max(0, done - progress.done) / elapsed
+                progress.velocity += _VELOCITY_WEIGHT * (rate -
+                                                         progress.velocity)
+            progress.updated_at = now
+            if done > progress.done:
+                if progress.level:
+                    self._end(key, now, True)
+                    self._progress[key] = _Progress(done, now)
+                else:
+                    progress.done = done
+                    progress.marked_at = now
+                return None
+
+            stalled_for = now - progress.marked_at
+            due = stalled_for - self.stall_after
+            if progress.level >= len(self.steps) or due < 0 or (
+                    due < progress.level * self.escalate_after):
+                return None
+            if progress.level == 0:
+                self._stats['stalls'] += 1
+            step = self.steps[progress.level]
+            progress.level += 1
+            self._actions[step] += 1
+            return step
+
+    def retry(self, torrent_hash, now=None):
+        """Give a stalled torrent a fresh start, e.g. after resuming it.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param now: Time of the retry, defaults to the current time.
+        :type now: float
+        :returns: Whether the torrent had stalled.
+        :rtype: bool
+        """
+        key = str(torrent_hash)
+        now = time.time() if now is None else now
+        with self._lock:
+            progress = self._progress.get(key)
+            if progress is None or not progress.level:
+                return False
+            self._end(key, now, False)
+            return True
+
+    def stalled(self):
+        """Return the torrents currently stalled.
+
+        :returns: Mapping of info hash to the number of steps taken.
+        :rtype: dict
+        """
+        with self._lock:
+            return dict((key, progress.level)
+                        for key, progress in self._progress.items()
+                        if progress.level)
+
+    def discard(self, torrent_hash):
+        """Forget a removed torrent.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        """
+        with self._lock:
+            self._progress.pop(str(torrent_hash), None)
+
+    def stats(self, now=None):
+        """Return stall counts and durations.
+
+        :param now: Time used for ongoing stalls, defaults to the current
+                    time.
+        :type now: float
+        :returns: Total 'stalls', how many 'recovered' by making progress,
+                  how many are 'stalled' now, the count of each step taken
+                  under 'actions', the 'mean_duration' and 'max_duration' in
+                  seconds of stalls that ended, and per torrent its
+                  'velocity' in bytes per second, 'level' and 'stalled_for'.
+        :rtype: dict
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            stats = dict(self._stats)
+            stats['actions'] = dict(self._actions)
+            stats['torrents'] = dict(
+                (key, {'velocity': progress.velocity,
+                       'level': progress.level,
+                       'stalled_for': max(0.0, now - progress.marked_at)})
+                for key, progress in self._progress.items())
+        ended = stats.pop('ended')
+        total_duration = stats.pop('total_duration')
+        stats['mean_duration'] = total_duration / ended if ended else 0.0
+        stats['stalled'] = len([torrent for torrent in
+                                stats['torrents'].values()
+                                if torrent['level']])
+        return stats
+
+    def _end(self, key, now, recovered):
+        progress = self._progress.pop(key)
+        if not progress.level:
+            return
+        duration = max(0.0, now - progress.marked_at - self.stall_after)
+        self._stats['ended'] += 1
+        self._stats['total_duration'] += duration
+        self._stats['max_duration'] = max(self._stats['max_duration'],
+                                          duration)
+        if recovered:
+            self._stats['recovered'] += 1
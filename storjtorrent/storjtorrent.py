@@ -24,22 +24,33 @@
 # SOFTWARE.
 
 from .exception import StorjTorrentError
+from .tracing import tracer, traced
+import layout
 import session
+import stream
 import libtorrent as lt
+import binascii
+import multiprocessing
 import os
 import sys
+import time
 
 
 class StorjTorrent(object):
 
     """Python libtorrent abstraction interface for Storj nodes."""
 
-    def __init__(self):
-        """Initialize StorjTorrent and associated session."""
+    def __init__(self, **session_options):
+        """Initialize StorjTorrent and associated session.
 
-        self.session = session.Session()
+        :param session_options: Keyword arguments passed on to
+                                :class:`storjtorrent.Session`.
+        :type session_options: dict
+        """
+
+        self.session = session.Session(**session_options)
 
-    def add_torrent(self, torrent_path, seeding):
+    def add_torrent(self, torrent_path, seeding, priority_class=None):
         """Add a torrent to be managed by the StorjTorrent session.
 
         If you are seeding a torrent you created, set seeding to True.
@@ -50,12 +61,21 @@ class StorjTorrent(object):
         :param seeding: Whether or not you are seeding a torrent, usually one
                         you created.
         :type seeding: bool
+        :param priority_class: Priority class of a download when the session
+                               was created with admission_limits, e.g.
+                               'repair', 'retrieval' or 'replication'.
+        :type priority_class: str
+        :returns: The info hash of the added torrent.
+        :rtype: libtorrent.sha1_hash
+        :raises AdmissionError: If the session's download queue is full.
         """
         if not self.session.alive:
             self.session.set_alive(True)
-        self.session.add_torrent(torrent_path, seeding=seeding)
+        return self.session.add_torrent(torrent_path, seeding=seeding,
+                                        priority_class=priority_class)
 
-    def remove_torrent(self, hash=None, path='', delete_files=False):
+    def remove_torrent(self, hash=None, path='', delete_files=False,
+                       shard_id=None):
         """Remove a torrent from a session by hash or path and indicate if you want to
         delete associated files.
 
@@ -68,8 +88,27 @@ class StorjTorrent(object):
         :param delete_files: Whether or not you wish to delete associated
                              files.
         :type delete_files: bool
+        :param shard_id: Remove the torrent holding this shard, as recorded
+                         in the session's shard index. If several torrents
+                         hold it, nothing is removed and StorjTorrentError
+                         is raised; pass the hash of the one to remove.
+        :type shard_id: str
+        :raises StorjTorrentError: If the shard is not in the shard index or
+                                   is held by more than one torrent.
         """
 
+        if shard_id and not hash:
+            info_hashes = sorted(set(location.info_hash for location
+                                     in self.find_shard(shard_id)))
+            if not info_hashes:
+                raise StorjTorrentError(
+                    'Shard %s is not in the shard index.' % shard_id)
+            if len(info_hashes) > 1:
+                raise StorjTorrentError(
+                    'Shard %s is held by several torrents: %s.' %
+                    (shard_id, ', '.join(info_hashes)))
+            hash = lt.sha1_hash(binascii.unhexlify(info_hashes[0]))
+
         if path and not hash:
             hash = self.get_hash(self, path)
             self.session.remove_torrent(hash, delete_files=delete_files)
@@ -78,9 +117,67 @@ class StorjTorrent(object):
                 'The hash or path arguments must be defined.')
 
         self.session.remove_torrent(hash, delete_files=delete_files)
-        if len(self.session.handles) is 0:
+        # Evicted torrents are still being seeded.
+        if not self.session.handles and not self.session.evicted_torrents():
             self.session.set_alive(False)
 
+    def remove_torrents(self, hashes, delete_files=False):
+        """Remove many torrents at once, e.g. to collect expired shards.
+
+        Unlike remove_torrent(), the session is kept running so that file
+        deletions can be tracked to completion.
+
+        :param hashes: Torrent info hashes of the torrents to remove.
+        :type hashes: list of libtorrent.sha1_hash or str
+        :param delete_files: Whether or not you wish to delete associated
+                             files.
+        :type delete_files: bool
+        :returns: One future per torrent whose result is the number of bytes
+                  deleted from disk.
+        :rtype: list of storjtorrent.RemovalFuture
+        """
+        return self.session.remove_torrents(hashes, delete_files)
+
+    def wait_for(self, hash, states=('finished', 'seeding'), timeout=None):
+        """Block until a torrent reaches one of the given states.
+
+        :param hash: Torrent info hash for the torrent to wait on.
+        :type hash: libtorrent.sha1_hash or str
+        :param states: A state or list of states, as found in the status
+                       dictionary's 'state_str' values.
+        :type states: str or list
+        :param timeout: Maximum number of seconds to wait. None waits
+                        forever.
+        :type timeout: int or float
+        :returns: The state reached, or None on timeout or removal.
+        :rtype: str
+        """
+        return self.session.wait_for(hash, states, timeout)
+
+    def on_complete(self, hash, callback):
+        """Call ``callback(hash, state)`` once a torrent finishes downloading.
+
+        :param hash: Torrent info hash for the torrent to watch.
+        :type hash: libtorrent.sha1_hash or str
+        :param callback: Function called with the hex info hash and state.
+        :type callback: function
+        """
+        self.session.on_complete(hash, callback)
+
+    def find_shard(self, shard_id):
+        """Look up which torrents hold a shard and where.
+
+        Requires the session to have been created with a shard_index.
+
+        :param shard_id: The shard's file name.
+        :type shard_id: str
+        :returns: Info hash, file index, offset and length of each copy.
+        :rtype: list of storjtorrent.ShardLocation
+        """
+        if self.session.shard_index is None:
+            raise StorjTorrentError('The session has no shard index.')
+        return self.session.shard_index.lookup(shard_id)
+
     def halt_session(self):
         """Manually halt an associated torrent management session."""
         self.session.set_alive(False)
@@ -107,11 +204,13 @@ class StorjTorrent(object):
         return info.info_hash()
 
     @staticmethod
+    @traced('storjtorrent.generate_torrent')
     def generate_torrent(self, shard_directory, piece_size=0,
                          pad_size_limit=4 * 1024 * 1024, flags=1,
                          comment='Storj - Be the Cloud.', creator='Storj',
                          private=False, torrent_name='storj.torrent',
-                         save_path=".", verbose=False):
+                         save_path=".", verbose=False, auto_layout=False,
+                         shard_index=None):
         """Creates a torrent with specified files.
 
         A torrent is created by determining the files that will be included,
@@ -151,6 +250,16 @@ class StorjTorrent(object):
         :type save_path: str
         :param verbose: Indicate if actions should be made verbosely or not.
         :type verbose: bool
+        :param auto_layout: Choose the piece size, pad size limit and flags
+                            from the sizes of the shards being added instead
+                            of using the values passed in. Only applies when
+                            piece_size is 0.
+        :type auto_layout: bool
+        :param shard_index: Catalog in which to record the new torrent's
+                            shards.
+        :type shard_index: storjtorrent.ShardIndex
+        :returns: The info hash of the new torrent.
+        :rtype: libtorrent.sha1_hash
         """
 
         if piece_size % 16384 is not 0:
@@ -158,6 +267,7 @@ class StorjTorrent(object):
                 'Torrent piece size must be 0 or a multiple of 16 kiB.')
 
         storage = lt.file_storage()
+        sizes = []
         directory = os.path.abspath(shard_directory)
         parent_directory = os.path.split(directory)[0]
 
@@ -173,23 +283,33 @@ class StorjTorrent(object):
                 if verbose:
                     print '%10d kiB  %s' % (size / 1024, filename)
                 storage.add_file(filename, size)
+                sizes.append(size)
 
         if storage.num_files() == 0:
             raise StorjTorrentError(
                 'No files were loaded from the specified directory.')
 
+        if auto_layout and piece_size == 0:
+            piece_size, pad_size_limit, flags, cost = layout.optimize_layout(
+                sizes)
+            if verbose:
+                print 'Using %d kiB pieces, padding files over %d bytes' % (
+                    piece_size / 1024, pad_size_limit)
+
         torrent = lt.create_torrent(storage, piece_size, pad_size_limit, flags)
         torrent.set_comment(comment)
         torrent.set_creator(creator)
         torrent.set_priv(private)
 
-        if verbose:
-            sys.stderr.write('Setting piece hashes.')
-            lt.set_piece_hashes(
-                torrent, parent_directory, lambda x: sys.stderr.write('.'))
-            sys.stderr.write('done!\n')
-        else:
-            lt.set_piece_hashes(torrent, parent_directory)
+        with tracer.span('lt.set_piece_hashes'):
+            if verbose:
+                sys.stderr.write('Setting piece hashes.')
+                lt.set_piece_hashes(
+                    torrent, parent_directory,
+                    lambda x: sys.stderr.write('.'))
+                sys.stderr.write('done!\n')
+            else:
+                lt.set_piece_hashes(torrent, parent_directory)
 
         """ Check the save path, if it is specified absolutely
         then parse it."""
@@ -205,5 +325,169 @@ class StorjTorrent(object):
             raise StorjTorrentError(
                 'Bad torrent save path or name, unable to save.')
 
-        with open(torrent_name, 'wb+') as torrent_file:
-            torrent_file.write(lt.bencode(torrent.generate()))
+        with tracer.span('lt.bencode'):
+            torrent_entry = torrent.generate()
+            with open(torrent_name, 'wb+') as torrent_file:
+                torrent_file.write(lt.bencode(torrent_entry))
+
+        info = lt.torrent_info(torrent_entry)
+        if shard_index is not None:
+            shard_index.add_torrent(info)
+        return info.info_hash()
+
+    @staticmethod
+    @traced('storjtorrent.generate_torrent_from_data')
+    def generate_torrent_from_data(self, items, name,
+                                   piece_size=stream.DEFAULT_PIECE_SIZE,
+                                   comment='Storj - Be the Cloud.',
+                                   creator='Storj', private=False,
+                                   torrent_name=None, save_path='.',
+                                   data_path=None, shard_index=None):
+        """Creates a torrent from shards held in memory or read from streams.
+
+        Unlike generate_torrent(), the shards need not be on disk first. They
+        are hashed as they are read and, if data_path is given, written out
+        in the same pass, ready to be seeded by a session whose save_path is
+        data_path.
+
+        :param items: Pairs of shard file name and its data, either a
+                      bytes-like object or a binary file object.
+        :type items: iterable
+        :param name: Name of the torrent and of the directory its shards are
+                     saved in.
+        :type name: str
+        :param piece_size: The size of each piece in bytes. It must be a
+                           multiple of 16 kiB.
+        :type piece_size: int
+        :param comment: Comment to be associated with torrent.
+        :type comment: str
+        :param creator: Creator to be associated with torrent.
+        :type creator: str
+        :param private: Whether torrent should be private or not. Should be
+                        false for DHT.
+        :type private: bool
+        :param torrent_name: The filename for your torrent. Defaults to the
+                             torrent's name with a .torrent extension.
+        :type torrent_name: str
+        :param save_path: Save location for the torrent file.
+        :type save_path: str
+        :param data_path: Directory in which to write the shards. None only
+                          hashes them.
+        :type data_path: str
+        :param shard_index: Catalog in which to record the new torrent's
+                            shards.
+        :type shard_index: storjtorrent.ShardIndex
+        :returns: The info hash of the new torrent.
+        :rtype: libtorrent.sha1_hash
+        """
+        data = stream.build_torrent(items, name, piece_size, data_path,
+                                    comment, creator, private)
+        torrent_name = os.path.join(save_path,
+                                    torrent_name or name + '.torrent')
+        try:
+            with open(torrent_name, 'wb') as torrent_file:
+                torrent_file.write(data)
+        except IOError:
+            raise StorjTorrentError(
+                'Bad torrent save path or name, unable to save.')
+
+        info = lt.torrent_info(lt.bdecode(data))
+        if shard_index is not None:
+            shard_index.add_torrent(info)
+        return info.info_hash()
+
+    @staticmethod
+    def generate_torrents(self, shard_directories, workers=None,
+                          save_path='.', shard_index=None,
+                          include_data=False, **options):
+        """Create one torrent per shard directory using a pool of processes.
+
+        Walking, hashing and bencoding run in parallel in up to ``workers``
+        processes. Results are yielded as each torrent is written, in
+        completion order rather than the order of ``shard_directories``. Each
+        torrent is named after its directory, e.g. ``bundle1.torrent``, so
+        the directories must have distinct names.
+
+        :param shard_directories: Directories to create torrents for.
+        :type shard_directories: list of str
+        :param workers: Number of worker processes. Defaults to the number of
+                        CPUs. With 1, torrents are created in this process.
+        :type workers: int
+        :param save_path: Directory the torrent files are written to.
+        :type save_path: str
+        :param shard_index: Catalog in which to record every new torrent's
+                            shards.
+        :type shard_index: storjtorrent.ShardIndex
+        :param include_data: Also return the bencoded torrent bytes.
+        :type include_data: bool
+        :param options: Any other keyword arguments of generate_torrent(),
+                        such as piece_size or auto_layout.
+        :type options: dict
+        :returns: For each torrent, a dictionary with its 'directory',
+                  'path', hex 'info_hash', total shard 'bytes' (without pad
+                  files) and the 'seconds' it took, plus 'completed' and
+                  'throughput' (shard bytes per second) for the batch so
+                  far, and 'data' when include_data is set.
+        :rtype: generator of dict
+        :raises StorjTorrentError: If two directories have the same name,
+                                   before any torrent is created.
+        """
+        names = {}
+        for directory in shard_directories:
+            name = _torrent_name(directory)
+            if name in names:
+                raise StorjTorrentError(
+                    '%s and %s would both be written to %s.' %
+                    (names[name], directory, name))
+            names[name] = directory
+        jobs = [(directory, save_path, include_data, options)
+                for directory in shard_directories]
+        workers = workers or multiprocessing.cpu_count()
+        pool = None
+        if workers > 1 and len(jobs) > 1:
+            pool = multiprocessing.Pool(min(workers, len(jobs)))
+            results = pool.imap_unordered(_generate_one, jobs)
+        else:
+            results = (_generate_one(job) for job in jobs)
+
+        started = time.time()
+        total_bytes = 0
+        try:
+            for completed, result in enumerate(results, 1):
+                if shard_index is not None:
+                    shard_index.add_torrent(lt.torrent_info(result['path']))
+                total_bytes += result['bytes']
+                result['completed'] = completed
+                result['throughput'] = total_bytes / max(
+                    time.time() - started, 1e-6)
+                yield result
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+
+def _torrent_name(directory):
+    return os.path.basename(os.path.abspath(directory)) + '.torrent'
+
+
+def _generate_one(job):
+    """Create a single torrent for generate_torrents()."""
+    directory, save_path, include_data, options = job
+    name = _torrent_name(directory)
+    started = time.time()
+    info_hash = StorjTorrent.generate_torrent(
+        [], directory, torrent_name=name, save_path=save_path, **options)
+    path = os.path.join(save_path, name)
+    result = {
+        'directory': directory,
+        'path': path,
+        'info_hash': str(info_hash),
+        'bytes': sum(entry.size for entry in lt.torrent_info(path).files()
+                     if not getattr(entry, 'pad_file', False)),
+        'seconds': time.time() - started
+    }
+    if include_data:
+        with open(path, 'rb') as torrent_file:
+            result['data'] = torrent_file.read()
+    return result
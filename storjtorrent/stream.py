@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import division
+from .exception import StorjTorrentError
+import libtorrent as lt
+import hashlib
+import os
+import time
+
+DEFAULT_PIECE_SIZE = 256 * 1024
+
+# Size of the buffer file objects are read into.
+READ_SIZE = 1024 * 1024
+
+
+class PieceHasher(object):
+
+    """SHA-1 hashes a stream of data in fixed-size pieces.
+
+    Data is passed in as memoryview slices, so buffers are hashed where they
+    are and never copied.
+    """
+
+    def __init__(self, piece_size):
+        """Initialize the hasher.
+
+        :param piece_size: Size of each piece in bytes.
+        :type piece_size: int
+        """
+        self.piece_size = piece_size
+        self.length = 0
+        self._digests = []
+        self._piece = hashlib.sha1()
+        self._filled = 0
+
+    def update(self, data):
+        """Hash the next part of the stream.
+
+        :param data: Bytes-like object.
+        """
+        view = memoryview(data)
+        if view.itemsize != 1 or view.ndim != 1:
+            # len() and slices count items, and the stream is made of bytes.
+            try:
+                view = view.cast('B')
+            except (AttributeError, TypeError):
+                # Python 2 views and non-contiguous ones cannot be cast.
+                view = memoryview(view.tobytes())
+        offset = 0
+        while offset < len(view):
+            take = min(self.piece_size - self._filled, len(view) - offset)
+            self._piece.update(view[offset:offset + take])
+            self._filled += take
+            offset += take
+            if self._filled == self.piece_size:
+                self._digests.append(self._piece.digest())
+                self._piece = hashlib.sha1()
+                self._filled = 0
+        self.length += len(view)
+
+    def pieces(self):
+        """Return the concatenated digests of every piece, including a final
+        partial piece.
+
+        :rtype: bytes
+        """
+        digests = list(self._digests)
+        if self._filled:
+            digests.append(self._piece.digest())
+        return b''.join(digests)
+
+
+def build_torrent(items, name, piece_size=DEFAULT_PIECE_SIZE, data_path=None,
+                  comment=None, creator=None, private=False):
+    """Create a torrent from data held in memory or read from streams.
+
+    Each item is hashed as it is read, in a single pass, and written to
+    ``data_path`` in the same pass if given. Seeding the result from a
+    session whose save_path is ``data_path`` needs no recheck.
+
+    :param items: Pairs of shard file name and its data, either a bytes-like
+                  object or a binary file object. Names may contain ``/`` to
+                  place shards in subdirectories.
+    :type items: iterable
+    :param name: Name of the torrent, used as the directory the shards are
+                 saved in.
+    :type name: str
+    :param piece_size: The size of each piece in bytes. It must be a
+                       multiple of 16 kiB.
+    :type piece_size: int
+    :param data_path: Directory in which to write the shards, under
+                      ``name``. None only hashes them.
+    :type data_path: str
+    :param comment: Comment to be associated with torrent.
+    :type comment: str
+    :param creator: Creator to be associated with torrent.
+    :type creator: str
+    :param private: Whether torrent should be private or not.
+    :type private: bool
+    :returns: The bencoded torrent.
+    :rtype: bytes
+    :raises StorjTorrentError: If the piece size or a name is invalid, or
+                               there are no items.
+    """
+    if piece_size <= 0 or piece_size % 16384:
+        raise StorjTorrentError(
+            'Torrent piece size must be a multiple of 16 kiB.')
+    hasher = PieceHasher(piece_size)
+    files = []
+    buffer = bytearray(READ_SIZE)
+    for shard_name, data in items:
+        path = _shard_path(shard_name)
+        output = None
+        if data_path is not None:
+            target = os.path.join(data_path, name, *path)
+            if not os.path.isdir(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            output = open(target, 'wb')
+        try:
+            start = hasher.length
+            for chunk in _chunks(data, buffer):
+                hasher.update(chunk)
+                if output is not None:
+                    output.write(chunk)
+        finally:
+            if output is not None:
+                output.close()
+        files.append({'length': hasher.length - start, 'path': path})
+
+    if not files:
+        raise StorjTorrentError('No shards were given for the torrent.')
+    info = {'name': name, 'piece length': piece_size,
+            'pieces': hasher.pieces(), 'files': files}
+    if private:
+        info['private'] = 1
+    torrent = {'info': info, 'creation date': int(time.time())}
+    if comment:
+        torrent['comment'] = comment
+    if creator:
+        torrent['created by'] = creator
+    return lt.bencode(torrent)
+
+
+def _shard_path(shard_name):
+    path = [part for part in shard_name.replace('\\', '/').split('/')
+            if part]
+    if not path or any(part in ('.', '..') for part in path):
+        raise StorjTorrentError('Invalid shard name: %r' % shard_name)
+    return path
+
+
+def _chunks(data, buffer):
+    """Yield views of an item's data without copying it."""
+    if not hasattr(data, 'read'):
+        yield memoryview(data)
+        return
+    readinto = getattr(data, 'readinto', None)
+    while True:
+        if readinto is not None:
+            count = readinto(buffer)
+            if not count:
+                return
+            yield memoryview(buffer)[:count]
+        else:
+            chunk = data.read(len(buffer))
+            if not chunk:
+                return
+            yield memoryview(chunk)
@@ -23,8 +23,15 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from threading import Thread, Event
-from time import sleep
+from threading import Thread, Event, Condition, current_thread
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+_clock = getattr(time, 'monotonic', time.time)
 
 
 class StoppableThread(Thread):
@@ -45,13 +52,243 @@ class StoppableThread(Thread):
         if self.isAlive():
             # Set event to signal thread to terminate.
             self.stop_event.set()
-            # Block calling thread until thread really has terminated.
-            self.join()
+            # Block calling thread until thread really has terminated, unless
+            # the thread is stopping itself.
+            if current_thread() is not self:
+                self.join()
+
+
+class _Task(object):
+
+    """Bookkeeping for a task run by a Scheduler."""
+
+    def __init__(self, name, func, interval, max_interval, backoff, next_run):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.current_interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.next_run = next_run
+        self.entry = None
+        self.cancelled = False
+        self.dirty = False
+        self.runs = 0
+        self.errors = 0
+        self.overruns = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_time = 0.0
+
+    def stats(self):
+        return {
+            'interval': self.current_interval,
+            'runs': self.runs,
+            'errors': self.errors,
+            'overruns': self.overruns,
+            'total_time': self.total_time,
+            'max_time': self.max_time,
+            'last_time': self.last_time,
+            'mean_time': self.total_time / self.runs if self.runs else 0.0
+        }
 
 
-class IntervalTimer(StoppableThread):
+class Scheduler(StoppableThread):
+
+    """A subclass of StoppableThread that runs many tasks on one thread.
+
+    Periodic tasks run at a fixed rate: each run is scheduled one interval
+    after the previous run was due, not after it finished, so the period does
+    not drift by the time the work takes. A run that overshoots one or more
+    periods skips them and counts them as overruns rather than running in a
+    burst to catch up.
+
+    Resetting a task that is already due does nothing, and resetting a task
+    while it runs makes it run once more straight after, so a burst of
+    resets costs at most one extra run.
+
+    A periodic task with a ``max_interval`` is adaptive. When it returns
+    False, meaning it found nothing to do, its interval is multiplied by
+    ``backoff`` up to ``max_interval``. Any other return value resets the
+    interval. Exceptions raised by a task are logged and counted in its stats
+    and do not stop the scheduler.
+    """
+
+    def __init__(self):
+        """Initialize the scheduler with no tasks."""
+        super(Scheduler, self).__init__()
+        self._condition = Condition()
+        self._queue = []
+        self._tasks = {}
+        self._running = None
+        self._sequence = itertools.count()
 
-    """A subclass of StoppableThread that runs a method at a set interval.
+    def add_periodic(self, name, interval, worker_func, max_interval=None,
+                     backoff=2.0, delay=0):
+        """Run a function repeatedly, replacing any task with this name.
+
+        :param name: Unique name of the task, used for stats and cancelling.
+        :type name: str
+        :param interval: The interval, in seconds, between runs.
+        :type interval: int or float
+        :param worker_func: The method or function to run.
+        :type worker_func: function
+        :param max_interval: Longest interval an idle task backs off to. None
+                             keeps the interval fixed.
+        :type max_interval: int or float
+        :param backoff: Factor by which the interval grows while idle.
+        :type backoff: int or float
+        :param delay: Seconds to wait before the first run.
+        :type delay: int or float
+        """
+        self._add(_Task(name, worker_func, interval, max_interval, backoff,
+                        _clock() + delay))
+
+    def add_once(self, name, delay, worker_func):
+        """Run a function once, replacing any task with this name.
+
+        :param name: Unique name of the task, used for stats and cancelling.
+        :type name: str
+        :param delay: Seconds to wait before running.
+        :type delay: int or float
+        :param worker_func: The method or function to run.
+        :type worker_func: function
+        """
+        self._add(_Task(name, worker_func, None, None, 1, _clock() + delay))
+
+    def cancel(self, name):
+        """Cancel a task if it is scheduled.
+
+        :param name: Name of the task.
+        :type name: str
+        """
+        with self._condition:
+            task = self._tasks.pop(name, None)
+            if task is not None:
+                task.cancelled = True
+
+    def reset(self, name):
+        """Run a task as soon as possible and drop any idle backoff.
+
+        :param name: Name of the task.
+        :type name: str
+        """
+        with self._condition:
+            task = self._tasks.get(name)
+            if task is None:
+                return
+            task.current_interval = task.interval
+            if task is self._running:
+                task.dirty = True
+            elif task.next_run > _clock():
+                task.next_run = _clock()
+                self._push(task)
+
+    def stats(self):
+        """Return timing statistics for every scheduled task.
+
+        :returns: Mapping of task name to its current interval, number of
+                  runs and overruns, and total, mean, max and last run time
+                  in seconds.
+        :rtype: dict
+        """
+        with self._condition:
+            return dict((name, task.stats())
+                        for name, task in self._tasks.items())
+
+    def stop(self):
+        """Stop the scheduler, waking it if it is waiting."""
+        with self._condition:
+            self.stop_event.set()
+            self._condition.notify()
+        super(Scheduler, self).stop()
+
+    def run(self):
+        """Run the scheduler process."""
+        while not self.stop_event.is_set():
+            task = self._next_task()
+            if task is None:
+                continue
+
+            start = _clock()
+            try:
+                result = task.func()
+            except Exception:
+                # One failing task must not take every other task with it.
+                logger.exception('Task %s failed', task.name)
+                result = None
+                task.errors += 1
+            elapsed = _clock() - start
+
+            with self._condition:
+                self._running = None
+                task.runs += 1
+                task.total_time += elapsed
+                task.last_time = elapsed
+                task.max_time = max(task.max_time, elapsed)
+                if task.cancelled:
+                    continue
+                if task.dirty:
+                    task.dirty = False
+                    task.next_run = _clock()
+                    self._push(task)
+                    continue
+                if task.interval is None:
+                    self._tasks.pop(task.name, None)
+                    continue
+                self._reschedule(task, result)
+
+    def _add(self, task):
+        with self._condition:
+            self._push(task)
+
+    def _push(self, task):
+        old = self._tasks.get(task.name)
+        if old is not None and old is not task:
+            old.cancelled = True
+        self._tasks[task.name] = task
+        # Entries left behind by an earlier push of the task are skipped.
+        task.entry = next(self._sequence)
+        heapq.heappush(self._queue, (task.next_run, task.entry, task))
+        self._condition.notify()
+
+    def _next_task(self):
+        """Wait until a task is due and pop it, or return None if woken
+        early."""
+        with self._condition:
+            while self._queue and (self._queue[0][2].cancelled or
+                                   self._queue[0][1] !=
+                                   self._queue[0][2].entry):
+                heapq.heappop(self._queue)
+            if not self._queue:
+                self._condition.wait()
+                return None
+            wait = self._queue[0][0] - _clock()
+            if wait > 0:
+                self._condition.wait(wait)
+                return None
+            self._running = heapq.heappop(self._queue)[2]
+            return self._running
+
+    def _reschedule(self, task, result):
+        if task.max_interval is not None:
+            if result is False:
+                task.current_interval = min(
+                    task.current_interval * task.backoff, task.max_interval)
+            else:
+                task.current_interval = task.interval
+        task.next_run += task.current_interval
+        now = _clock()
+        if task.next_run <= now:
+            missed = int((now - task.next_run) // task.current_interval) + 1
+            task.overruns += missed
+            task.next_run += missed * task.current_interval
+        self._push(task)
+
+
+class IntervalTimer(Scheduler):
+
+    """A Scheduler that runs a single method at a fixed rate.
 
     Source: http://stackoverflow.com/a/22702362/1183175
     """
@@ -69,9 +306,39 @@ class IntervalTimer(StoppableThread):
         super(IntervalTimer, self).__init__()
         self._interval = interval
         self._worker_func = worker_func
+        self.add_periodic('interval', interval, worker_func)
+
+
+class EventLoop(StoppableThread):
+
+    """A subclass of StoppableThread that handles events as they arrive.
+
+    Rather than sleeping for a fixed interval, the thread blocks inside
+    ``wait_func`` and runs ``handler_func`` as soon as it reports an event.
+    Exceptions raised by the handler are logged and do not stop the loop.
+    """
+
+    def __init__(self, wait_func, handler_func):
+        """Initialize the event loop.
+
+        :param wait_func: Blocks until an event is available or a short
+                          timeout expires, returning a true value only in the
+                          first case. The timeout bounds how long stopping the
+                          thread may take.
+        :type wait_func: function
+        :param handler_func: Called whenever ``wait_func`` reports an event.
+        :type handler_func: function
+        """
+        super(EventLoop, self).__init__()
+        self._wait_func = wait_func
+        self._handler_func = handler_func
 
     def run(self):
-        """Run the interval timer process."""
+        """Run the event loop process."""
         while not self.stop_event.is_set():
-            self._worker_func()
-            sleep(self._interval)
+            if self._wait_func():
+                try:
+                    self._handler_func()
+                except Exception:
+                    # Later events must still be handled.
+                    logger.exception('Event handler failed')
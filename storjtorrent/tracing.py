@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import division
+from .thread_management import _clock
+from collections import deque
+from threading import Lock, current_thread, local
+import cProfile
+import functools
+import json
+import pstats
+import random
+import time
+
+
+class _NullSpan(object):
+
+    """Span handed out while tracing is disabled. It does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+
+    __slots__ = ('tracer', 'name', 'started', 'start', 'profiler')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.profiler = None
+
+    def __enter__(self):
+        tracer = self.tracer
+        depth = getattr(tracer._local, 'depth', 0)
+        tracer._local.depth = depth + 1
+        if (not depth and tracer.profile_rate and
+                random.random() < tracer.profile_rate):
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Another profiler is already active in this thread.
+                self.profiler = None
+        self.started = time.time()
+        self.start = _clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = _clock() - self.start
+        tracer = self.tracer
+        tracer._local.depth -= 1
+        if self.profiler is not None:
+            self.profiler.disable()
+        tracer._record(self.name, self.started, duration, self.profiler)
+        return False
+
+
+class Tracer(object):
+
+    """Collects timed spans around hot paths and optional profiles.
+
+    While disabled, :meth:`span` returns a shared do-nothing context manager,
+    so instrumented code pays one attribute lookup and one call. Once
+    enabled, every span records its duration into per-name totals and a
+    bounded buffer of recent spans. A fraction of the outermost spans of each
+    thread can also be run under cProfile, see :meth:`start_profiling`.
+    """
+
+    def __init__(self, max_spans=10000):
+        """Initialize a disabled tracer.
+
+        :param max_spans: Number of recent spans kept for export.
+        :type max_spans: int
+        """
+        self.enabled = False
+        self.profile_rate = 0
+        self._lock = Lock()
+        self._local = local()
+        self._spans = deque(maxlen=max_spans)
+        self._timings = {}
+        self._profile = None
+
+    def enable(self):
+        """Start recording spans."""
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording spans and profiles. Collected data is kept."""
+        self.enabled = False
+        self.profile_rate = 0
+
+    def span(self, name):
+        """Return a context manager timing the code it wraps.
+
+        :param name: Name the span is recorded under.
+        :type name: str
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def start_profiling(self, sample_rate=0.01):
+        """Profile a sample of outermost spans with cProfile.
+
+        Enables the tracer if needed. Profiles of all sampled spans are
+        merged and can be written out with :meth:`export_profile`.
+
+        :param sample_rate: Fraction of spans to profile, between 0 and 1.
+        :type sample_rate: float
+        """
+        self.enabled = True
+        self.profile_rate = sample_rate
+
+    def stop_profiling(self):
+        """Stop profiling new spans. Collected profiles are kept."""
+        self.profile_rate = 0
+
+    def timings(self):
+        """Return aggregated timings of every span name.
+
+        :returns: Mapping of span name to its 'count' and its 'total',
+                  'mean' and 'max' duration in seconds.
+        :rtype: dict
+        """
+        with self._lock:
+            return dict((name, {'count': count, 'total': total,
+                                'mean': total / count, 'max': longest})
+                        for name, (count, total, longest)
+                        in self._timings.items())
+
+    def spans(self):
+        """Return the recent spans, oldest first.
+
+        :returns: Dictionaries with the span's 'name', 'thread', wall clock
+                  'start' and 'duration' in seconds.
+        :rtype: list
+        """
+        with self._lock:
+            spans = list(self._spans)
+        return [{'name': name, 'thread': thread, 'start': start,
+                 'duration': duration}
+                for name, thread, start, duration in spans]
+
+    def reset(self):
+        """Drop all collected spans, timings and profiles."""
+        with self._lock:
+            self._spans.clear()
+            self._timings = {}
+            self._profile = None
+
+    def export(self, path):
+        """Write the recent spans and aggregated timings to a JSON file.
+
+        :param path: Location of the file to write.
+        :type path: str
+        """
+        report = {'timings': self.timings(), 'spans': self.spans()}
+        with open(path, 'w') as report_file:
+            json.dump(report, report_file, indent=2, sort_keys=True)
+
+    def export_profile(self, path):
+        """Write the merged profiles in pstats format.
+
+        Read them with ``python -m pstats <path>`` or any pstats viewer.
+
+        :param path: Location of the file to write.
+        :type path: str
+        :returns: Whether any span had been profiled.
+        :rtype: bool
+        """
+        with self._lock:
+            if self._profile is None:
+                return False
+            self._profile.dump_stats(path)
+            return True
+
+    def _record(self, name, started, duration, profiler):
+        with self._lock:
+            self._spans.append((name, current_thread().name, started,
+                                duration))
+            count, total, longest = self._timings.get(name, (0, 0.0, 0.0))
+            self._timings[name] = (count + 1, total + duration,
+                                   max(longest, duration))
+            if profiler is not None:
+                if self._profile is None:
+                    self._profile = pstats.Stats(profiler)
+                else:
+                    self._profile.add(profiler)
+
+
+# Tracer used by the session and torrent creation.
+tracer = Tracer()
+
+
+def traced(name):
+    """Decorate a function to run inside a span of the default tracer.
+
+    :param name: Name the span is recorded under.
+    :type name: str
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with _Span(tracer, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
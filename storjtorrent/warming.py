@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import division
+from .allocator import RATE_PER_PEER
+from threading import Lock
+
+# Size of the blocks libtorrent reads and caches, in bytes.
+BLOCK_SIZE = 16 * 1024
+
+
+class CacheWarmer(object):
+
+    """Picks the pieces of in-demand seeds to read into the disk cache
+    before peers ask for them.
+
+    Only seeding torrents are tracked, since only they have every piece on
+    disk to read. Each seed's upload demand, its upload rate plus a share
+    for every peer that still needs pieces, is smoothed into an
+    exponentially weighted moving average. The ``top`` torrents whose
+    average reaches ``min_demand`` are hot. For each, :meth:`plan` chooses
+    the rarest pieces in the swarm, which peers fetching rarest first will
+    ask for next. Cold torrents are never read ahead, so they do not evict
+    hot pieces.
+    """
+
+    def __init__(self, top=8, read_ahead=4, half_life=300,
+                 min_demand=RATE_PER_PEER, rewarm_after=60):
+        """Initialize the warmer.
+
+        :param top: Number of torrents kept warm.
+        :type top: int
+        :param read_ahead: Pieces read ahead per hot torrent on each run.
+        :type read_ahead: int
+        :param half_life: Seconds after which a past demand sample counts
+                          half as much as a new one.
+        :type half_life: int or float
+        :param min_demand: Average demand in bytes per second below which a
+                           torrent is never warmed.
+        :type min_demand: int or float
+        :param rewarm_after: Seconds before a warmed piece may be read again.
+        :type rewarm_after: int or float
+        """
+        self.top = top
+        self.read_ahead = read_ahead
+        self.half_life = half_life
+        self.min_demand = min_demand
+        self.rewarm_after = rewarm_after
+        self._lock = Lock()
+        self._demand = {}
+        self._warmed = {}
+        self._counters = None
+        self._stats = {'runs': 0, 'pieces_warmed': 0, 'peer_reads': 0,
+                       'peer_hits': 0, 'hit_rate': 0.0}
+
+    def update(self, torrent_hash, status, now):
+        """Fold a torrent's current upload demand into its average.
+
+        Torrents that are not seeding are forgotten.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param status: Current status of the torrent.
+        :type status: libtorrent.torrent_status
+        :param now: Time of the status in seconds since the epoch.
+        :type now: float
+        """
+        key = str(torrent_hash)
+        if not status.is_seeding:
+            self.discard(key)
+            return
+        demand = 0.0
+        if not status.paused:
+            demand = (status.upload_rate + RATE_PER_PEER *
+                      max(0, status.num_peers - status.num_seeds))
+        with self._lock:
+            previous = self._demand.get(key)
+            if previous is None:
+                self._demand[key] = (demand, now)
+                return
+            average, then = previous
+            weight = 1 - 0.5 ** (max(0, now - then) / self.half_life)
+            self._demand[key] = (average + weight * (demand - average), now)
+
+    def hot(self):
+        """Return the torrents to keep warm, most in demand first.
+
+        Torrents that fell out of the set lose their record of warmed
+        pieces.
+
+        :rtype: list of str
+        """
+        with self._lock:
+            hot = self._hot()
+            for key in set(self._warmed) - set(hot):
+                del self._warmed[key]
+            return hot
+
+    def _hot(self):
+        ranked = sorted(((average, key) for key, (average, _)
+                         in self._demand.items()
+                         if average >= self.min_demand), reverse=True)
+        return [key for _, key in ranked[:self.top]]
+
+    def plan(self, torrent_hash, availability, now):
+        """Choose the pieces of a hot torrent to read ahead now.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        :param availability: Number of peers having each piece, as returned
+                             by ``torrent_handle.piece_availability()``.
+        :type availability: list of int
+        :param now: Current time in seconds since the epoch.
+        :type now: float
+        :returns: Up to read_ahead piece indices, rarest first, leaving out
+                  pieces warmed in the last rewarm_after seconds.
+        :rtype: list of int
+        """
+        key = str(torrent_hash)
+        with self._lock:
+            warmed = self._warmed.setdefault(key, {})
+            for piece, warmed_at in list(warmed.items()):
+                if now - warmed_at >= self.rewarm_after:
+                    del warmed[piece]
+            ranked = sorted(range(len(availability)),
+                            key=lambda piece: availability[piece])
+            pieces = [piece for piece in ranked
+                      if piece not in warmed][:self.read_ahead]
+            for piece in pieces:
+                warmed[piece] = now
+            self._stats['pieces_warmed'] += len(pieces)
+            return pieces
+
+    def record_cache(self, blocks_read, blocks_read_hit, warmed_blocks=0):
+        """Update the hit rate from the disk cache's running counters.
+
+        The blocks read by warming itself are taken out of the reads, so
+        the hit rate is roughly that of the blocks peers asked for.
+
+        :param blocks_read: Blocks read so far, from the cache or disk.
+        :type blocks_read: int
+        :param blocks_read_hit: Blocks served from the cache so far.
+        :type blocks_read_hit: int
+        :param warmed_blocks: Blocks read ahead since the last call.
+        :type warmed_blocks: int
+        """
+        with self._lock:
+            self._stats['runs'] += 1
+            previous = self._counters
+            self._counters = (blocks_read, blocks_read_hit)
+            if previous is None:
+                return
+            reads = max(0, blocks_read - previous[0] - warmed_blocks)
+            hits = min(reads, max(0, blocks_read_hit - previous[1]))
+            self._stats['peer_reads'] += reads
+            self._stats['peer_hits'] += hits
+            if reads:
+                self._stats['hit_rate'] = hits / reads
+
+    def discard(self, torrent_hash):
+        """Forget a removed torrent.
+
+        :param torrent_hash: Info hash of the torrent.
+        :type torrent_hash: libtorrent.sha1_hash or str
+        """
+        key = str(torrent_hash)
+        with self._lock:
+            self._demand.pop(key, None)
+            self._warmed.pop(key, None)
+
+    def stats(self):
+        """Return demand, warming counts and cache hit rates.
+
+        :returns: Warming 'runs', 'pieces_warmed', blocks peers read
+                  ('peer_reads') and found in the cache ('peer_hits'),
+                  'hit_rate' over the last run and 'total_hit_rate' since
+                  the start, the 'hot' torrents and every torrent's average
+                  'demand' in bytes per second.
+        :rtype: dict
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['total_hit_rate'] = (
+                stats['peer_hits'] / stats['peer_reads']
+                if stats['peer_reads'] else 0.0)
+            stats['hot'] = self._hot()
+            stats['demand'] = dict((key, average) for key, (average, _)
+                                   in self._demand.items())
+            return stats
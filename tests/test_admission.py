@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from storjtorrent import AdmissionQueue, AdmissionError
+import pytest
+
+
+class TestAdmissionQueue:
+
+    def test_class_limit(self):
+        started = []
+        queue = AdmissionQueue({'retrieval': 2})
+        for key in 'abc':
+            queue.submit(key, 'retrieval', started.append)
+        assert started == ['a', 'b']
+        queue.release('a')
+        assert started == ['a', 'b', 'c']
+
+    def test_priority_order(self):
+        started = []
+        queue = AdmissionQueue({'repair': 1, 'replication': 1},
+                               max_active=1)
+        assert queue.submit('a', 'replication', started.append)
+        assert not queue.submit('b', 'replication', started.append)
+        assert not queue.submit('c', 'repair', started.append)
+        queue.release('a')
+        assert started == ['a', 'c']
+
+    def test_backpressure(self):
+        queue = AdmissionQueue({'retrieval': 1}, max_queued=1)
+        queue.submit('a', 'retrieval', lambda key: None)
+        queue.submit('b', 'retrieval', lambda key: None)
+        with pytest.raises(AdmissionError):
+            queue.submit('c', 'retrieval', lambda key: None)
+        assert queue.stats()['retrieval']['rejected'] == 1
+
+    def test_can_submit(self):
+        queue = AdmissionQueue({'retrieval': 1}, max_queued=1)
+        queue.submit('a', 'retrieval', lambda key: None)
+        assert queue.can_submit('retrieval')
+        queue.submit('b', 'retrieval', lambda key: None)
+        assert not queue.can_submit('retrieval')
+        assert queue.stats()['retrieval']['rejected'] == 1
+        with pytest.raises(AdmissionError):
+            queue.can_submit('bogus')
+
+    def test_unknown_class(self):
+        with pytest.raises(AdmissionError):
+            AdmissionQueue().submit('a', 'bogus', lambda key: None)
+
+    def test_release_queued(self):
+        started = []
+        queue = AdmissionQueue({'retrieval': 1})
+        queue.submit('a', 'retrieval', started.append)
+        queue.submit('b', 'retrieval', started.append)
+        queue.release('b')
+        queue.release('a')
+        assert started == ['a']
+        assert queue.stats()['retrieval']['queued'] == 0
+
+    def test_stats(self):
+        queue = AdmissionQueue()
+        queue.submit('a', 'repair', lambda key: None)
+        stats = queue.stats()
+        assert set(stats) == set(['repair', 'retrieval', 'replication'])
+        assert stats['repair']['active'] == 1
+        assert stats['repair']['admitted'] == 1
+        assert stats['repair']['mean_wait'] >= 0
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from storjtorrent import apportion, torrent_demand, BudgetAllocator
+
+
+class FakeStatus(object):
+
+    def __init__(self, num_peers=0, num_seeds=0, download_rate=0,
+                 upload_rate=0, is_seeding=True, paused=False):
+        self.num_peers = num_peers
+        self.num_seeds = num_seeds
+        self.download_rate = download_rate
+        self.upload_rate = upload_rate
+        self.is_seeding = is_seeding
+        self.paused = paused
+
+
+class TestApportion:
+
+    def test_proportional(self):
+        assert apportion(100, {'a': 1, 'b': 3}) == {'a': 25, 'b': 75}
+
+    def test_sums_to_total(self):
+        shares = apportion(10, {'a': 1, 'b': 1, 'c': 1})
+        assert sum(shares.values()) == 10
+
+    def test_minimum(self):
+        shares = apportion(100, {'a': 0, 'b': 10}, minimum=2)
+        assert shares == {'a': 2, 'b': 98}
+
+    def test_minimum_over_budget(self):
+        shares = apportion(3, {'a': 1, 'b': 1, 'c': 1}, minimum=2)
+        assert shares == {'a': 2, 'b': 2, 'c': 2}
+
+    def test_caps_redistribute(self):
+        shares = apportion(100, {'a': 10, 'b': 1, 'c': 1}, caps={'a': 20,
+                                                                 'c': -1})
+        assert shares == {'a': 20, 'b': 40, 'c': 40}
+
+
+class TestBudgetAllocator:
+
+    def test_demand(self):
+        idle = torrent_demand(FakeStatus())
+        busy = torrent_demand(FakeStatus(num_peers=10,
+                                         upload_rate=1024 * 1024))
+        assert busy[0] > idle[0] and busy[1] > idle[1]
+        assert torrent_demand(FakeStatus(paused=True)) == (0.0, 0.0)
+
+    def test_rebalance(self):
+        allocator = BudgetAllocator(connections_limit=100,
+                                    unchoke_slots_limit=10)
+        allocator.set_caps('hot')
+        allocator.set_caps('cold', max_connections=60)
+        allocator.update('hot', FakeStatus(num_peers=40, num_seeds=0,
+                                           upload_rate=512 * 1024))
+        allocator.update('cold', FakeStatus())
+        changed = allocator.rebalance()
+        assert set(changed) == set(['hot', 'cold'])
+        assert changed['hot'][0] > changed['cold'][0] >= 2
+        assert changed['hot'][1] > changed['cold'][1] >= 1
+        assert allocator.rebalance() == {}
+        assert allocator.allocations() == changed
+
+    def test_discard(self):
+        allocator = BudgetAllocator()
+        allocator.set_caps('a')
+        allocator.rebalance()
+        allocator.discard('a')
+        assert allocator.allocations() == {}
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from storjtorrent import AnnounceScheduler
+
+
+class FakeHandle(object):
+
+    def __init__(self, number, announced):
+        self.number = number
+        self.announced = announced
+
+    def info_hash(self):
+        return 'hash%d' % self.number
+
+    def is_valid(self):
+        return True
+
+    def force_dht_announce(self):
+        self.announced.append(self.number)
+
+
+class TestAnnounceScheduler:
+
+    def handles(self, count):
+        announced = []
+        return [FakeHandle(i, announced) for i in range(count)], announced
+
+    def test_idle_tick(self):
+        assert AnnounceScheduler().tick() is False
+
+    def test_rate_limited(self):
+        handles, announced = self.handles(50)
+        announcer = AnnounceScheduler(window=0, rate=10)
+        announcer.request(handles)
+        announcer.tick()
+        assert len(announced) == 10
+        assert announcer.pending() == 40
+
+    def test_spread_over_window(self):
+        handles, announced = self.handles(60)
+        announcer = AnnounceScheduler(window=60, rate=100)
+        announcer.request(handles)
+        announcer.tick()
+        assert 1 <= len(announced) <= 2
+
+    def test_changed_peers_first(self):
+        handles, announced = self.handles(5)
+        announcer = AnnounceScheduler(window=0, rate=1)
+        for handle in handles:
+            announcer.note_peers(handle.info_hash(), 0)
+        announcer.request(handles)
+        announcer.note_peers('hash3', 4)
+        announcer.tick()
+        assert announced == [3]
+
+    def test_duplicate_requests_and_discard(self):
+        handles, announced = self.handles(3)
+        announcer = AnnounceScheduler()
+        announcer.request(handles)
+        announcer.request(handles)
+        announcer.discard('hash0')
+        assert announcer.pending() == 2
+        assert announcer.stats()['requested'] == 3
+
+    def test_stats(self):
+        handles, announced = self.handles(2)
+        announcer = AnnounceScheduler(window=0, rate=10)
+        announcer.request(handles)
+        announcer.tick()
+        stats = announcer.stats()
+        assert stats['announced'] == 2
+        assert stats['pending'] == 0
+        assert stats['mean_latency'] >= 0
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from storjtorrent import BandwidthShaper, StorjTorrentError
+from storjtorrent.bandwidth import MIN_TORRENT_RATE
+import pytest
+
+CLASSES = {'retrieval': {'min_download': 600, 'max_upload': 100},
+           'replication': {'max_download': 300}}
+
+
+class FakeStatus(object):
+
+    def __init__(self, download_rate=0, upload_rate=0, paused=False):
+        self.download_rate = download_rate
+        self.upload_rate = upload_rate
+        self.paused = paused
+
+
+class TestBandwidthShaper:
+
+    def test_unknown_class(self):
+        shaper = BandwidthShaper(CLASSES)
+        with pytest.raises(StorjTorrentError):
+            shaper.assign('a' * 40, 'bulk')
+
+    def test_unlimited_without_session_limit(self):
+        shaper = BandwidthShaper(CLASSES)
+        shaper.assign('a' * 40, 'retrieval')
+        shaper.assign('b' * 40, 'replication')
+        limits = shaper.rebalance()
+        assert limits['a' * 40] == (-1, 100)
+        assert limits['b' * 40] == (300, -1)
+
+    def test_minimum_is_guaranteed(self):
+        shaper = BandwidthShaper(CLASSES, download_limit=1000)
+        shaper.assign('a' * 40, 'retrieval')
+        shaper.assign('b' * 40, 'replication')
+        shaper.update('b' * 40, FakeStatus(download_rate=10 ** 6))
+        limits = shaper.rebalance()
+        assert limits['a' * 40][0] >= 600
+        assert limits['b' * 40][0] <= 300
+        assert limits['a' * 40][0] + limits['b' * 40][0] == 1000
+
+    def test_idle_class_leaves_bandwidth(self):
+        shaper = BandwidthShaper(CLASSES, download_limit=100000)
+        shaper.assign('b' * 40, 'replication')
+        shaper.set_class('replication')
+        assert shaper.rebalance()['b' * 40][0] == 100000
+
+    def test_split_by_demand(self):
+        shaper = BandwidthShaper({'bulk': {}}, upload_limit=100000)
+        shaper.assign('a' * 40, 'bulk')
+        shaper.assign('b' * 40, 'bulk')
+        shaper.update('a' * 40, FakeStatus(upload_rate=50000))
+        limits = shaper.rebalance()
+        assert limits['a' * 40][1] > limits['b' * 40][1] >= MIN_TORRENT_RATE
+        assert shaper.rebalance() == {}
+
+    def test_reassign_and_discard(self):
+        shaper = BandwidthShaper(CLASSES)
+        shaper.assign('a' * 40, 'retrieval')
+        shaper.rebalance()
+        shaper.assign('a' * 40, 'replication')
+        assert shaper.rebalance() == {'a' * 40: (300, -1)}
+        shaper.discard('a' * 40)
+        assert shaper.limits() == {}
+
+    def test_stats(self):
+        shaper = BandwidthShaper(CLASSES)
+        shaper.assign('a' * 40, 'retrieval')
+        shaper.update('a' * 40, FakeStatus(5, 7))
+        stats = shaper.stats()
+        assert stats['retrieval']['torrents'] == 1
+        assert stats['retrieval']['upload_rate'] == 7
+        assert stats['replication']['max_download'] == 300
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from storjtorrent.cli import main, build_parser, DEFAULT_BENCHMARKS
+import json
+import pytest
+
+
+class TestCli:
+
+    def test_command_required(self):
+        with pytest.raises(SystemExit):
+            build_parser().parse_args([])
+
+    def test_create(self, tmpdir, capsys):
+        assert main(['create', 'tests/data', '-o', str(tmpdir),
+                     '-w', '1']) == 0
+        result = json.loads(capsys.readouterr()[0])
+        assert len(result['info_hash']) == 40
+        assert tmpdir.join('data.torrent').check()
+
+    def test_status(self, capsys):
+        assert main(['status', 'tests/data.torrent', '-d', 'tests',
+                     '--port-min', '0', '--port-max', '0',
+                     '--timeout', '5']) == 0
+        report = json.loads(capsys.readouterr()[0])
+        assert report['name'] == 'data'
+        assert report['progress'] == 1
+
+    def test_status_does_not_download(self, capsys, tmpdir):
+        assert main(['status', 'tests/data.torrent', '-d', str(tmpdir),
+                     '--allocation-mode', 'full',
+                     '--port-min', '0', '--port-max', '0',
+                     '--timeout', '5']) == 0
+        report = json.loads(capsys.readouterr()[0])
+        assert report['progress'] == 0
+        assert not tmpdir.join('data').check()
+
+    def test_fetch_bad_peer(self, capsys):
+        assert main(['fetch', 'tests/data.torrent', '-p', 'nowhere']) == 1
+        assert 'HOST:PORT' in capsys.readouterr()[1]
+
+    def test_seed_without_torrents(self, tmpdir):
+        assert main(['seed', str(tmpdir)]) == 1
+
+    def test_unknown_benchmark(self):
+        assert main(['bench', 'disk']) == 1
+
+    def test_transport_benchmark_is_opt_in(self):
+        assert 'transport' not in DEFAULT_BENCHMARKS
+        args = build_parser().parse_args(['bench'])
+        assert not args.impair_network
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from storjtorrent import TorrentEvents
+import threading
+
+HASH = '994bab2df24af5297d86d48abf9fb13bc49b8cb2'
+
+
+class TestTorrentEvents:
+
+    def test_state(self):
+        events = TorrentEvents()
+        assert events.state(HASH) is None
+        events.update(HASH, 'downloading')
+        assert events.state(HASH) == 'downloading'
+
+    def test_setdefault_keeps_newer_state(self):
+        events = TorrentEvents()
+        assert events.setdefault(HASH, 'checking') == 'checking'
+        events.update(HASH, 'seeding')
+        assert events.setdefault(HASH, 'checking') == 'seeding'
+        assert events.state(HASH) == 'seeding'
+
+    def test_wait_for_reached(self):
+        events = TorrentEvents()
+        events.update(HASH, 'seeding')
+        assert events.wait_for(HASH, 'seeding', timeout=1) == 'seeding'
+
+    def test_wait_for_timeout(self):
+        events = TorrentEvents()
+        events.update(HASH, 'downloading')
+        assert events.wait_for(HASH, timeout=0.05) is None
+
+    def test_wait_for_woken_by_update(self):
+        events = TorrentEvents()
+        events.update(HASH, 'downloading')
+        timer = threading.Timer(0.05, events.update, [HASH, 'finished'])
+        timer.start()
+        assert events.wait_for(HASH, timeout=5) == 'finished'
+
+    def test_wait_for_woken_by_forget(self):
+        events = TorrentEvents()
+        events.update(HASH, 'downloading')
+        timer = threading.Timer(0.05, events.forget, [HASH])
+        timer.start()
+        assert events.wait_for(HASH, timeout=5) is None
+
+    def test_on_complete(self):
+        events = TorrentEvents()
+        calls = []
+        events.on_complete(HASH, lambda *args: calls.append(args))
+        events.update(HASH, 'downloading')
+        assert calls == []
+        events.update(HASH, 'seeding')
+        events.update(HASH, 'finished')
+        assert calls == [(HASH, 'seeding')]
+
+    def test_on_complete_already_complete(self):
+        events = TorrentEvents()
+        calls = []
+        events.update(HASH, 'finished')
+        events.on_complete(HASH, lambda *args: calls.append(args))
+        assert calls == [(HASH, 'finished')]
+
+    def test_failing_callback_does_not_skip_others(self):
+        events = TorrentEvents()
+        seen = []
+
+        def fail(key, state):
+            raise ValueError(key)
+        events.on_complete(HASH, fail)
+        events.on_complete(HASH, lambda key, state: seen.append(state))
+        events.update(HASH, 'seeding')
+        assert seen == ['seeding']
@@ -24,7 +24,7 @@
 # SOFTWARE.
 
 
-from storjtorrent import StorjTorrentError
+from storjtorrent import StorjTorrentError, AdmissionError, RemovalError
 
 
 def test_exception():
@@ -32,3 +32,17 @@ def test_exception():
     error = StorjTorrentError(message)
     assert error.message == message
     assert error.__str__() == message
+
+
+def test_admission_error():
+    message = 'The download queue is full.'
+    error = AdmissionError(message)
+    assert isinstance(error, StorjTorrentError)
+    assert str(error) == message
+
+
+def test_removal_error():
+    message = 'Permission denied.'
+    error = RemovalError(message)
+    assert isinstance(error, StorjTorrentError)
+    assert str(error) == message
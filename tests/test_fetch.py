@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from storjtorrent import TorrentFetcher, StorjTorrentError
+import pytest
+import threading
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+TORRENT = open('tests/data.torrent', 'rb').read()
+ETAG = '"data-1"'
+
+
+class TorrentHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/data.torrent')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.path != '/data.torrent':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header('ETag', ETAG)
+            self.send_header('Content-Length', str(len(TORRENT)))
+            self.end_headers()
+            self.wfile.write(TORRENT)
+
+    def log_message(self, *args):
+        pass
+
+
+class TorrentServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+@pytest.fixture(scope='function')
+def server(request):
+    torrent_server = TorrentServer(('127.0.0.1', 0), TorrentHandler)
+    torrent_server.connections = 0
+    torrent_server.paths = []
+    thread = threading.Thread(target=torrent_server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    def fin():
+        torrent_server.shutdown()
+        torrent_server.server_close()
+    request.addfinalizer(fin)
+    torrent_server.url = 'http://127.0.0.1:%d' % torrent_server.server_port
+    return torrent_server
+
+
+class TestTorrentFetcher:
+
+    def test_fetch_reuses_connection(self, server):
+        fetcher = TorrentFetcher()
+        assert fetcher.fetch(server.url + '/data.torrent') == TORRENT
+        assert fetcher.fetch(server.url + '/data.torrent') == TORRENT
+        stats = fetcher.stats()
+        assert stats['requests'] == 2
+        assert stats['connections'] == 1
+        assert stats['reused'] == 1
+        assert server.connections == 1
+        fetcher.close()
+
+    def test_cache_revalidates(self, server, tmpdir):
+        cache = str(tmpdir.join('cache'))
+        TorrentFetcher(cache).fetch(server.url + '/data.torrent')
+        fetcher = TorrentFetcher(cache)
+        assert fetcher.fetch(server.url + '/data.torrent') == TORRENT
+        assert fetcher.stats()['not_modified'] == 1
+        assert fetcher.stats()['downloaded'] == 0
+
+    def test_redirect(self, server):
+        fetcher = TorrentFetcher()
+        assert fetcher.fetch(server.url + '/redirect') == TORRENT
+        assert server.paths == ['/redirect', '/data.torrent']
+
+    def test_not_found(self, server):
+        with pytest.raises(StorjTorrentError):
+            TorrentFetcher().fetch(server.url + '/missing.torrent')
+
+    def test_unreachable(self, server):
+        url = server.url + '/data.torrent'
+        server.shutdown()
+        server.server_close()
+        with pytest.raises(StorjTorrentError):
+            TorrentFetcher(timeout=1).fetch(url)
+
+    def test_unsupported_scheme(self):
+        with pytest.raises(StorjTorrentError):
+            TorrentFetcher().fetch('ftp://127.0.0.1/data.torrent')
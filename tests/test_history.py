@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import division
+from storjtorrent import TimeSeries, TransferHistory, StorjTorrentError
+import pytest
+
+TIERS = ((1, 10), (10, 6))
+
+
+def sample(rate):
+    return {'download_rate': rate, 'upload_rate': 0, 'num_peers': 1,
+            'progress': 0.5}
+
+
+class TestTimeSeries:
+
+    def test_window_returns_recent_samples(self):
+        series = TimeSeries(tiers=TIERS)
+        for second in range(5):
+            series.record(1000 + second, sample(second))
+        window = series.window(10, 1004)
+        assert [timestamp for timestamp, _ in window] == list(
+            range(1000, 1005))
+        assert window[-1][1]['download_rate'] == 4
+        assert window[0][1]['num_peers'] == 1
+
+    def test_samples_in_a_bucket_are_averaged(self):
+        series = TimeSeries(tiers=TIERS)
+        series.record(1000.0, sample(2))
+        series.record(1000.5, sample(4))
+        series.record(1001.0, sample(0))
+        window = series.window(5, 1001)
+        assert window[0] == (1000, window[0][1])
+        assert window[0][1]['download_rate'] == 3
+
+    def test_old_samples_are_overwritten(self):
+        series = TimeSeries(tiers=TIERS)
+        for second in range(25):
+            series.record(1000 + second, sample(second))
+        window = series.window(10, 1024)
+        assert len(window) == 10
+        assert window[0][0] == 1015
+
+    def test_long_window_is_downsampled(self):
+        series = TimeSeries(tiers=TIERS)
+        for second in range(40):
+            series.record(1000 + second, sample(second))
+        window = series.window(60, 1039)
+        timestamps = [timestamp for timestamp, _ in window]
+        assert timestamps == [1000, 1010, 1020, 1030]
+        assert window[0][1]['download_rate'] == 4.5
+
+    def test_gaps_are_skipped(self):
+        series = TimeSeries(tiers=TIERS)
+        series.record(1000, sample(1))
+        series.record(1005, sample(2))
+        window = series.window(10, 1005)
+        assert [timestamp for timestamp, _ in window] == [1000, 1005]
+
+    def test_memory_is_fixed(self):
+        series = TimeSeries(tiers=TIERS)
+        sizes = [len(tier.data) for tier in series.tiers]
+        for second in range(500):
+            series.record(1000 + second, sample(second))
+        assert [len(tier.data) for tier in series.tiers] == sizes
+
+    def test_needs_a_tier(self):
+        with pytest.raises(StorjTorrentError):
+            TimeSeries(tiers=())
+        with pytest.raises(StorjTorrentError):
+            TransferHistory(tiers=())
+
+
+class TestTransferHistory:
+
+    def test_per_torrent_and_session(self):
+        history = TransferHistory(TIERS)
+        history.record('a' * 40, 1000, sample(1))
+        history.record_session(1000, sample(3))
+        assert history.window('a' * 40, 5, 1000)[0][1][
+            'download_rate'] == 1
+        assert history.window(None, 5, 1000)[0][1]['download_rate'] == 3
+
+    def test_unknown_and_discarded(self):
+        history = TransferHistory(TIERS)
+        assert history.window('b' * 40, 5, 1000) == []
+        history.record('a' * 40, 1000, sample(1))
+        history.discard('a' * 40)
+        assert history.window('a' * 40, 5, 1000) == []
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from storjtorrent import default_piece_size, layout_cost, optimize_layout
+from storjtorrent.benchmark import bench_layout, format_rows
+import libtorrent as lt
+import pytest
+
+MiB = 1024 * 1024
+
+
+class TestLayout:
+
+    @pytest.mark.parametrize('total_size,piece_size', [
+        (0, 16384), (10 * MiB, 16384), (1024 * MiB, 512 * 1024),
+        (4096 * MiB, 2 * MiB), (1024 * 1024 * MiB, 2 * MiB)])
+    def test_default_piece_size(self, total_size, piece_size):
+        assert default_piece_size(total_size) == piece_size
+
+    @pytest.mark.parametrize('total_size', [
+        MiB, 1024 * MiB, 3000 * MiB, 64 * 1024 * MiB])
+    def test_default_piece_size_matches_libtorrent(self, total_size):
+        fs = lt.file_storage()
+        fs.add_file('shards/0', total_size)
+        torrent = lt.create_torrent(fs, 0)
+        assert default_piece_size(total_size) == torrent.piece_length()
+
+    def test_layout_cost_aligned(self):
+        cost = layout_cost([MiB] * 4, MiB)
+        assert cost['num_pieces'] == 4
+        assert cost['fetch_overhead'] == 0
+        assert cost['read_amplification'] == 1.0
+
+    def test_layout_cost_padding(self):
+        sizes = [100, 2 * MiB]
+        unpadded = layout_cost(sizes, MiB)
+        padded = layout_cost(sizes, MiB, pad_size_limit=MiB)
+        assert unpadded['padding_bytes'] == 0
+        assert padded['padding_bytes'] == MiB - 100
+        assert padded['fetch_overhead'] < unpadded['fetch_overhead']
+
+    def test_optimize_layout_multiple_of_block(self):
+        chosen = optimize_layout([300000, 7 * MiB, 12345, 3 * MiB])
+        assert chosen.piece_size % 16384 == 0
+        assert chosen.flags in (0, 1)
+        assert chosen.cost['piece_size'] == chosen.piece_size
+
+    def test_optimize_layout_beats_default(self):
+        sizes = [256 * 1024] * 100 + [32 * MiB] * 4
+        default = layout_cost(sizes, default_piece_size(sum(sizes)), 4 * MiB)
+        assert optimize_layout(sizes).cost['total'] <= default['total']
+
+    def test_bench_layout(self):
+        rows = bench_layout({'small': [MiB] * 10})
+        assert [row['layout'] for row in rows] == ['default', 'optimized']
+        assert format_rows(rows).splitlines()[0].split()[0] == 'set'
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from storjtorrent import Manifest, BackgroundVerifier
+import libtorrent as lt
+import pytest
+import shutil
+import os
+import json
+
+
+@pytest.fixture(scope='function')
+def torrent(tmpdir):
+    shutil.copytree('tests/data', str(tmpdir.join('data')))
+    return lt.torrent_info('tests/data.torrent'), str(tmpdir)
+
+
+class TestManifest:
+
+    def test_record_and_match(self, torrent, tmpdir):
+        info, save_path = torrent
+        manifest = Manifest(str(tmpdir.join('manifest.json')))
+        assert not manifest.matches(info, save_path)
+        manifest.record(info, save_path)
+        assert manifest.matches(info, save_path)
+
+    def test_save_and_load(self, torrent, tmpdir):
+        info, save_path = torrent
+        path = str(tmpdir.join('manifest.json'))
+        manifest = Manifest(path, key='secret')
+        manifest.record(info, save_path)
+        assert manifest.save()
+        assert not manifest.save()
+        assert Manifest(path, key='secret').matches(info, save_path)
+        assert not Manifest(path, key='wrong').matches(info, save_path)
+
+    def test_tampered_manifest_ignored(self, torrent, tmpdir):
+        info, save_path = torrent
+        path = str(tmpdir.join('manifest.json'))
+        manifest = Manifest(path)
+        manifest.record(info, save_path)
+        manifest.save()
+        data = json.load(open(path))
+        data['torrents'][str(info.info_hash())]['files'][0][1] += 1
+        json.dump(data, open(path, 'w'))
+        assert Manifest(path).torrents == {}
+
+    def test_modified_file_does_not_match(self, torrent, tmpdir):
+        info, save_path = torrent
+        manifest = Manifest(str(tmpdir.join('manifest.json')))
+        manifest.record(info, save_path)
+        os.utime(os.path.join(save_path, 'data', 'chunk0'), (0, 0))
+        assert not manifest.matches(info, save_path)
+
+    def test_discard(self, torrent, tmpdir):
+        info, save_path = torrent
+        manifest = Manifest(str(tmpdir.join('manifest.json')))
+        manifest.record(info, save_path)
+        manifest.discard(info.info_hash())
+        assert not manifest.matches(info, save_path)
+
+
+class TestBackgroundVerifier:
+
+    def test_verify(self, torrent):
+        info, save_path = torrent
+        verifier = BackgroundVerifier(workers=1)
+        assert verifier.verify(info, save_path) is True
+        verifier.stop()
+
+    def test_verify_corrupt(self, torrent):
+        info, save_path = torrent
+        with open(os.path.join(save_path, 'data', 'chunk1'), 'r+b') as f:
+            f.write(b'corrupt')
+        verifier = BackgroundVerifier(workers=1)
+        assert verifier.verify(info, save_path) is False
+        verifier.stop()
+
+    @pytest.mark.timeout(5)
+    def test_schedule_reports_failure(self, torrent):
+        info, save_path = torrent
+        os.remove(os.path.join(save_path, 'data', 'chunk2'))
+        failed = []
+        verifier = BackgroundVerifier(workers=1)
+        verifier.schedule(info, save_path, failed.append)
+        while not failed:
+            pass
+        verifier.stop()
+        assert failed == [info.info_hash()]
+        assert verifier.stats['failed'] == 1
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from storjtorrent import RemovalTracker, RemovalError
+import pytest
+
+KEY = 'a' * 40
+
+
+class TestRemovalTracker:
+
+    def test_deleted(self):
+        tracker = RemovalTracker()
+        future = tracker.track(KEY, 100)
+        assert not future.done()
+        assert future.result(timeout=0) is None
+        tracker.deleted(KEY)
+        assert future.done()
+        assert future.result() == 100
+        stats = tracker.stats()
+        assert stats['deleted'] == 1
+        assert stats['reclaimed'] == 100
+        assert stats['pending'] == 0
+
+    def test_failed(self):
+        tracker = RemovalTracker()
+        future = tracker.track(KEY, 100)
+        tracker.failed(KEY, 'Permission denied')
+        with pytest.raises(RemovalError):
+            future.result()
+        assert tracker.stats()['failed'] == 1
+        assert tracker.stats()['reclaimed'] == 0
+
+    def test_callbacks(self):
+        tracker = RemovalTracker()
+        future = tracker.track(KEY, 5)
+        seen = []
+        future.add_done_callback(seen.append)
+        tracker.deleted(KEY)
+        future.add_done_callback(seen.append)
+        assert seen == [future, future]
+
+    def test_removals_resolve_in_order(self):
+        tracker = RemovalTracker()
+        first = tracker.track(KEY, 1)
+        second = tracker.track(KEY, 2)
+        assert tracker.stats()['pending'] == 2
+        tracker.deleted(KEY)
+        assert first.done() and not second.done()
+
+    def test_cancel(self):
+        tracker = RemovalTracker()
+        futures = [tracker.track(KEY, 1), tracker.track('b' * 40, 2)]
+        tracker.cancel('stopped')
+        for future in futures:
+            with pytest.raises(RemovalError):
+                future.result(timeout=0)
+        stats = tracker.stats()
+        assert stats['pending'] == 0
+        assert stats['failed'] == 2
+        tracker.deleted(KEY)
+        assert tracker.stats()['deleted'] == 0
+
+    def test_unknown_alert_is_ignored(self):
+        tracker = RemovalTracker()
+        tracker.deleted(KEY)
+        assert tracker.stats()['deleted'] == 0
+
+    def test_resolved(self):
+        tracker = RemovalTracker()
+        assert tracker.resolved(KEY).result() == 0
+        with pytest.raises(RemovalError):
+            tracker.resolved(KEY, error=RemovalError('gone')).result()
@@ -24,15 +24,21 @@
 # SOFTWARE.
 
 from storjtorrent import Session
-from storjtorrent import StorjTorrentError
-from storjtorrent import IntervalTimer
+from storjtorrent import StorjTorrentError, AdmissionError, RemovalError
+from storjtorrent import Scheduler
 import libtorrent as lt
 import pytest
+import shutil
 import threading
+import time
 import os
 
-REMOTE_TORRENT = 'http://releases.ubuntu.com/14.04.1/'
-'ubuntu-14.04.1-desktop-amd64.iso.torrent'
+try:
+    from SimpleHTTPServer import SimpleHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+except ImportError:
+    from http.server import SimpleHTTPRequestHandler, HTTPServer
+
 REMOTE_HASH = 'cb84ccc10f296df72d6c40ba7a07c178a4323a14'
 REMOTE_MAGNET = ''.join(['magnet:?xt=urn:btih:', REMOTE_HASH])
 
@@ -64,10 +70,47 @@ def session_with_torrent(request):
     return swt
 
 
+@pytest.fixture(scope='function')
+def new_session(request):
+    """Return a function that creates sessions in the tests directory. They
+    are halted and their resume data removed after the test."""
+    os.chdir('tests')
+    sessions = []
+
+    def create(**options):
+        session = Session(**options)
+        sessions.append(session)
+        return session
+
+    def fin():
+        for session in sessions:
+            session.set_alive(False)
+        fr = 'data.fastresume'
+        os.remove(fr) if os.path.exists(fr) else None
+        os.chdir('../')
+    request.addfinalizer(fin)
+    return create
+
+
+@pytest.fixture(scope='function')
+def torrent_server(request):
+    """Serve the tests directory over HTTP."""
+    server = HTTPServer(('127.0.0.1', 0), SimpleHTTPRequestHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    def fin():
+        server.shutdown()
+        server.server_close()
+    request.addfinalizer(fin)
+    return 'http://127.0.0.1:%d' % server.server_port
+
+
 class TestSession:
 
     def session_thread_count(self):
-        return [isinstance(thread, IntervalTimer) for thread
+        return [isinstance(thread, Scheduler) for thread
                 in threading.enumerate()].count(True)
 
     @pytest.mark.parametrize('min', [-1, 65526, 'shoe'])
@@ -149,13 +192,19 @@ class TestSession:
             assert out == ''
 
     @pytest.mark.timeout(5)
-    def test_add_torrent_and_download(self, default_session):
-        default_session.add_torrent(REMOTE_TORRENT)
+    def test_add_torrent_and_download(self, default_session, torrent_server):
+        default_session.add_torrent(torrent_server + '/data.torrent')
         assert len(default_session.handles) is 1
+        assert default_session.handles[0].has_metadata()
+        assert default_session.get_fetch_stats()['downloaded'] == 1
         while len(default_session._status['torrents']) is 0:
             pass
-        assert default_session._status['torrents'].popitem()[1]['state_str']\
-            == 'downloading metadata'
+        assert 'data' in default_session._status['torrents']
+
+    def test_add_torrent_fetch_error(self, default_session, torrent_server):
+        with pytest.raises(StorjTorrentError):
+            default_session.add_torrent(torrent_server + '/missing.torrent')
+        assert len(default_session.handles) is 0
 
     @pytest.mark.timeout(5)
     def test_add_magnet_and_download(self, default_session):
@@ -166,6 +215,19 @@ class TestSession:
         assert default_session._status['torrents'].popitem()[1]['state_str']\
             == 'downloading metadata'
 
+    @pytest.mark.timeout(10)
+    def test_stalled_magnet_is_paused(self, new_session):
+        s = new_session(stall_after=0.5, stall_escalate_after=0.5,
+                        stall_action='pause')
+        s.add_torrent(REMOTE_MAGNET, peers=[('127.0.0.1', 1)])
+        while not s.get_stall_stats()['actions']['pause']:
+            pass
+        assert s.get_stall_stats()['stalled'] == 1
+        while not s.handles[0].status().paused:
+            pass
+        assert s.retry_stalled() == 1
+        assert not s.handles[0].status().paused
+
     def test_pause_torrents(self, session_with_torrent):
         session_with_torrent.pause()
         assert session_with_torrent.session.is_paused()
@@ -183,6 +245,35 @@ class TestSession:
         session_with_torrent.remove_torrent(info_hash)
         assert len(session_with_torrent.handles) is 0
 
+    @pytest.mark.timeout(10)
+    def test_remove_torrents_deletes_files(self, tmpdir, new_session):
+        shutil.copytree('data', str(tmpdir.join('data')))
+        s = new_session(save_path=str(tmpdir))
+        info_hash = s.add_torrent('data.torrent', seeding=True)
+        assert s.wait_for(info_hash, 'seeding', timeout=4) == 'seeding'
+        size = lt.torrent_info('data.torrent').total_size()
+        missing, removed = s.remove_torrents(['0' * 40, info_hash],
+                                             delete_files=True)
+        with pytest.raises(RemovalError):
+            missing.result(0)
+        assert removed.result(timeout=5) == size
+        assert not tmpdir.join('data', 'chunk0').check()
+        assert len(s.handles) == 0
+        stats = s.get_removal_stats()
+        assert stats['deleted'] == 1
+        assert stats['reclaimed'] == size
+
+    @pytest.mark.timeout(10)
+    def test_removals_finish_on_shutdown(self, tmpdir, new_session):
+        shutil.copytree('data', str(tmpdir.join('data')))
+        s = new_session(save_path=str(tmpdir))
+        info_hash = s.add_torrent('data.torrent', seeding=True)
+        assert s.wait_for(info_hash, 'seeding', timeout=4) == 'seeding'
+        future, = s.remove_torrents([info_hash], delete_files=True)
+        s.set_alive(False)
+        assert future.done()
+        assert s.get_removal_stats()['pending'] == 0
+
     @pytest.mark.timeout(5)
     def test_get_status(self, session_with_torrent):
         while 'data' not in session_with_torrent.get_status()['torrents']:
@@ -190,6 +281,247 @@ class TestSession:
         assert session_with_torrent.get_status()[
             'torrents']['data']['state_str'] is 'seeding'
 
+    @pytest.mark.timeout(5)
+    def test_wait_for_seeding(self, session_with_torrent):
+        info_hash = session_with_torrent.handles[0].info_hash()
+        assert session_with_torrent.wait_for(info_hash, 'seeding',
+                                             timeout=4) == 'seeding'
+
+    def test_wait_for_timeout(self, default_session):
+        assert default_session.wait_for(REMOTE_HASH, timeout=0.1) is None
+
+    @pytest.mark.timeout(5)
+    def test_on_complete(self, session_with_torrent):
+        info_hash = session_with_torrent.handles[0].info_hash()
+        done = threading.Event()
+        session_with_torrent.on_complete(info_hash,
+                                         lambda *args: done.set())
+        assert done.wait(4)
+
+    @pytest.mark.timeout(5)
+    def test_scheduler_stats(self, session_with_torrent):
+        while not session_with_torrent.get_scheduler_stats()['status']['runs']:
+            pass
+        stats = session_with_torrent.get_scheduler_stats()
+        assert set(stats) == set(['status', 'checkpoint', 'announce',
+                                  'rebalance'])
+        assert stats['checkpoint']['runs'] == 0
+
+    @pytest.mark.timeout(5)
+    def test_history(self, session_with_torrent):
+        info_hash = session_with_torrent.handles[0].info_hash()
+        while not session_with_torrent.get_history(info_hash, 10):
+            pass
+        timestamp, sample = session_with_torrent.get_history(info_hash)[-1]
+        assert 0 <= sample['progress'] <= 1
+        assert session_with_torrent.get_history(seconds=10)
+
+    def test_unknown_allocation_mode(self):
+        with pytest.raises(StorjTorrentError):
+            Session(allocation_mode='contiguous')
+
+    @pytest.mark.parametrize('mode', ['full', 'sparse'])
+    def test_add_torrent_allocation_mode(self, default_session, mode):
+        info_hash = default_session.add_torrent('data.torrent', seeding=True,
+                                                allocation_mode=mode)
+        handle = default_session.session.find_torrent(info_hash)
+        assert handle.status().storage_mode == Session._storage_mode(mode)
+        with pytest.raises(StorjTorrentError):
+            default_session.add_torrent('data.torrent',
+                                        allocation_mode='contiguous')
+
+    def test_disk_stats(self, session_with_torrent):
+        stats = session_with_torrent.get_disk_stats()
+        assert stats['blocks_read_miss'] == (stats['blocks_read'] -
+                                             stats['blocks_read_hit'])
+        assert 0 <= stats['hit_rate'] <= 1
+        assert stats['read_queue'] >= 0
+        assert stats['blocked_jobs'] >= 0
+
+    @pytest.mark.parametrize('transport,tcp,utp', [('tcp', True, False),
+                                                   ('utp', False, True),
+                                                   ('mixed', True, True)])
+    def test_transport(self, transport, tcp, utp, new_session):
+        s = new_session(transport=transport, utp_options={'target_delay': 50})
+        settings = s.session.settings()
+        assert settings.enable_outgoing_tcp == tcp
+        assert settings.enable_incoming_tcp == tcp
+        assert settings.enable_outgoing_utp == utp
+        assert settings.enable_incoming_utp == utp
+        assert settings.utp_target_delay == 50
+
+    @pytest.mark.parametrize('options', [{'transport': 'sctp'},
+                                         {'utp_options': {'delay': 5}}])
+    def test_bad_transport(self, options):
+        with pytest.raises(StorjTorrentError):
+            Session(**options)
+
+    @pytest.mark.timeout(5)
+    def test_cache_warming(self, new_session):
+        s = new_session(warm_cache=True, warm_interval=0.1)
+        # Warm every torrent, even without peers.
+        s.warmer.min_demand = 0
+        info_hash = s.add_torrent('data.torrent', seeding=True)
+        assert s.wait_for(info_hash, 'seeding', timeout=4) == 'seeding'
+        while not s.warmer.hot():
+            pass
+        s._warm_cache()
+        stats = s.get_cache_warming_stats()
+        assert stats['hot'] == [str(info_hash)]
+        assert stats['pieces_warmed'] > 0
+        assert 'warm' in s.get_scheduler_stats()
+        s.remove_torrent(info_hash)
+        assert s.get_cache_warming_stats()['demand'] == {}
+
+    @pytest.mark.timeout(5)
+    def test_cache_warming_skips_downloads(self, new_session, tmpdir):
+        s = new_session(save_path=str(tmpdir), warm_cache=True,
+                        warm_interval=0.1)
+        s.warmer.min_demand = 0
+        info_hash = s.add_torrent('data.torrent')
+        while not s.get_history(info_hash, 10):
+            pass
+        s._warm_cache()
+        stats = s.get_cache_warming_stats()
+        assert stats['hot'] == []
+        assert stats['pieces_warmed'] == 0
+
+    def test_cache_warming_off(self, default_session):
+        assert default_session.get_cache_warming_stats() == {}
+
+    def test_checkpoint(self, session_with_torrent):
+        session_with_torrent._checkpoint()
+        assert os.path.exists('data.fastresume')
+
+    def test_settings_applied(self, new_session):
+        s = new_session(connections_limit=50, unchoke_slots_limit=5)
+        settings = s.session.settings()
+        assert settings.connections_limit == 50
+        assert settings.unchoke_slots_limit == 5
+        assert settings.user_agent.startswith('Storj/')
+
+    def test_allocations(self, session_with_torrent):
+        info_hash = str(session_with_torrent.handles[0].info_hash())
+        session_with_torrent._rebalance()
+        max_connections, max_uploads = \
+            session_with_torrent.get_allocations()[info_hash]
+        assert 2 <= max_connections <= 60
+        assert max_uploads >= 1
+
+    def test_bandwidth_classes(self, new_session):
+        s = new_session(max_upload_rate=100,
+                        bandwidth_classes={'retrieval': {'max_download': 50},
+                                           'replication': {}})
+        info_hash = s.add_torrent('data.torrent', seeding=True)
+        s._rebalance()
+        handle = s.handles[0]
+        assert handle.download_limit() == 50000
+        assert handle.upload_limit() == 100000
+        s.set_bandwidth_class(info_hash, 'replication')
+        s._rebalance()
+        assert handle.download_limit() <= 0
+        assert s.get_bandwidth_stats()['replication']['torrents'] == 1
+        with pytest.raises(StorjTorrentError):
+            s.add_torrent('data.torrent', bandwidth_class='bulk')
+        with pytest.raises(StorjTorrentError):
+            s.set_bandwidth_class('0' * 40, 'retrieval')
+
+    def test_custom_bandwidth_classes(self, new_session):
+        with pytest.raises(StorjTorrentError):
+            new_session(bandwidth_classes={})
+        s = new_session(lean=True, bandwidth_classes={'hot': {}, 'cold': {}})
+        info_hash = s.add_torrent('data.torrent', seeding=True)
+        assert s.get_bandwidth_stats()['cold']['torrents'] == 1
+        assert s.wait_for(info_hash, 'seeding', timeout=4) == 'seeding'
+        s.evict_idle_after = 0
+        assert s._evict_idle()
+        assert s.get_bandwidth_stats()['cold']['torrents'] == 0
+        s.set_bandwidth_class(info_hash, 'hot')
+        assert s.reload_torrent(info_hash)
+        assert s.get_bandwidth_stats()['hot']['torrents'] == 1
+
+    def test_admission_queue(self, new_session):
+        s = new_session(admission_limits={'retrieval': 1},
+                        max_queued_downloads=1)
+        s.add_torrent(REMOTE_MAGNET)
+        assert not s.handles[0].status().paused
+        s.add_torrent(REMOTE_MAGNET.replace('cb84', 'cb85'))
+        assert s.handles[1].status().paused
+        with pytest.raises(AdmissionError):
+            s.add_torrent(REMOTE_MAGNET.replace('cb84', 'cb86'))
+        assert len(s.handles) == 2
+        assert len(s.session.get_torrents()) == 2
+        stats = s.get_admission_stats()['retrieval']
+        assert (stats['active'], stats['queued'], stats['rejected']) == \
+            (1, 1, 1)
+        s.remove_torrent(s.handles[0].info_hash())
+        assert not s.handles[0].status().paused
+
+    @pytest.mark.timeout(10)
+    def test_lean_evict_and_reload(self, new_session):
+        s = new_session(lean=True, evict_idle_after=1)
+        info_hash = s.add_torrent('data.torrent', seeding=True)
+        assert s.wait_for(info_hash, 'seeding', timeout=4) == 'seeding'
+        while not s.evicted_torrents():
+            time.sleep(0.1)
+        assert s.evicted_torrents() == [str(info_hash)]
+        assert len(s.handles) == 0
+        assert s.session.find_torrent(info_hash).is_valid()
+        assert s.get_history(info_hash) == []
+        s.reannounce()
+        assert s.get_announce_stats()['requested'] == 1
+        os.remove('data.fastresume')
+        s._save_resume_data()
+        assert os.path.exists('data.fastresume')
+        assert s.reload_torrent(info_hash)
+        assert len(s.handles) == 1
+        assert not s.reload_torrent(info_hash)
+
+    @pytest.mark.timeout(20)
+    def test_evicted_torrent_is_still_served(self, new_session, tmpdir):
+        seeder = new_session(lean=True, port_min=0, port_max=0)
+        info_hash = seeder.add_torrent('data.torrent', seeding=True)
+        assert seeder.wait_for(info_hash, 'seeding', timeout=4) == 'seeding'
+        seeder.evict_idle_after = 0
+        assert seeder._evict_idle()
+        assert seeder.evicted_torrents() == [str(info_hash)]
+
+        leecher = new_session(port_min=0, port_max=0, save_path=str(tmpdir))
+        leecher.add_torrent(
+            'data.torrent',
+            peers=[('127.0.0.1', seeder.session.listen_port())])
+        assert leecher.wait_for(info_hash, timeout=15) is not None
+        assert tmpdir.join('data', 'chunk0').read('rb') == open(
+            os.path.join('data', 'chunk0'), 'rb').read()
+        # The peer's requests brought the torrent back into the session.
+        assert seeder.evicted_torrents() == []
+
+    @pytest.mark.timeout(10)
+    def test_manifest_seed_mode(self, tmpdir, new_session):
+        manifest_path = str(tmpdir.join('manifest.json'))
+        s = new_session(manifest_path=manifest_path)
+        info_hash = s.add_torrent('data.torrent', seeding=True)
+        assert s.wait_for(info_hash, 'seeding', timeout=4) == 'seeding'
+        s.set_alive(False)
+        assert os.path.exists(manifest_path)
+
+        s = new_session(manifest_path=manifest_path)
+        s.add_torrent('data.torrent', seeding=True)
+        assert s.handles[0].status().seed_mode
+
+    @pytest.mark.timeout(10)
+    def test_manifest_saved_by_scheduler(self, tmpdir, new_session,
+                                         monkeypatch):
+        monkeypatch.setattr('storjtorrent.session.MANIFEST_SAVE_INTERVAL',
+                            0.1)
+        manifest_path = str(tmpdir.join('manifest.json'))
+        s = new_session(manifest_path=manifest_path)
+        info_hash = s.add_torrent('data.torrent', seeding=True)
+        assert s.wait_for(info_hash, 'seeding', timeout=4) == 'seeding'
+        while not os.path.exists(manifest_path):
+            time.sleep(0.05)
+        assert s.get_scheduler_stats()['manifest']['runs'] > 0
+
     @pytest.mark.timeout(10)
     def test_reannounce(self, session_with_torrent):
         session_with_torrent.reannounce()
@@ -197,3 +529,13 @@ class TestSession:
                                         ._status['alerts']):
             pass
         assert True
+
+    @pytest.mark.timeout(10)
+    def test_reannounce_stats(self, new_session):
+        s = new_session(announce_window=1)
+        s.add_torrent('data.torrent', seeding=True)
+        s.reannounce()
+        assert s.get_announce_stats()['requested'] == 1
+        while s.get_announce_stats()['announced'] == 0:
+            pass
+        assert s.get_announce_stats()['pending'] == 0
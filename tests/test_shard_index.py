@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from storjtorrent import ShardIndex, ShardLocation
+import libtorrent as lt
+import pytest
+
+HASH = '994bab2df24af5297d86d48abf9fb13bc49b8cb2'
+
+
+@pytest.fixture(scope='function')
+def index(request, tmpdir):
+    shard_index = ShardIndex(str(tmpdir.join('shards.db')))
+    request.addfinalizer(shard_index.close)
+    return shard_index
+
+
+class TestShardIndex:
+
+    def test_add_and_lookup(self, index):
+        assert index.add_shards(HASH, [('a', 0, 0, 10), ('b', 1, 10, 5)]) == 2
+        assert index.lookup('b') == [ShardLocation(HASH, 1, 10, 5)]
+        assert index.lookup('missing') == []
+        assert index.count() == 2
+
+    def test_lookup_many(self, index):
+        index.add_shards(HASH, [(str(i), i, i, 1) for i in range(1200)])
+        found = index.lookup_many(str(i) for i in range(0, 1500, 2))
+        assert len(found) == 600
+        assert found['1198'] == [ShardLocation(HASH, 1198, 1198, 1)]
+
+    def test_shards_and_remove(self, index):
+        index.add_shards(HASH, [('b', 1, 10, 5), ('a', 0, 0, 10)])
+        index.add_shards('other', [('c', 0, 0, 1)])
+        assert [shard for shard, _ in index.shards(HASH)] == ['a', 'b']
+        assert index.remove_torrent(HASH) == 2
+        assert index.count() == 1
+
+    def test_remove_torrents(self, index):
+        index.add_shards(HASH, [('a', 0, 0, 10), ('b', 1, 10, 5)])
+        index.add_shards('other', [('c', 0, 0, 1)])
+        index.add_shards('kept', [('d', 0, 0, 1)])
+        assert index.remove_torrents([HASH, 'other', 'missing']) == 3
+        assert index.count() == 1
+
+    def test_persistent(self, index):
+        index.add_shards(HASH, [('a', 0, 0, 10)])
+        reopened = ShardIndex(index.path)
+        assert reopened.lookup('a') == [ShardLocation(HASH, 0, 0, 10)]
+        reopened.close()
+
+    def test_add_torrent(self, index):
+        info = lt.torrent_info('tests/data.torrent')
+        assert index.add_torrent(info) == info.num_files()
+        location = index.lookup('chunk1')[0]
+        assert location.info_hash == str(info.info_hash())
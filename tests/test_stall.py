@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from storjtorrent import StallDetector, StorjTorrentError
+import pytest
+
+KEY = 'a' * 40
+
+
+def stall(detector, done=0, start=0, seconds=30):
+    """Feed a download that never progresses and return the steps taken."""
+    steps = []
+    for now in range(start, start + seconds):
+        step = detector.update(KEY, True, done, now)
+        if step is not None:
+            steps.append((now, step))
+    return steps
+
+
+class TestStallDetector:
+
+    def test_unknown_action(self):
+        with pytest.raises(StorjTorrentError):
+            StallDetector(action='delete')
+
+    def test_escalation(self):
+        detector = StallDetector(stall_after=10, escalate_after=5)
+        assert stall(detector) == [(10, 'reannounce'), (15, 'connect_peers'),
+                                   (20, 'deprioritize')]
+        stats = detector.stats(29)
+        assert stats['stalls'] == 1
+        assert stats['stalled'] == 1
+        assert stats['actions'] == {'reannounce': 1, 'connect_peers': 1,
+                                    'deprioritize': 1}
+        assert stats['torrents'][KEY]['stalled_for'] == 29
+
+    def test_pause_action(self):
+        detector = StallDetector(stall_after=1, escalate_after=1,
+                                 action='pause')
+        assert [step for _, step in stall(detector)][-1] == 'pause'
+
+    def test_progress_prevents_stall(self):
+        detector = StallDetector(stall_after=10, escalate_after=5)
+        for now in range(30):
+            assert detector.update(KEY, True, now * 100, now) is None
+        assert detector.stats(30)['torrents'][KEY]['velocity'] > 0
+
+    def test_recovery(self):
+        detector = StallDetector(stall_after=10, escalate_after=5)
+        stall(detector, seconds=12)
+        assert detector.update(KEY, True, 1, 14) is None
+        stats = detector.stats(14)
+        assert stats['recovered'] == 1
+        assert stats['stalled'] == 0
+        assert stats['mean_duration'] == 4
+        assert detector.stalled() == {}
+
+    def test_metadata_counts_as_progress(self):
+        detector = StallDetector(stall_after=10)
+        stall(detector, done=-1, seconds=9)
+        assert detector.update(KEY, True, 0, 9) is None
+        assert detector.update(KEY, True, 0, 15) is None
+
+    def test_inactive_resets(self):
+        detector = StallDetector(stall_after=10)
+        stall(detector, seconds=9)
+        detector.update(KEY, False, 0, 9)
+        assert stall(detector, start=10, seconds=9) == []
+
+    def test_paused_stays_stalled_until_retry(self):
+        detector = StallDetector(stall_after=1, escalate_after=1,
+                                 action='pause')
+        stall(detector, seconds=5)
+        detector.update(KEY, False, 0, 6)
+        assert detector.stalled() == {KEY: 3}
+        assert detector.retry(KEY, 6)
+        assert detector.stalled() == {}
+        assert not detector.retry(KEY, 7)
+
+    def test_disabled(self):
+        assert stall(StallDetector(stall_after=0)) == []
+
+    def test_discard(self):
+        detector = StallDetector(stall_after=1)
+        stall(detector, seconds=5)
+        detector.discard(KEY)
+        assert detector.stalled() == {}
@@ -25,6 +25,8 @@
 
 from storjtorrent import StorjTorrent
 from storjtorrent import StorjTorrentError
+from storjtorrent import ShardIndex
+import libtorrent as lt
 import pytest
 import os
 
@@ -117,6 +119,125 @@ class TestStorjTorrent:
         st.generate_torrent([], 'data', verbose=verbose)
         assert os.path.exists('storj.torrent')
 
+    @pytest.mark.parametrize('verbose', [True, False, ])
+    def test_generate_torrent_auto_layout(self, st, verbose):
+        st.generate_torrent([], 'data', auto_layout=True, verbose=verbose)
+        assert os.path.exists('storj.torrent')
+
+    def test_generate_torrent_shard_index(self, st, tmpdir):
+        index = ShardIndex(str(tmpdir.join('shards.db')))
+        info_hash = st.generate_torrent([], 'data', shard_index=index)
+        assert index.lookup('chunk0')[0].info_hash == str(info_hash)
+        index.close()
+
+    def test_find_and_remove_by_shard(self, tmpdir):
+        os.chdir('tests')
+        try:
+            s = StorjTorrent(shard_index=str(tmpdir.join('shards.db')))
+            info_hash = s.add_torrent('data.torrent', True)
+            assert s.find_shard('chunk2')[0].info_hash == str(info_hash)
+            s.remove_torrent(shard_id='chunk2')
+            assert s.find_shard('chunk2') == []
+            s.halt_session()
+        finally:
+            os.chdir('../')
+
+    def test_remove_keeps_serving_evicted(self):
+        os.chdir('tests')
+        try:
+            s = StorjTorrent(lean=True, evict_idle_after=0)
+            evicted = s.add_torrent('data.torrent', True)
+            assert s.session.wait_for(evicted, 'seeding', timeout=4)
+            assert s.session._evict_idle()
+            s.remove_torrent(s.add_torrent(
+                'magnet:?xt=urn:btih:' + '1' * 40, False))
+            assert s.session.alive
+            s.halt_session()
+        finally:
+            if os.path.exists('data.fastresume'):
+                os.remove('data.fastresume')
+            os.chdir('../')
+
+    def test_remove_ambiguous_shard(self, tmpdir):
+        os.chdir('tests')
+        try:
+            s = StorjTorrent(shard_index=str(tmpdir.join('shards.db')))
+            s.add_torrent('data.torrent', True)
+            s.generate_torrent([], 'data', piece_size=32768,
+                               torrent_name='copy.torrent',
+                               save_path=str(tmpdir))
+            second = s.add_torrent(str(tmpdir.join('copy.torrent')), True)
+            assert len(s.find_shard('chunk2')) == 2
+            with pytest.raises(StorjTorrentError):
+                s.remove_torrent(shard_id='chunk2')
+            assert len(s.session.handles) == 2
+            s.remove_torrent(second)
+            s.remove_torrent(shard_id='chunk2')
+            assert s.find_shard('chunk2') == []
+        finally:
+            os.chdir('../')
+
+    def test_find_shard_without_index(self, st):
+        with pytest.raises(StorjTorrentError):
+            st.find_shard('chunk0')
+
+    def test_generate_torrent_from_data(self, st, tmpdir):
+        # Same order as the directory walk in generate_torrent().
+        names = [name for name in os.listdir('data')
+                 if not name.startswith('.')]
+        st.generate_torrent([], 'data', piece_size=16384, flags=0,
+                            save_path=str(tmpdir))
+        expected = st.get_hash([], str(tmpdir.join('storj.torrent')))
+        items = [(name, open(os.path.join('data', name), 'rb'))
+                 for name in names]
+        info_hash = st.generate_torrent_from_data(
+            [], items, 'data', piece_size=16384, save_path=str(tmpdir),
+            data_path=str(tmpdir))
+        assert info_hash == expected
+        assert os.path.exists(str(tmpdir.join('data.torrent')))
+        assert tmpdir.join('data', names[0]).read('rb') == open(
+            os.path.join('data', names[0]), 'rb').read()
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_generate_torrents(self, st, tmpdir, workers):
+        directories = []
+        for number in range(3):
+            directory = tmpdir.mkdir('bundle%d' % number)
+            directory.join('shard').write('shard %d' % number)
+            directories.append(str(directory))
+        results = list(st.generate_torrents([], directories, workers=workers,
+                                            save_path=str(tmpdir),
+                                            include_data=True))
+        assert len(results) == 3
+        assert len(set(result['info_hash'] for result in results)) == 3
+        assert results[-1]['completed'] == 3
+        for result in results:
+            assert os.path.exists(result['path'])
+            assert result['path'].endswith(
+                os.path.basename(result['directory']) + '.torrent')
+            assert result['data'] == open(result['path'], 'rb').read()
+
+    def test_generate_torrents_duplicate_names(self, st, tmpdir):
+        directories = []
+        for parent in ('a', 'b'):
+            directory = tmpdir.mkdir(parent).mkdir('shards')
+            directory.join('shard').write('shard ' + parent)
+            directories.append(str(directory))
+        with pytest.raises(StorjTorrentError):
+            list(st.generate_torrents([], directories,
+                                      save_path=str(tmpdir)))
+        assert not tmpdir.join('shards.torrent').check()
+
+    def test_generate_torrents_bytes_exclude_padding(self, st, tmpdir):
+        directory = tmpdir.mkdir('bundle')
+        directory.join('a').write('x' * 100)
+        directory.join('b').write('y' * 40000)
+        result, = st.generate_torrents([], [str(directory)], workers=1,
+                                       save_path=str(tmpdir),
+                                       piece_size=16384, pad_size_limit=0)
+        assert lt.torrent_info(result['path']).total_size() > 40100
+        assert result['bytes'] == 40100
+
     @pytest.mark.parametrize('verbose', [(True), (False), ])
     def test_bad_torrent_name(self, st, verbose):
         with pytest.raises(StorjTorrentError):
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from storjtorrent import StorjTorrentError, PieceHasher
+from storjtorrent import build_torrent
+from array import array
+import hashlib
+import io
+import os
+import pytest
+import sys
+
+PIECE = 16384
+
+
+def piece_hashes(data):
+    return b''.join(hashlib.sha1(data[offset:offset + PIECE]).digest()
+                    for offset in range(0, len(data), PIECE))
+
+
+class TestPieceHasher:
+
+    def test_pieces_span_updates(self):
+        data = os.urandom(PIECE * 2 + 100)
+        hasher = PieceHasher(PIECE)
+        hasher.update(data[:10])
+        hasher.update(bytearray(data[10:PIECE + 5]))
+        hasher.update(memoryview(data)[PIECE + 5:])
+        assert hasher.length == len(data)
+        assert hasher.pieces() == piece_hashes(data)
+
+    @pytest.mark.skipif(sys.version_info < (3,),
+                        reason='arrays have no memoryview on Python 2')
+    def test_counts_bytes_of_typed_buffers(self):
+        words = array('I', range(PIECE // 2))
+        data = words.tobytes()
+        hasher = PieceHasher(PIECE)
+        hasher.update(words)
+        assert hasher.length == len(data)
+        assert hasher.pieces() == piece_hashes(data)
+
+
+class TestBuildTorrent:
+
+    def test_hashes_across_shards(self):
+        first, second = os.urandom(PIECE + 1), os.urandom(PIECE)
+        torrent = build_torrent([('a', first), ('sub/b', io.BytesIO(second))],
+                                'bundle', PIECE)
+        assert piece_hashes(first + second) in torrent
+        assert b'5:filesld6:lengthi16385e4:pathl1:aee' in torrent
+        assert b'4:pathl3:sub1:bee' in torrent
+
+    def test_writes_shards_in_same_pass(self, tmpdir):
+        data = os.urandom(PIECE * 3)
+        build_torrent([('sub/a', io.BytesIO(data))], 'bundle', PIECE,
+                      data_path=str(tmpdir))
+        assert tmpdir.join('bundle', 'sub', 'a').read('rb') == data
+
+    @pytest.mark.parametrize('name', ['', '../escape', 'a/./b'])
+    def test_rejects_bad_names(self, name):
+        with pytest.raises(StorjTorrentError):
+            build_torrent([(name, b'data')], 'bundle', PIECE)
+
+    @pytest.mark.parametrize('piece_size', [0, 1000])
+    def test_rejects_bad_piece_size(self, piece_size):
+        with pytest.raises(StorjTorrentError):
+            build_torrent([('a', b'data')], 'bundle', piece_size)
+
+    def test_rejects_empty_torrent(self):
+        with pytest.raises(StorjTorrentError):
+            build_torrent([], 'bundle', PIECE)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+from storjtorrent import Scheduler, IntervalTimer, EventLoop
+import logging
+import pytest
+import threading
+import time
+
+
+@pytest.fixture(scope='function')
+def scheduler(request):
+    s = Scheduler()
+    s.start()
+    request.addfinalizer(s.stop)
+    return s
+
+
+class TestScheduler:
+
+    @pytest.mark.timeout(5)
+    def test_fixed_rate(self, scheduler):
+        runs = []
+
+        def slow():
+            runs.append(time.time())
+            time.sleep(0.03)
+        scheduler.add_periodic('slow', 0.05, slow)
+        while len(runs) < 6:
+            pass
+        periods = [b - a for a, b in zip(runs, runs[1:])]
+        assert all(abs(period - 0.05) < 0.02 for period in periods)
+        assert scheduler.stats()['slow']['overruns'] == 0
+
+    @pytest.mark.timeout(5)
+    def test_overrun(self, scheduler):
+        scheduler.add_periodic('late', 0.01, lambda: time.sleep(0.035))
+        while scheduler.stats()['late']['runs'] < 3:
+            pass
+        assert scheduler.stats()['late']['overruns'] >= 3
+
+    @pytest.mark.timeout(5)
+    def test_adaptive_backoff_and_reset(self, scheduler):
+        scheduler.add_periodic('idle', 0.01, lambda: False, max_interval=0.04)
+        while scheduler.stats()['idle']['interval'] < 0.04:
+            pass
+        scheduler.reset('idle')
+        assert scheduler.stats()['idle']['interval'] == 0.01
+
+    @pytest.mark.timeout(5)
+    def test_resets_coalesce(self, scheduler):
+        scheduler.add_periodic('status', 60, lambda: None, delay=60)
+        for _ in range(50):
+            scheduler.reset('status')
+        while scheduler.stats()['status']['runs'] < 1:
+            pass
+        time.sleep(0.1)
+        assert scheduler.stats()['status']['runs'] == 1
+
+    @pytest.mark.timeout(5)
+    def test_reset_while_running(self, scheduler):
+        started = threading.Event()
+        release = threading.Event()
+
+        def work():
+            started.set()
+            release.wait()
+        scheduler.add_periodic('work', 60, work)
+        assert started.wait(4)
+        for _ in range(3):
+            scheduler.reset('work')
+        release.set()
+        while scheduler.stats()['work']['runs'] < 2:
+            pass
+        time.sleep(0.1)
+        stats = scheduler.stats()['work']
+        assert stats['runs'] == 2
+        assert stats['total_time'] >= stats['max_time'] > 0
+
+    @pytest.mark.timeout(5)
+    def test_once_and_cancel(self, scheduler):
+        done = threading.Event()
+        scheduler.add_once('once', 0.01, done.set)
+        scheduler.add_once('never', 0.05, pytest.fail)
+        scheduler.cancel('never')
+        assert done.wait(4)
+        time.sleep(0.1)
+        assert scheduler.stats() == {}
+
+    @pytest.mark.timeout(5)
+    def test_errors_counted(self, scheduler, request):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger = logging.getLogger('storjtorrent.thread_management')
+        logger.addHandler(handler)
+        request.addfinalizer(lambda: logger.removeHandler(handler))
+        scheduler.add_periodic('boom', 0.01, lambda: 1 / 0)
+        while scheduler.stats()['boom']['errors'] < 2:
+            pass
+        assert scheduler.is_alive()
+        assert records[0].getMessage() == 'Task boom failed'
+        assert records[0].exc_info[0] is ZeroDivisionError
+
+
+class TestIntervalTimer:
+
+    @pytest.mark.timeout(5)
+    def test_interval_timer(self):
+        done = threading.Event()
+        timer = IntervalTimer(0.01, done.set)
+        timer.start()
+        assert done.wait(4)
+        timer.stop()
+        assert not timer.is_alive()
+
+
+class TestEventLoop:
+
+    @pytest.mark.timeout(5)
+    def test_event_loop(self):
+        events = [False, True]
+        handled = threading.Event()
+        loop = EventLoop(lambda: events.pop() if events else time.sleep(0.01),
+                         handled.set)
+        loop.start()
+        assert handled.wait(4)
+        loop.stop()
+
+    @pytest.mark.timeout(5)
+    def test_event_loop_survives_errors(self):
+        calls = []
+        handled = threading.Event()
+
+        def handle():
+            calls.append(True)
+            if len(calls) == 1:
+                raise ValueError('bad alert')
+            handled.set()
+        loop = EventLoop(lambda: time.sleep(0.01) or True, handle)
+        loop.start()
+        assert handled.wait(4)
+        loop.stop()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from storjtorrent import Tracer, traced, tracer
+import json
+import pstats
+
+
+def busy():
+    return sum(range(1000))
+
+
+class TestTracer:
+
+    def test_disabled_records_nothing(self):
+        local_tracer = Tracer()
+        with local_tracer.span('work'):
+            busy()
+        assert local_tracer.timings() == {}
+        assert local_tracer.spans() == []
+
+    def test_spans_and_timings(self):
+        local_tracer = Tracer()
+        local_tracer.enable()
+        for _ in range(3):
+            with local_tracer.span('outer'):
+                with local_tracer.span('inner'):
+                    busy()
+        timings = local_tracer.timings()
+        assert timings['outer']['count'] == 3
+        assert timings['outer']['total'] >= timings['inner']['total']
+        assert timings['inner']['max'] >= timings['inner']['mean']
+        assert [span['name'] for span in local_tracer.spans()][:2] == [
+            'inner', 'outer']
+
+    def test_span_buffer_is_bounded(self):
+        local_tracer = Tracer(max_spans=5)
+        local_tracer.enable()
+        for _ in range(20):
+            with local_tracer.span('work'):
+                pass
+        assert len(local_tracer.spans()) == 5
+        assert local_tracer.timings()['work']['count'] == 20
+
+    def test_exception_still_recorded(self):
+        local_tracer = Tracer()
+        local_tracer.enable()
+        try:
+            with local_tracer.span('failing'):
+                raise ValueError()
+        except ValueError:
+            pass
+        assert local_tracer.timings()['failing']['count'] == 1
+
+    def test_export(self, tmpdir):
+        local_tracer = Tracer()
+        local_tracer.enable()
+        with local_tracer.span('work'):
+            busy()
+        path = str(tmpdir.join('spans.json'))
+        local_tracer.export(path)
+        report = json.load(open(path))
+        assert report['timings']['work']['count'] == 1
+        assert report['spans'][0]['name'] == 'work'
+
+    def test_profiling(self, tmpdir):
+        local_tracer = Tracer()
+        path = str(tmpdir.join('profile'))
+        assert not local_tracer.export_profile(path)
+        local_tracer.start_profiling(sample_rate=1)
+        with local_tracer.span('work'):
+            busy()
+        local_tracer.stop_profiling()
+        assert local_tracer.export_profile(path)
+        assert pstats.Stats(path).total_calls > 0
+
+    def test_reset(self):
+        local_tracer = Tracer()
+        local_tracer.enable()
+        with local_tracer.span('work'):
+            pass
+        local_tracer.reset()
+        assert local_tracer.timings() == {}
+
+
+class TestTraced:
+
+    def test_decorator(self):
+        @traced('test.busy')
+        def work(value):
+            return value * 2
+
+        tracer.reset()
+        assert work(2) == 4
+        assert 'test.busy' not in tracer.timings()
+        tracer.enable()
+        try:
+            assert work(3) == 6
+        finally:
+            tracer.disable()
+        assert tracer.timings()['test.busy']['count'] == 1
+        assert work.__name__ == 'work'
+        tracer.reset()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Josh Brandoff
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from storjtorrent import CacheWarmer, RATE_PER_PEER
+
+
+class FakeStatus(object):
+
+    def __init__(self, upload_rate=0, num_peers=0, num_seeds=0,
+                 paused=False, is_seeding=True):
+        self.upload_rate = upload_rate
+        self.num_peers = num_peers
+        self.num_seeds = num_seeds
+        self.paused = paused
+        self.is_seeding = is_seeding
+
+
+class TestCacheWarmer:
+
+    def test_hot_torrents_by_demand(self):
+        warmer = CacheWarmer(top=2)
+        warmer.update('a', FakeStatus(upload_rate=10 * RATE_PER_PEER), 0)
+        warmer.update('b', FakeStatus(num_peers=3, num_seeds=1), 0)
+        warmer.update('c', FakeStatus(upload_rate=5 * RATE_PER_PEER), 0)
+        warmer.update('d', FakeStatus(upload_rate=100, num_peers=2,
+                                      num_seeds=2), 0)
+        assert warmer.hot() == ['a', 'c']
+
+    def test_downloads_are_not_tracked(self):
+        warmer = CacheWarmer()
+        warmer.update('a', FakeStatus(upload_rate=10 * RATE_PER_PEER,
+                                      num_peers=5, is_seeding=False), 0)
+        assert warmer.hot() == []
+        warmer.update('b', FakeStatus(upload_rate=RATE_PER_PEER), 0)
+        warmer.update('b', FakeStatus(upload_rate=RATE_PER_PEER,
+                                      is_seeding=False), 1)
+        assert warmer.stats()['demand'] == {}
+
+    def test_demand_decays(self):
+        warmer = CacheWarmer(half_life=10)
+        warmer.update('a', FakeStatus(upload_rate=4 * RATE_PER_PEER), 0)
+        warmer.update('a', FakeStatus(paused=True), 10)
+        assert warmer.stats()['demand']['a'] == 2 * RATE_PER_PEER
+        warmer.update('a', FakeStatus(), 30)
+        assert warmer.hot() == []
+
+    def test_plan_rarest_first(self):
+        warmer = CacheWarmer(read_ahead=2, rewarm_after=60)
+        availability = [3, 1, 2, 0, 5]
+        assert warmer.plan('a', availability, 0) == [3, 1]
+        assert warmer.plan('a', availability, 10) == [2, 0]
+        assert warmer.plan('a', availability, 20) == [4]
+        assert warmer.plan('a', availability, 30) == []
+        assert warmer.plan('a', availability, 60) == [3, 1]
+        assert warmer.stats()['pieces_warmed'] == 7
+
+    def test_cold_torrents_forget_warmed_pieces(self):
+        warmer = CacheWarmer(read_ahead=1)
+        warmer.update('a', FakeStatus(upload_rate=RATE_PER_PEER), 0)
+        assert warmer.plan('a', [0, 0], 0) == [0]
+        warmer.update('a', FakeStatus(), 10000)
+        assert warmer.hot() == []
+        assert warmer.plan('a', [0, 0], 10001) == [0]
+
+    def test_hit_rate_excludes_warming_reads(self):
+        warmer = CacheWarmer()
+        warmer.record_cache(100, 50)
+        warmer.record_cache(140, 70, warmed_blocks=20)
+        stats = warmer.stats()
+        assert stats['runs'] == 2
+        assert stats['peer_reads'] == 20
+        assert stats['peer_hits'] == 20
+        assert stats['hit_rate'] == 1.0
+        warmer.record_cache(180, 80)
+        stats = warmer.stats()
+        assert stats['hit_rate'] == 0.25
+        assert stats['total_hit_rate'] == 0.5
+
+    def test_discard(self):
+        warmer = CacheWarmer()
+        warmer.update('a', FakeStatus(upload_rate=RATE_PER_PEER), 0)
+        warmer.discard('a')
+        assert warmer.stats()['demand'] == {}